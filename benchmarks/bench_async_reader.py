@@ -0,0 +1,123 @@
+#
+# Compare reading several installs with a thread each blocking on the terminal with reading them on one event loop
+#
+# A fake shell in a pseudo terminal stands in for PowerShell. Each install redraws its progress bar
+# BARS times, a little at a time, then prints the completion line. The threads block on the terminal
+# the way the installer read it before the session moved onto the event loop.
+#
+# Usage: python benchmarks/bench_async_reader.py
+#
+
+from msix_global_installer import msix, session
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+
+SHELLS = 8
+INSTALLS = 3
+BARS = 400
+BAR_INTERVAL_S = 0.001
+INSTALL_COMMAND = "Add-AppxPackage -Path App.msix"
+
+
+def fake_shell() -> None:
+    """Draw a progress bar for each install and print the completion line."""
+    for line in sys.stdin:
+        for statement in line.split(";"):
+            statement = statement.strip()
+            if statement.startswith("Add-AppxPackage"):
+                for drawn in range(BARS):
+                    filled = drawn * 68 // BARS
+                    print(f"    [{'o' * filled}{' ' * (68 - filled)}]    ", end="\r", flush=True)
+                    time.sleep(BAR_INTERVAL_S)
+                print()
+            elif statement.startswith("echo ("):
+                marker, nonce, _ = re.findall(r"'([^']*)'", statement)
+                print(f"{marker}{nonce}1,0", flush=True)
+            elif statement == "Exit":
+                return
+
+
+def spawn() -> session.PosixPtyProcess:
+    return session.PosixPtyProcess([sys.executable, __file__, "--shell"])
+
+
+def install_in_thread(results: list) -> None:
+    process = spawn()
+    try:
+        for _ in range(INSTALLS):
+            nonce = session.make_nonce()
+            process.write(INSTALL_COMMAND + session.build_completion_command(nonce) + os.linesep)
+            parser = msix.PtyOutputParser(is_dependency=False, nonce=nonce)
+            parsed = []
+            while not parsed or not isinstance(parsed[-1], msix.ReturnCodeResult):
+                parsed.extend(parser.feed(process.read(session.PTY_READ_SIZE)))
+            results.append(parsed[-1])
+        process.write("Exit" + os.linesep)
+    finally:
+        process.close()
+
+
+def threads() -> list:
+    results: list = []
+    workers = [threading.Thread(target=install_in_thread, args=(results,)) for _ in range(SHELLS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+async def install_on_loop(reader_factory) -> list:
+    results = []
+    async with session.AsyncPowerShellSession(spawn=spawn, reader_factory=reader_factory) as shell_session:
+        for _ in range(INSTALLS):
+            nonce = session.make_nonce()
+            parser = msix.PtyOutputParser(is_dependency=False, nonce=nonce)
+            parsed = [result async for result in parser.parse_all_async(shell_session.run(INSTALL_COMMAND, nonce))]
+            results.append(parsed[-1])
+    return results
+
+
+def event_loop(reader_factory) -> list:
+    async def main() -> list:
+        installs = await asyncio.gather(*(install_on_loop(reader_factory) for _ in range(SHELLS)))
+        return [result for results in installs for result in results]
+
+    return asyncio.run(main())
+
+
+def measure(label: str, run) -> None:
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(0.005):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = run()
+    cpu_s = time.process_time() - cpu_start
+    wall_s = time.perf_counter() - wall_start
+    done.set()
+    sampler.join()
+    assert results == [msix.ReturnCodeResult(True, 0)] * SHELLS * INSTALLS
+    # Less the main and sampling threads
+    extra_threads = peak_threads[0] - 2
+    print(f"{label:<22} wall {wall_s * 1000:>6.0f} ms, cpu {cpu_s * 1000:>6.0f} ms, {extra_threads:>2} extra threads")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--shell"]:
+        fake_shell()
+        sys.exit()
+    print(f"{SHELLS} shells at once, {INSTALLS} installs each of {BARS} progress bar redraws")
+    measure("thread per shell", threads)
+    measure("loop, fd reader", lambda: event_loop(session.FdPtyReader))
+    measure("loop, executor reader", lambda: event_loop(session.ExecutorPtyReader))
@@ -0,0 +1,105 @@
+# Compare the time per package of the old fixed tail (10 echoes, a 1.5 s sleep and exit) with the completion line
+#
+# PowerShell isn't available on Linux so a fake shell in a pseudo terminal stands in for it. It
+# understands just enough of the commands install_msix sends and prints a short progress bar.
+#
+# Usage: python benchmarks/bench_completion.py
+#
+
+from msix_global_installer import msix, session
+import os
+import pty
+import re
+import select
+import statistics
+import subprocess
+import sys
+import time
+
+PACKAGES = 3
+INSTALL_S = 0.2
+INSTALL_COMMAND = "Add-AppxPackage -Path App.msix -ErrorAction Continue | Out-String"
+# The tail install_msix appended before the completion line
+OLD_TAIL = (
+    "; $success_tail='q' ; $success=[int][bool]::Parse($?)"
+    + "; echo INSTALL_SUCCESS===$success$success_tail" * 10
+    + "; Start-Sleep -Milliseconds 1500; echo Exiting with code $LASTEXITCODE; Exit"
+)
+
+
+def fake_shell() -> None:
+    """Run the statements of each line written to the terminal."""
+    for line in sys.stdin:
+        for statement in line.split(";"):
+            statement = statement.strip()
+            if statement.startswith("Add-AppxPackage"):
+                for filled in range(0, 69, 17):
+                    print(f"    [{'o' * filled}{' ' * (68 - filled)}]    ", end="\r", flush=True)
+                    time.sleep(INSTALL_S / 5)
+                print()
+            elif statement.startswith("echo INSTALL_SUCCESS"):
+                print("INSTALL_SUCCESS===1q", flush=True)
+            elif statement.startswith("echo ("):
+                # ('INSTALL_COMPLETE' + '_nonce=' + $success + ',' + $code) where the install succeeded
+                marker, nonce, _ = re.findall(r"'([^']*)'", statement)
+                print(f"{marker}{nonce}1,0", flush=True)
+            elif statement.startswith("Start-Sleep"):
+                time.sleep(int(statement.split()[-1]) / 1000)
+            elif statement == "Exit":
+                return
+
+
+def run_package(command: str, is_complete) -> tuple[float, float]:
+    """Get the seconds until the result is known and until the shell has exited."""
+    master, slave = pty.openpty()
+    shell = subprocess.Popen([sys.executable, __file__, "--shell"], stdin=slave, stdout=slave, close_fds=True)
+    os.close(slave)
+    start = time.perf_counter()
+    os.write(master, (command + "\n").encode())
+    result_s = None
+    output = ""
+    while result_s is None:
+        select.select([master], [], [])
+        try:
+            output += os.read(master, 4096).decode()
+        except OSError:
+            break
+        if is_complete(output):
+            result_s = time.perf_counter() - start
+            os.write(master, b"Exit\n")
+    shell.wait()
+    exit_s = time.perf_counter() - start
+    os.close(master)
+    return result_s if result_s is not None else exit_s, exit_s
+
+
+def old_protocol() -> tuple[float, float]:
+    # The old reader only finished when the shell exited
+    return run_package(INSTALL_COMMAND + OLD_TAIL, lambda output: False)
+
+
+def new_protocol() -> tuple[float, float]:
+    nonce = msix.make_nonce()
+    parser = msix.PtyOutputParser(is_dependency=False, nonce=nonce)
+    read = [0]
+
+    def is_complete(output: str) -> bool:
+        results = parser.feed(output[read[0] :])
+        read[0] = len(output)
+        return any(isinstance(result, msix.ReturnCodeResult) for result in results)
+
+    return run_package(INSTALL_COMMAND + session.build_completion_command(nonce), is_complete)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--shell"]:
+        fake_shell()
+        sys.exit()
+    print(f"Fake install takes {INSTALL_S * 1000:.0f} ms, median of {PACKAGES} packages")
+    medians = {}
+    for label, protocol in (("fixed tail", old_protocol), ("completion line", new_protocol)):
+        timings = [protocol() for _ in range(PACKAGES)]
+        medians[label] = statistics.median(exit_s for _, exit_s in timings)
+        result_ms = statistics.median(result_s for result_s, _ in timings) * 1000
+        print(f"{label:<16} result after {result_ms:>6.0f} ms, shell gone after {medians[label] * 1000:>6.0f} ms")
+    print(f"Saved {(medians['fixed tail'] - medians['completion line']) * 1000:.0f} ms per package")
@@ -0,0 +1,140 @@
+#
+# Measure posting events across threads: the asyncio.Queue the GUI polled, a queue.Queue and the event bus
+#
+# Throughput is PRODUCERS threads posting EVENTS events as fast as they can to one receiving thread.
+# Latency is one thread posting LATENCY_EVENTS events at about 1 kHz, timed until they are handled.
+#
+# Usage: python benchmarks/bench_event_bus.py
+#
+
+from msix_global_installer import events
+import asyncio
+import queue
+import statistics
+import threading
+import time
+
+PRODUCERS = 4
+EVENTS = 50_000
+LATENCY_EVENTS = 1000
+BOUNDED_SIZE = 64
+
+
+def spinning_receiver(event_queue: asyncio.Queue, handler) -> None:
+    """Poll the queue without blocking, like the GUI did with its asyncio.Queue."""
+    while True:
+        event = events.receive_event_sync(event_queue)
+        if event is None:
+            continue
+        if event.name == events.EventType.SHUTDOWN:
+            return
+        handler(event)
+
+
+def blocking_receiver(event_queue, handler) -> None:
+    """Sleep on the queue until an event is posted, like the worker thread did before the event loop."""
+    while True:
+        event = events.receive_event_blocking(event_queue)
+        try:
+            if event.name == events.EventType.SHUTDOWN:
+                return
+            handler(event)
+        finally:
+            event_queue.task_done()
+
+
+def poster(event_queue):
+    # asyncio.Queue.put is a coroutine, its put_nowait never waits as the queue is unbounded
+    return event_queue.put_nowait if isinstance(event_queue, asyncio.Queue) else event_queue.put
+
+
+def throughput(event_queue, receiver) -> float:
+    received = [0]
+
+    def handler(event: events.Event) -> None:
+        received[0] += 1
+
+    def produce() -> None:
+        event = events.Event(events.EventType.INSTALL_PROGRESS_TEXT, data={"progress": 1})
+        post = poster(event_queue)
+        for _ in range(EVENTS // PRODUCERS):
+            post(event)
+
+    consumer = threading.Thread(target=receiver, args=(event_queue, handler))
+    producers = [threading.Thread(target=produce) for _ in range(PRODUCERS)]
+    consumer.start()
+    wall_start = time.perf_counter()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    poster(event_queue)(events.Event(events.EventType.SHUTDOWN))
+    consumer.join()
+    wall_s = time.perf_counter() - wall_start
+    assert received[0] == EVENTS // PRODUCERS * PRODUCERS
+    return received[0] / wall_s
+
+
+def latency(event_queue, receiver) -> tuple[list[float], float]:
+    latencies = []
+
+    def handler(event: events.Event) -> None:
+        latencies.append(time.perf_counter() - event.data["posted"])
+
+    consumer = threading.Thread(target=receiver, args=(event_queue, handler))
+    consumer.start()
+    post = poster(event_queue)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(LATENCY_EVENTS):
+        post(events.Event(events.EventType.INSTALL_PROGRESS_TEXT, data={"posted": time.perf_counter()}))
+        time.sleep(0.001)
+    cpu_share = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+    post(events.Event(events.EventType.SHUTDOWN))
+    consumer.join()
+    return latencies, cpu_share
+
+
+def report(label: str, make_queue, receiver) -> None:
+    events_per_s = throughput(make_queue(), receiver)
+    latencies, cpu_share = latency(make_queue(), receiver)
+    latencies_us = sorted(latency * 1e6 for latency in latencies)
+    print(
+        f"{label:<28} {events_per_s:>8.0f} events/s  at 1 kHz: cpu {cpu_share * 100:>5.1f}% of a core, latency "
+        f"median {statistics.median(latencies_us):>6.1f} us, p99 {latencies_us[int(len(latencies_us) * 0.99)]:>7.1f} us"
+    )
+
+
+def merged_under_load() -> None:
+    """Post progress to a small bus faster than a slow receiver handles it, merging once it's full."""
+    bus = events.EventBus(
+        "bench", BOUNDED_SIZE, topic_policies={events.EventType.INSTALL_PROGRESS_TEXT: events.DropPolicy.MERGE}
+    )
+    last = []
+
+    def handler(event: events.Event) -> None:
+        last.append(event.data["progress"])
+        time.sleep(0.0001)
+
+    consumer = threading.Thread(target=blocking_receiver, args=(bus, handler))
+    consumer.start()
+    start = time.perf_counter()
+    for progress in range(1, EVENTS + 1):
+        bus.put(events.Event(events.EventType.INSTALL_PROGRESS_TEXT, data={"progress": progress}))
+    post_s = time.perf_counter() - start
+    events.post_shutdown(bus)
+    consumer.join()
+    assert last[-1] == EVENTS
+    print(
+        f"{'event bus, merging':<28} posted {EVENTS} in {post_s * 1000:.0f} ms to a slow receiver, "
+        f"{len(last)} handled, {bus.merged} merged, the last progress kept"
+    )
+
+
+if __name__ == "__main__":
+    print(f"{PRODUCERS} posting threads, {EVENTS} events")
+    report("asyncio.Queue, polled", asyncio.Queue, spinning_receiver)
+    report("queue.Queue", queue.Queue, blocking_receiver)
+    report("event bus", lambda: events.EventBus("bench"), blocking_receiver)
+    report(f"event bus, blocking at {BOUNDED_SIZE}", lambda: events.EventBus("bench", BOUNDED_SIZE), blocking_receiver)
+    merged_under_load()
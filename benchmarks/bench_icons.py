@@ -0,0 +1,65 @@
+#
+# Measure rendering every icon size from 4K source logos
+#
+# The old way opened and decoded the source again for each size it scaled, and left the .ico to Pillow's own
+# scaling from the full image. The pipeline decodes once, scaled down while decoding for JPEG and then reduced
+# by a whole factor, and renders the sizes on a thread pool. A cached run only hashes the source.
+#
+# Usage: python benchmarks/bench_icons.py
+#
+
+from PIL import Image, ImageDraw
+from msix_global_installer import image
+import io
+import os
+import pathlib
+import tempfile
+import time
+
+SOURCE_SIZE = 3840
+RUNS = 3
+
+
+def make_logo(path: pathlib.Path) -> pathlib.Path:
+    """A logo with detail at every scale, so the encoders can't shortcut it."""
+    logo = Image.radial_gradient("L").resize((SOURCE_SIZE, SOURCE_SIZE)).convert("RGBA")
+    draw = ImageDraw.Draw(logo)
+    for step in range(0, SOURCE_SIZE // 2, 24):
+        draw.ellipse((step, step, SOURCE_SIZE - step, SOURCE_SIZE - step), outline=(step % 256, 90, 200, 255), width=6)
+    if path.suffix == ".jpg":
+        logo = logo.convert("RGB")
+    logo.save(path)
+    return path
+
+
+def render_each_size(path: pathlib.Path) -> None:
+    """The old way, a full decode and resize for every size."""
+    for size in image.ICON_SIZES:
+        buffer = io.BytesIO()
+        Image.open(path).resize((size, size), Image.Resampling.BICUBIC).save(buffer, format="PNG")
+    buffer = io.BytesIO()
+    Image.open(path).save(buffer, format="ICO", sizes=[(size, size) for size in image.ICO_SIZES])
+
+
+def measure(label: str, render) -> None:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        render()
+        times.append(time.perf_counter() - start)
+    print(f"{label:<34} {min(times) * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    print(f"{SOURCE_SIZE}x{SOURCE_SIZE} sources, {len(image.ICON_SIZES)} sizes and an .ico, {os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        for name in ("logo.png", "logo.jpg"):
+            path = make_logo(directory / name)
+            print(f"\n{name}, {path.stat().st_size / 1e6:.1f} MB")
+            measure("decode for each size", lambda: render_each_size(path))
+            measure("pipeline, one thread", lambda: image.render_icons(path, jobs=1))
+            measure("pipeline, thread pool", lambda: image.render_icons(path))
+            cache_dir = directory / "cache"
+            image.render_icons_cached(path, cache_dir)
+            measure("pipeline, cached", lambda: image.render_icons_cached(path, cache_dir))
@@ -0,0 +1,110 @@
+#
+# Measure what logging costs the install_msix_async read loop on a long transcript
+#
+# A fake session replays TRANSCRIPT_LINES lines of progress bars, CHUNK_LINES at a time as the pty returns them.
+# The loop is timed with the log written synchronously at every level, as before, and through the queue to the
+# background listener at the default level, with the pty transcript and at DEBUG. The install thread's own CPU
+# time is what logging costs the read loop, wall time also includes the listener competing for the GIL.
+#
+# Usage: python benchmarks/bench_logging.py
+#
+
+from msix_global_installer import logs, msix
+from msix_global_installer.session import COMPLETION_MARKER
+import asyncio
+import logging
+import pathlib
+import queue
+import tempfile
+import time
+
+TRANSCRIPT_LINES = 200_000
+CHUNK_LINES = 4
+RUNS = 3
+
+
+def make_chunks() -> list[str]:
+    lines = []
+    for number in range(TRANSCRIPT_LINES):
+        filled = number * 68 // TRANSCRIPT_LINES
+        lines.append(f"    Deployment operation progress: App.msix\r\n    [{'o' * filled}{' ' * (68 - filled)}]    \r")
+    return ["".join(lines[start : start + CHUNK_LINES]) for start in range(0, len(lines), CHUNK_LINES)]
+
+
+class TranscriptSession:
+    """Replays the transcript then the completion line, like a shell that has finished installing."""
+
+    exitstatus = 0
+
+    def __init__(self, chunks: list[str]):
+        self.chunks = chunks
+
+    async def start(self) -> None:
+        pass
+
+    async def run(self, command: str, nonce: str):
+        for chunk in self.chunks:
+            yield chunk
+        yield f"{COMPLETION_MARKER}_{nonce}=1,0\r\n"
+
+
+def synchronous_logging(log_path: pathlib.Path) -> None:
+    """The logging app.py set up before, every level written to the file on the logging thread."""
+    logs.stop_logging()
+    logging.getLogger(logs.TRANSCRIPT_LOGGER_NAME).setLevel(logging.NOTSET)
+    logging.basicConfig(
+        level=logging.NOTSET,
+        filename=log_path,
+        filemode="a",
+        format=logs.LOG_FORMAT,
+        datefmt=logs.LOG_DATE_FORMAT,
+        force=True,
+    )
+
+
+def measure(label: str, configure, chunks: list[str], directory: pathlib.Path) -> None:
+    times = []
+    thread_times = []
+    for run in range(RUNS):
+        log_path = directory / f"{label.replace(' ', '-')}-{run}.log"
+        configure(log_path)
+        start = time.perf_counter()
+        thread_start = time.thread_time()
+        succeeded = asyncio.run(
+            msix.install_msix_async(
+                pathlib.Path("App.msix"),
+                "App",
+                TranscriptSession(chunks),
+                emitter=msix.ProgressEmitter(event_queue=queue.Queue()),
+            )
+        )
+        thread_times.append(time.thread_time() - thread_start)
+        times.append(time.perf_counter() - start)
+        assert succeeded
+        # Wait for the listener to write everything, outside the timing
+        logs.stop_logging()
+        for handler in logging.getLogger().handlers[:]:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+    log_bytes = sum(path.stat().st_size for path in directory.glob(f"{label.replace(' ', '-')}-{RUNS - 1}.log*"))
+    thread_s = min(thread_times)
+    print(
+        f"{label:<26} install thread {thread_s / TRANSCRIPT_LINES * 1e9:>6.0f} ns per line, "
+        f"wall {min(times) * 1000:>6.0f} ms, log {log_bytes / 1e6:>5.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    chunks = make_chunks()
+    print(f"{TRANSCRIPT_LINES} lines in {len(chunks)} chunks, best of {RUNS}")
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        measure("synchronous, every level", synchronous_logging, chunks, directory)
+        measure("queued, INFO", lambda path: logs.configure_logging(path, level="INFO"), chunks, directory)
+        measure(
+            "queued, INFO, transcript",
+            lambda path: logs.configure_logging(path, level="INFO", transcript=True),
+            chunks,
+            directory,
+        )
+        measure("queued, DEBUG", lambda path: logs.configure_logging(path, level="DEBUG"), chunks, directory)
@@ -0,0 +1,50 @@
+# Compare the streaming manifest parser with a full tree parse
+#
+# Usage: python benchmarks/bench_manifest.py
+#
+
+from msix_global_installer import manifest
+import io
+import pathlib
+import timeit
+import xml.etree.ElementTree as ET
+import zipfile
+
+NAMESPACE = {"default": "http://schemas.microsoft.com/appx/manifest/foundation/windows10"}
+
+
+def full_tree_parse(manifest_bytes: bytes) -> tuple:
+    """The lookups extract_metadata_from_manifest did before the streaming parser."""
+    root = ET.parse(io.BytesIO(manifest_bytes)).getroot()
+    display_name = root.find("default:Properties/default:DisplayName", NAMESPACE)
+    identity = root.find("default:Identity", NAMESPACE)
+    logo = root.find("default:Properties/default:Logo", NAMESPACE)
+    dependencies = root.findall("default:Dependencies/default:PackageDependency", NAMESPACE)
+    return display_name, identity, logo, dependencies
+
+
+def make_large_manifest(small_manifest: bytes, extensions: int) -> bytes:
+    """Pad the Extensions section of a manifest with many entries."""
+    extension = (
+        b'<uap:Extension Category="windows.fileTypeAssociation">'
+        b'<uap:FileTypeAssociation Name="type%d"><uap:SupportedFileTypes>'
+        b"<uap:FileType>.ext%d</uap:FileType></uap:SupportedFileTypes></uap:FileTypeAssociation></uap:Extension>"
+    )
+    padding = b"".join(extension % (i, i) for i in range(extensions))
+    return small_manifest.replace(b"<Extensions>", b"<Extensions>" + padding)
+
+
+def bench(label: str, manifest_bytes: bytes, number: int) -> None:
+    full = timeit.timeit(lambda: full_tree_parse(manifest_bytes), number=number) / number
+    streaming = timeit.timeit(lambda: manifest.parse_manifest(io.BytesIO(manifest_bytes)), number=number) / number
+    print(
+        f"{label:<8} {len(manifest_bytes) / 1024:>8.1f} KiB  full tree {full * 1e6:>9.1f} us  "
+        f"streaming {streaming * 1e6:>9.1f} us  speedup {full / streaming:>5.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    with zipfile.ZipFile(pathlib.Path("tests/TestMsixPackage.msix")) as package:
+        small = package.read("AppxManifest.xml")
+    bench("small", small, number=2000)
+    bench("large", make_large_manifest(small, extensions=2000), number=50)
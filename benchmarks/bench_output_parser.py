@@ -0,0 +1,74 @@
+# Compare parsing PowerShell output a line at a time with the chunked parser
+#
+# Usage: python benchmarks/bench_output_parser.py
+#
+
+from math import ceil
+from msix_global_installer import msix
+import re
+import timeit
+
+BAR_WIDTH = 68
+REPEATS = 200
+CHUNK_SIZE = 4096
+
+
+def make_transcript() -> str:
+    """Output shaped like an Add-AppxPackage run, with colours and progress redraws."""
+    lines = ["\x1b[?25l\x1b]0;Windows PowerShell\x07PS C:\\> Add-AppxPackage -Path App.msix\r\n"]
+    for filled in range(BAR_WIDTH + 1):
+        bar = "o" * filled + " " * (BAR_WIDTH - filled)
+        lines.append(f"\x1b[33m    Deployment operation progress: App.msix\x1b[0m\r\n    [{bar}]      \r\n")
+    lines.append("\x1b[1;1H\r\n" * 20)
+    lines.append(f"{msix.COMPLETION_MARKER}_0123456789abcdef=\x1b[92m1,0\x1b[m\r\n")
+    return "".join(lines) * REPEATS
+
+
+def count_progress(line: str, max_count: int) -> int | None:
+    """How the old parser counted progress, the bar width was fixed rather than taken from the bar."""
+    matches = re.findall(r"\[([o ]+)\]", line)
+    if not matches:
+        return None
+    return ceil(str(matches[0]).count("o") / max_count * 100)
+
+
+def old_process_line(line: str):
+    """The per line parser before the chunked parser, each check is its own scan of the line."""
+    progress = count_progress(line=line, max_count=BAR_WIDTH)
+    if progress:
+        return msix.ProgressResult(progress=progress)
+    elif "error" in line or "CategoryInfo" in line or "HRESULT" in line:
+        return None
+    elif msix.COMPLETION_MARKER in line:
+        split = line.split("=")
+        try:
+            return msix.ReturnCodeResult(bool(int(split[1][0])))
+        except ValueError:
+            return None
+    return None
+
+
+def run_old(transcript: str) -> int:
+    results = 0
+    for line in re.split(r"(?<=\n)", transcript):
+        if old_process_line(line) is not None:
+            results += 1
+    return results
+
+
+def run_new(transcript: str) -> int:
+    parser = msix.PtyOutputParser(is_dependency=False)
+    results = 0
+    for start in range(0, len(transcript), CHUNK_SIZE):
+        results += len(parser.feed(transcript[start : start + CHUNK_SIZE]))
+    return results + len(parser.close())
+
+
+if __name__ == "__main__":
+    transcript = make_transcript()
+    line_count = transcript.count("\n")
+    print(f"{line_count} lines, {len(transcript) // 1024} KiB")
+    for label, function in (("line at a time", run_old), ("chunked parser", run_new)):
+        results = function(transcript)
+        seconds = min(timeit.repeat(lambda: function(transcript), number=1, repeat=10))
+        print(f"{label:<16} {line_count / seconds:>12,.0f} lines/s  {results} results")
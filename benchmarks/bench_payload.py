@@ -0,0 +1,54 @@
+# Compare loading the metadata payload with loading the old pickle
+#
+# Usage: python benchmarks/bench_payload.py
+#
+
+from msix_global_installer import pickler
+from msix_global_installer.metadata import MsixMetadata, PackageDependency
+import pathlib
+import pickle
+import tempfile
+import timeit
+
+DEPENDENCIES = 50
+NUMBER = 2000
+
+
+def make_metadata() -> list[MsixMetadata]:
+    return [
+        MsixMetadata(
+            f"Package{i}.msix",
+            f"Package {i}",
+            "1.0.0.0",
+            "Contoso Corporation",
+            icon_path=pathlib.Path(f"extracted/Logo{i}.png"),
+            architecture="x64",
+            dependencies=[PackageDependency("Microsoft.VCLibs.140.00", "CN=Microsoft Corporation", "14.0.0.0")],
+        )
+        for i in range(DEPENDENCIES + 1)
+    ]
+
+
+def load_pickle(path: pathlib.Path) -> list[MsixMetadata]:
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+if __name__ == "__main__":
+    metadata = make_metadata()
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = pathlib.Path(directory) / "data.pkl"
+        payload_path = pathlib.Path(directory) / "metadata.bin"
+        with open(pickle_path, "wb") as file:
+            pickle.dump(metadata, file)
+        pickler.save_metadata(payload_path, metadata)
+
+        pickle_size, payload_size = pickle_path.stat().st_size, payload_path.stat().st_size
+        print(f"{DEPENDENCIES} dependencies, pickle {pickle_size} B, payload {payload_size} B")
+        for label, function in (
+            ("pickle, all records", lambda: load_pickle(pickle_path)),
+            ("payload, all records", lambda: pickler.load_metadata(payload_path)),
+            ("payload, main record", lambda: pickler.load_main_metadata(payload_path)),
+        ):
+            seconds = timeit.timeit(function, number=NUMBER) / NUMBER
+            print(f"{label:<22} {seconds * 1e6:>8.1f} us")
@@ -0,0 +1,50 @@
+#
+# Compare the wall time of installing a main package and its dependencies one at a time with the scheduler
+#
+# Installs are simulated with a sleep, as Add-AppxPackage spends most of its time waiting on the
+# deployment service. Half of the dependencies need another dependency installed first.
+#
+# Usage: python benchmarks/bench_scheduler.py
+#
+
+from msix_global_installer import scheduler
+from msix_global_installer.metadata import MsixMetadata, PackageDependency
+import asyncio
+import time
+
+DEPENDENCIES = 6
+INSTALL_S = 0.2
+
+
+def make_packages() -> list[MsixMetadata]:
+    packages = [MsixMetadata("App.msix", "App", "1.0.0.0", "Contoso", identity_name="App")]
+    for number in range(DEPENDENCIES):
+        # Odd dependencies need the even one before them
+        requires = [PackageDependency(f"Dependency{number - 1}", "CN=Contoso", "1.0.0.0")] if number % 2 else []
+        name = f"Dependency{number}"
+        packages.append(
+            MsixMetadata(f"{name}.msix", name, "1.0.0.0", "Contoso", dependencies=requires, identity_name=name)
+        )
+    return packages
+
+
+async def install(node: scheduler.InstallNode, report) -> bool:
+    for progress in (25, 50, 75, 100):
+        await asyncio.sleep(INSTALL_S / 4)
+        report(progress)
+    return True
+
+
+def run(max_concurrent: int) -> float:
+    install_scheduler = scheduler.InstallScheduler(scheduler.build_graph(make_packages()), install, max_concurrent)
+    start = time.perf_counter()
+    assert asyncio.run(install_scheduler.run_async())
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"Main package with {DEPENDENCIES} dependencies, each install takes {INSTALL_S * 1000:.0f} ms")
+    sequential_s = run(1)
+    for max_concurrent in (1, 2, 3, 4):
+        elapsed_s = run(max_concurrent)
+        print(f"max_concurrent={max_concurrent}: {elapsed_s * 1000:>6.0f} ms ({sequential_s / elapsed_s:.2f}x)")
@@ -0,0 +1,84 @@
+# Compare the busy-spinning worker loop with the blocking worker
+#
+# Usage: python benchmarks/bench_worker.py
+#
+
+from msix_global_installer import events
+import asyncio
+import queue
+import statistics
+import threading
+import time
+
+EVENTS = 200
+IDLE_S = 1.0
+
+
+def spinning_worker(event_queue: asyncio.Queue, handler, stop: threading.Event) -> None:
+    """The worker loop before it blocked on the queue."""
+    while not stop.is_set():
+        event = events.receive_event_sync(event_queue=event_queue)
+        if event:
+            handler(event)
+
+
+def blocking_worker(event_queue: queue.Queue, handler) -> None:
+    """The worker loop once it blocked on the queue, before it ran on the event loop."""
+    while True:
+        event = events.receive_event_blocking(event_queue)
+        if event.name == events.EventType.SHUTDOWN:
+            return
+        handler(event)
+
+
+def measure(event_queue, start_worker, stop_worker) -> tuple[float, list[float]]:
+    latencies = []
+    received = threading.Event()
+
+    def handler(event: events.Event) -> None:
+        latencies.append(time.perf_counter() - event.data["posted"])
+        received.set()
+
+    worker = start_worker(handler)
+    cpu_start = time.process_time()
+    time.sleep(IDLE_S)
+    idle_cpu = (time.process_time() - cpu_start) / IDLE_S
+    for _ in range(EVENTS):
+        received.clear()
+        event = events.Event(events.EventType.INSTALL_MSIX, data={"posted": time.perf_counter()})
+        # asyncio.Queue.put is a coroutine, its put_nowait never waits as the queue is unbounded
+        event_queue.put_nowait(event)
+        received.wait()
+        time.sleep(0.001)
+    stop_worker()
+    worker.join()
+    return idle_cpu, latencies
+
+
+def report(label: str, idle_cpu: float, latencies: list[float]) -> None:
+    latencies_us = sorted(latency * 1e6 for latency in latencies)
+    print(
+        f"{label:<9} idle CPU {idle_cpu * 100:>5.1f}% of a core  dispatch latency median "
+        f"{statistics.median(latencies_us):>7.1f} us  p99 {latencies_us[int(len(latencies_us) * 0.99)]:>7.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    spin_queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def start_spinning(handler):
+        thread = threading.Thread(target=spinning_worker, args=(spin_queue, handler, stop))
+        thread.start()
+        return thread
+
+    report("spinning", *measure(spin_queue, start_spinning, stop.set))
+
+    blocking_queue = queue.Queue()
+
+    def start_blocking(handler):
+        thread = threading.Thread(target=blocking_worker, args=(blocking_queue, handler))
+        thread.start()
+        return thread
+
+    report("blocking", *measure(blocking_queue, start_blocking, lambda: events.post_shutdown(blocking_queue)))
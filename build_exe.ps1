@@ -10,10 +10,9 @@ function Get-ParentPath {
     return (Split-Path $path -Parent)
 }
 
-# Get picked data to get name and icon
-$paths_py = python -c "import pickle; m = pickle.load(open('extracted/data.pkl', 'rb')); print([a.package_path for a in m])"
-$paths_py_doublequotes = $paths_py -replace "'", '"'
-$paths_json = $paths_py_doublequotes | ConvertFrom-Json
+# Get extracted data to get name and icon
+$paths_py = python -c "import json; from msix_global_installer import pickler; m = pickler.load_metadata('extracted/metadata.bin'); print(json.dumps([str(a.package_path) for a in m]))"
+$paths_json = $paths_py | ConvertFrom-Json
 $main_app_path = $paths_json[0]
 $addDataArgs = $paths_json | ForEach-Object {
     $parent_path = Get-ParentPath $_
@@ -23,10 +22,10 @@ $addDataString = $addDataArgs -replace "`r?`n", ""
 
 $basename = [System.IO.Path]::GetFileNameWithoutExtension($main_app_path)
 $pathexe = $basename + ".exe"
-$icon = python -c "import pickle; print(pickle.load(open('extracted/data.pkl', 'rb'))[0].icon_path)"
+$icon = python -c "from msix_global_installer import pickler; m = pickler.load_main_metadata('extracted/metadata.bin'); print(m.exe_icon_path or m.icon_path)"
 
 # Build command
 # This only works when first stored as a string - some powershell string issue for the add-data commands
-$command_str = "pyinstaller .\src\msix_global_installer\app.py --add-data 'extracted:extracted' $addDataString --onefile --name $pathexe --icon $icon --noconsole"
+$command_str = "pyinstaller .\src\msix_global_installer\app.py --add-data 'extracted:extracted' $addDataString --onefile --name $pathexe --icon $icon --noconsole --exclude-module PIL"
 Write-Host "Running command: $command_str"
 Invoke-Expression $command_str
\ No newline at end of file
@@ -2,42 +2,169 @@
 #
 # This avoids runtime extraction/processing of data
 #
-# Usage: python extract_msix_data.py path_to_msix.msix
+# Usage: python extract_msix_data.py path_to_msix.msix [dependency.msix ...] [--architecture x64] [--jobs N]
+#        [--no-cache] [--rebuild] [--cache-dir DIR]
 #
 
-from msix_global_installer import msix, pickler, image
-import sys
+from concurrent.futures import ProcessPoolExecutor
+from msix_global_installer import cache, msix, pickler, image
+import argparse
 import pathlib
+import sys
+
+
+class ExtractionError(Exception):
+    """Raised when one or more packages fail to extract."""
+
+    def __init__(self, errors: list[tuple[str, Exception]]):
+        self.errors = errors
+        details = "\n".join(f"  {path}: {error!r}" for path, error in errors)
+        super().__init__(f"Failed to extract {len(errors)} package(s):\n{details}")
+
+
+def extract_package(
+    path: str,
+    output_icon_path: pathlib.Path | None = None,
+    architecture: str | None = None,
+    cache_dir: pathlib.Path | None = None,
+    rebuild: bool = False,
+) -> msix.MsixMetadata:
+    """
+    Get the metadata for a package.
+
+    If an output path is given the icon is extracted and scaled copies are saved next to it.
+    With a cache directory, unchanged packages are loaded from the cache. Rebuild ignores
+    existing cache entries and replaces them. Icons are cached by the logo's content, so a new
+    version of a package with the same logo isn't rendered again.
+    """
+    if cache_dir is None:
+        return extract_package_uncached(path, output_icon_path, architecture)
+
+    extraction_cache = cache.ExtractionCache(cache_dir)
+    key = extraction_cache.make_key(path, architecture, output_icon_path is not None)
+    if not rebuild:
+        metadata = extraction_cache.load(key, path, output_icon_path)
+        if metadata is not None:
+            return metadata
+    metadata = extract_package_uncached(path, output_icon_path, architecture, cache_dir, rebuild)
+    extraction_cache.store(key, metadata)
+    return metadata
+
+
+def extract_package_uncached(
+    path: str,
+    output_icon_path: pathlib.Path | None,
+    architecture: str | None,
+    icon_cache_dir: pathlib.Path | None = None,
+    rebuild: bool = False,
+) -> msix.MsixMetadata:
+    """Extract the metadata and icons for a package, rebuild ignores cached icons."""
+    metadata = msix.get_msix_metadata(path, output_icon_path, architecture=architecture)
+    if output_icon_path is not None and metadata.icon_path is not None:
+        icons = image.render_icons_cached(metadata.icon_path, icon_cache_dir, rebuild=rebuild)
+        # Saved for the build, the .ico is the executable's icon
+        icon_stem = metadata.icon_path.parent / metadata.icon_path.stem
+        metadata.scaled_icon_path = pathlib.Path(f"{icon_stem}_scaled.png")
+        metadata.scaled_icon_path.write_bytes(icons.pngs[image.PANEL_ICON_SIZE])
+        metadata.exe_icon_path = pathlib.Path(f"{icon_stem}.ico")
+        metadata.exe_icon_path.write_bytes(icons.ico)
+        # Rendered at the sizes the window shows them, so the installer doesn't need to decode or scale them
+        metadata.window_icons = [icons.encoded(size) for size in image.WINDOW_ICON_SIZES]
+        metadata.panel_icon = icons.encoded(image.PANEL_ICON_SIZE)
+    return metadata
+
+
+def get_metadata(
+    paths: list[str],
+    output_icon_path: pathlib.Path | None = None,
+    architecture: str | None = None,
+    jobs: int = 1,
+    cache_dir: pathlib.Path | None = None,
+    rebuild: bool = False,
+) -> list[msix.MsixMetadata]:
+    """
+    Get the metadata from a list of items.
+
+    Results are in the same order as the paths. Only the first package has its icon extracted.
+    With more than one job packages are extracted on a process pool.
+    Every failure is collected and raised together as an ExtractionError.
+    """
+    icon_paths = [output_icon_path] + [None] * (len(paths) - 1)
+    results: list[msix.MsixMetadata] = []
+    errors: list[tuple[str, Exception]] = []
+    if jobs <= 1:
+        for path, icon_path in zip(paths, icon_paths):
+            try:
+                results.append(extract_package(path, icon_path, architecture, cache_dir, rebuild))
+            except Exception as e:
+                errors.append((path, e))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(extract_package, path, icon_path, architecture, cache_dir, rebuild)
+                for path, icon_path in zip(paths, icon_paths)
+            ]
+            for path, future in zip(paths, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append((path, e))
+    if cache_dir is not None:
+        cache.ExtractionCache(cache_dir).evict()
+    if errors:
+        raise ExtractionError(errors)
+    return results
 
 
-def get_metadata(paths: list[str]) -> list[msix.MsixMetadata]:
-    """Get the metadata from a list of items."""
-    return [msix.get_msix_metadata(path) for path in paths]
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Extract MSIX data for the installer.")
+    parser.add_argument("path", help="Main package to install")
+    parser.add_argument(
+        "dependency_paths", nargs="*", help="Dependencies, installed last to first before the main package"
+    )
+    parser.add_argument(
+        "--architecture",
+        default=None,
+        help="Architecture of the package to read from bundles, such as x64, arm64 or neutral",
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1, help="Number of packages to extract in parallel (default: 1)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=cache.default_cache_dir(),
+        help="Directory to cache extracted data in (default: the user cache directory)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the extraction cache")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore cached data and extract every package again")
+    args = parser.parse_args()
 
+    print("Extracting data from %s" % args.path)
 
-path = sys.argv[1]
-print("Extracting data from %s" % path)
+    data_output_path = pathlib.Path("extracted")
+    if not data_output_path.exists():
+        data_output_path.mkdir()
+    data_file = data_output_path / "metadata.bin"
 
-data_output_path = pathlib.Path("extracted")
-if not data_output_path.exists():
-    data_output_path.mkdir()
-data_file = data_output_path / "data.pkl"
+    try:
+        all_metadata = get_metadata(
+            [args.path] + args.dependency_paths,
+            output_icon_path=data_output_path,
+            architecture=args.architecture,
+            jobs=args.jobs,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            rebuild=args.rebuild,
+        )
+    except ExtractionError as e:
+        print(e, file=sys.stderr)
+        return 1
 
-metadata = msix.get_msix_metadata(path, data_output_path)
-dependency_paths = sys.argv[2:]
-dependency_metadata = []
-if dependency_paths:
-    dependency_metadata = get_metadata(paths=dependency_paths)
-all_metadata = [metadata] + dependency_metadata
+    print(f"\nExtracted: {all_metadata}")
 
-# Scale the image, save and add to metadata
-scaled_image = image.scale_image(metadata.icon_path, 100, 100)
-scaled_image_path = pathlib.Path(metadata.icon_path.parent) / pathlib.Path(
-    metadata.icon_path.stem + "_scaled" + metadata.icon_path.suffix
-)
-image.save_image(scaled_image, scaled_image_path)
-metadata.scaled_icon_path = scaled_image_path
+    pickler.save_metadata(data_file_path=data_file, metadata_list=all_metadata)
+    return 0
 
-print(f"\nExtracted: {all_metadata}")
 
-pickler.save_metadata(data_file_path=data_file, metadata_list=all_metadata)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+def main() -> None:
+    """Run the installer."""
+    # Imported when run so importing the package doesn't load the GUI
+    from msix_global_installer import app
+
+    app.main()
@@ -1,82 +1,71 @@
-from msix_global_installer import config, events, gui, msix, pickler, pyinstaller_helper
-import asyncio
+from msix_global_installer import config, events, gui, logs
+from typing import Callable
+import importlib
 import logging
 import threading
 import platformdirs
 import pathlib
 
-
-if config.ENABLE_LOGS:
-    log_dir_path = pathlib.Path(
-        platformdirs.user_log_dir(appname="msix_global_installer", appauthor="msix_global_installer")
-    )
-    if not log_dir_path.exists():
-        log_dir_path.mkdir(parents=True)
-    log_path = log_dir_path / "installer.log"
-    logging.basicConfig(
-        level=logging.NOTSET,
-        filename=log_path,
-        filemode="a",
-        format="%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s",
-        datefmt="%H:%M:%S",
-    )
-else:
-    logging.basicConfig(
-        level=logging.NOTSET,
-        format="%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s",
-        datefmt="%H:%M:%S",
-    )
 logger = logging.getLogger(__name__)
 
+# Only needed once the first frame has been drawn, imported on a background thread until then
+BACKGROUND_IMPORTS = ("pyuac",)
+
+
+def configure_logs():
+    if config.ENABLE_LOGS:
+        log_dir_path = pathlib.Path(
+            platformdirs.user_log_dir(appname="msix_global_installer", appauthor="msix_global_installer")
+        )
+        # Written on a background thread, rotated once it reaches config.LOG_MAX_BYTES
+        logs.configure_logging(log_dir_path / "installer.log")
+    else:
+        logs.configure_logging()
+
+
+def preload(module_names: tuple[str, ...]) -> threading.Thread:
+    """Import modules on a background thread, so they are usually loaded before they're needed."""
 
-def process_event(event: events.Event):
-    if event.name == events.EventType.REQUEST_MSIX_METADATA:
-        meta = pickler.load_metadata(config.EXTRACTED_DATA_PATH)
-        logger.info("Got metadata %s", meta)
-        metadata_event = events.Event(name=events.EventType.MSIX_METADATA_RECEIVED, data=meta)
-        events.post_event_sync(event=metadata_event, event_queue=events.gui_event_queue)
-    elif event.name == events.EventType.INSTALL_MSIX:
-        install_globally = event.data["global"]
-        meta = pickler.load_metadata(config.EXTRACTED_DATA_PATH)
-        paths = [
-            (
-                metadata.package_name,
-                pyinstaller_helper.resource_path(metadata.package_path),
-            )
-            for metadata in meta
-        ]
-        # TODO: Break this into a function in MSIX
-        paths.reverse()
-        number_of_packages = len(paths)
-        for i, path in enumerate(paths):
-            logger.info("Installing app: %s", path)
-            success = msix.install_msix(
-                path=path[1],
-                title=path[0],
-                global_install=install_globally,
-                packages_to_install=number_of_packages,
-                package_number=i + 1,
-            )
-            if not success:
-                break
-        logger.info("Installing app: %s... DONE", path)
+    def import_all():
+        for module_name in module_names:
+            try:
+                importlib.import_module(module_name)
+            except ImportError as e:
+                logger.warning("Failed to preload %s: %s", module_name, e)
+
+    thread = threading.Thread(target=import_all, name="preload", daemon=True)
+    thread.start()
+    return thread
 
 
 def start_worker():
-    """Run the worker in a separate thread."""
-    while True:
-        # Wait for a request
-        event = events.receive_event_sync(event_queue=events.backend_event_queue)
-        if event:
-            process_event(event)
+    """Run the worker's event loop in a separate thread."""
+    # Imported here so the install modules load on the worker thread, not before the first frame
+    from msix_global_installer import backend
+
+    backend.run()
+
+
+def main(on_first_frame: Callable | None = None):
+    """
+    Run the installer, the window on this thread and the backend on a worker thread.
 
+    Only what the first frame needs is imported before it's drawn. The worker
+    starts once it has been, then on_first_frame is called with the window.
+    """
+    configure_logs()
+    preload(BACKGROUND_IMPORTS)
+    worker_thread = threading.Thread(target=start_worker, name="worker", daemon=True)
 
-# Start the async worker in a separate thread
-worker_thread = threading.Thread(target=start_worker, daemon=True)
+    def first_frame(root):
+        worker_thread.start()
+        if on_first_frame is not None:
+            on_first_frame(root)
 
+    gui.main(on_first_frame=first_frame)
+    # The window has closed, stop the worker
+    events.post_shutdown(events.backend_event_queue)
 
-class MainApp:
-    """Run the main application threads."""
 
-    worker_thread.start()
-    asyncio.run(gui.main())
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Handle the GUI's requests on an event loop, installing the packages."""
+
+from msix_global_installer import config, events, inventory, journal, msix, session, store, watchdog
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The install being run, so it can be cancelled
+install_task: asyncio.Task | None = None
+
+
+async def send_metadata(event: events.Event):
+    meta = store.metadata_store.all()
+    logger.info("Got metadata %s", meta)
+    metadata_event = events.Event(name=events.EventType.MSIX_METADATA_RECEIVED, data=meta)
+    events.post_event_sync(event=metadata_event, event_queue=events.gui_event_queue)
+
+
+async def run_install(event: events.Event):
+    global install_task
+    if install_task is not None:
+        # Only one install at a time, the task is needed to cancel it
+        logger.warning("Ignoring a request to install while an install is running")
+        return
+    install_task = asyncio.current_task()
+    try:
+        await install(event.data["global"])
+    finally:
+        install_task = None
+
+
+async def cancel_install(event: events.Event):
+    if install_task is not None:
+        logger.warning("Cancelling the install")
+        install_task.cancel()
+
+
+# Which coroutine handles each request from the GUI
+BACKEND_HANDLERS = {
+    events.EventType.REQUEST_MSIX_METADATA: send_metadata,
+    events.EventType.INSTALL_MSIX: run_install,
+    events.EventType.CANCEL_INSTALL: cancel_install,
+}
+
+
+async def install(install_globally: bool):
+    """Install every package, then post how the install finished."""
+    meta = list(store.metadata_store.all())
+    install_journal = journal.InstallJournal.load(meta, install_globally) if config.ENABLE_INSTALL_JOURNAL else None
+    finished = {"success": False}
+    try:
+        # Start PowerShell once for every package rather than once each
+        async with session.AsyncPowerShellSession() as shell_session:
+            needed = await inventory.plan_install_async(
+                meta, lambda: inventory.query_installed_packages_async(shell_session, install_globally)
+            )
+            if install_journal is not None:
+                needed = install_journal.remaining(needed)
+            finished["success"] = await msix.install_packages_async(
+                needed,
+                shell_session,
+                global_install=install_globally,
+                on_installed=install_journal.record if install_journal is not None else None,
+            )
+        if finished["success"] and install_journal is not None:
+            install_journal.clear()
+        logger.info("Installing %s... DONE, success: %s", needed[0].package_name, finished["success"])
+    except watchdog.InstallTimeoutError as e:
+        logger.error("Install timed out: %s", e)
+        finished.update(title="Install timed out", subtitle=str(e))
+    except asyncio.CancelledError:
+        finished.update(title="Install cancelled", subtitle="")
+        raise
+    finally:
+        events.post_event_sync(events.Event(events.EventType.INSTALL_FINISHED, data=finished), events.gui_event_queue)
+
+
+def run():
+    """Handle each request posted to the backend bus until shutdown."""
+    for event_type, handler in BACKEND_HANDLERS.items():
+        events.backend_event_queue.subscribe(event_type, handler)
+    # Sleeps until a request is posted, requests are handled at the same time on the loop
+    asyncio.run(events.run_worker_async(event_queue=events.backend_event_queue))
@@ -0,0 +1,169 @@
+"""Functions to read inner packages out of MSIX and APPX bundles."""
+
+from msix_global_installer.metadata import BundlePackage
+from typing import BinaryIO, Iterator
+import contextlib
+import io
+import logging
+import shutil
+import struct
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Deflated inner packages are spilled to disk once they grow past this size
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+COPY_CHUNK_BYTES = 1024 * 1024
+
+BUNDLE_EXTENSIONS = (".msixbundle", ".appxbundle")
+PACKAGE_EXTENSIONS = (".msix", ".appx")
+
+BUNDLE_MANIFEST_PATH = "AppxMetadata/AppxBundleManifest.xml"
+BUNDLE_NAMESPACE = {"bundle": "http://schemas.microsoft.com/appx/2013/bundle"}
+# Used when no architecture is requested
+PREFERRED_ARCHITECTURES = ("x64", "neutral", "x86", "arm64", "arm")
+
+
+def is_bundle(path: str) -> bool:
+    """Return True if the path looks like an MSIX or APPX bundle."""
+    return str(path).lower().endswith(BUNDLE_EXTENSIONS)
+
+
+class ZipEntryView(io.RawIOBase):
+    """
+    Read-only, seekable window onto a byte range of another file.
+
+    Used to read a STORED zip entry in place without copying it.
+    The underlying file may be shared with a ZipFile as the view always
+    seeks to its own position before reading.
+    """
+
+    def __init__(self, fileobj: BinaryIO, offset: int, size: int):
+        super().__init__()
+        self._fileobj = fileobj
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        remaining = self._size - self._position
+        if remaining <= 0:
+            return 0
+        view = memoryview(buffer)[: min(len(buffer), remaining)]
+        self._fileobj.seek(self._offset + self._position)
+        read = self._fileobj.readinto(view)
+        self._position += read
+        return read
+
+
+def get_entry_data_offset(fileobj: BinaryIO, info: zipfile.ZipInfo) -> int:
+    """Get the absolute offset of an entry's data by reading its local file header."""
+    fileobj.seek(info.header_offset)
+    header = fileobj.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        raise zipfile.BadZipFile(f"Truncated local header for {info.filename}")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad magic number for local header of {info.filename}")
+    # Name and extra field lengths are the last two fields of the local header
+    filename_length, extra_length = fields[-2], fields[-1]
+    return info.header_offset + zipfile.sizeFileHeader + filename_length + extra_length
+
+
+@contextlib.contextmanager
+def open_inner_package(
+    outer_file: BinaryIO, outer_zip: zipfile.ZipFile, info: zipfile.ZipInfo
+) -> Iterator[BinaryIO]:
+    """
+    Open an inner package of a bundle as a seekable file.
+
+    STORED entries (the usual case) are read in place from the outer file.
+    Compressed entries are copied into a spooled temporary file so memory use
+    stays bounded by SPOOL_MAX_BYTES whatever the package size.
+    """
+    if info.compress_type == zipfile.ZIP_STORED:
+        offset = get_entry_data_offset(outer_file, info)
+        logger.debug("Reading stored inner package %s in place at offset %s", info.filename, offset)
+        with ZipEntryView(outer_file, offset, info.file_size) as view:
+            yield view
+    else:
+        logger.debug("Spooling compressed inner package %s", info.filename)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+            with outer_zip.open(info) as inner:
+                shutil.copyfileobj(inner, spool, COPY_CHUNK_BYTES)
+            spool.seek(0)
+            yield spool
+
+
+def read_bundle_manifest(bundle_zip: zipfile.ZipFile) -> list[BundlePackage]:
+    """
+    Get the table of inner packages from AppxBundleManifest.xml.
+
+    Raises KeyError if the bundle has no manifest.
+    """
+    with bundle_zip.open(BUNDLE_MANIFEST_PATH) as manifest:
+        root = ET.parse(manifest).getroot()
+
+    packages = []
+    for element in root.iterfind("bundle:Packages/bundle:Package", BUNDLE_NAMESPACE):
+        resources = element.findall("bundle:Resources/bundle:Resource", BUNDLE_NAMESPACE)
+        packages.append(
+            BundlePackage(
+                file_name=element.attrib["FileName"],
+                package_type=element.attrib.get("Type", "application"),
+                version=element.attrib.get("Version", "Version not found"),
+                architecture=element.attrib.get("Architecture", "neutral"),
+                resource_id=element.attrib.get("ResourceId"),
+                offset=int(element.attrib.get("Offset", 0)),
+                size=int(element.attrib.get("Size", 0)),
+                languages=[r.attrib["Language"] for r in resources if "Language" in r.attrib],
+                scales=[int(r.attrib["Scale"]) for r in resources if "Scale" in r.attrib],
+            )
+        )
+    return packages
+
+
+def select_package(packages: list[BundlePackage], architecture: str | None = None) -> BundlePackage:
+    """
+    Pick the application package for an architecture.
+
+    Falls back to a neutral package if there isn't one for the requested architecture.
+    With no architecture the first match from PREFERRED_ARCHITECTURES is used.
+    """
+    application_packages = [package for package in packages if package.package_type == "application"]
+    if not application_packages:
+        raise FileNotFoundError("No application package in bundle!")
+
+    by_architecture = {package.architecture.lower(): package for package in reversed(application_packages)}
+    preferences = (architecture.lower(), "neutral") if architecture else PREFERRED_ARCHITECTURES
+    for preference in preferences:
+        if preference in by_architecture:
+            return by_architecture[preference]
+    if architecture:
+        raise FileNotFoundError(f"No {architecture} package in bundle!")
+    return application_packages[0]
@@ -0,0 +1,157 @@
+"""On-disk cache of extracted package data used by the build step."""
+
+from dataclasses import replace
+from msix_global_installer import msix, pickler, staging
+import hashlib
+import logging
+import os
+import pathlib
+import platformdirs
+import shutil
+import struct
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Bump this when the cached data changes shape so old entries are ignored
+CACHE_FORMAT_VERSION = 6
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+METADATA_FILE_NAME = "metadata.bin"
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+def default_cache_dir() -> pathlib.Path:
+    return pathlib.Path(
+        platformdirs.user_cache_dir(appname="msix_global_installer", appauthor="msix_global_installer")
+    )
+
+
+def get_package_fingerprint(path: str | os.PathLike) -> str:
+    """
+    Get a cheap content fingerprint of a package.
+
+    This is a hash of the file size and the zip central directory. The central
+    directory holds the name, size and CRC of every file in the package, so it
+    changes whenever the content does, but it is only a small part of the file.
+    The modification time is not used as CI checkouts change it on every run.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as package:
+        tail_size = min(size, zipfile.sizeEndCentDir + 0xFFFF)
+        package.seek(size - tail_size)
+        tail = package.read(tail_size)
+        end_position = tail.rfind(zipfile.stringEndArchive)
+        if end_position < 0:
+            raise zipfile.BadZipFile(f"{path} is not a zip file")
+        end_record = struct.unpack(zipfile.structEndArchive, tail[end_position : end_position + zipfile.sizeEndCentDir])
+        directory_size, directory_offset = end_record[5], end_record[6]
+        if 0xFFFFFFFF in (directory_size, directory_offset):
+            # Zip64, the real values are in the zip64 end record found through the locator before the end record
+            locator_position = size - tail_size + end_position - zipfile.sizeEndCentDir64Locator
+            package.seek(locator_position)
+            locator = struct.unpack(zipfile.structEndArchive64Locator, package.read(zipfile.sizeEndCentDir64Locator))
+            package.seek(locator[2])
+            end_record_64 = struct.unpack(zipfile.structEndArchive64, package.read(zipfile.sizeEndCentDir64))
+            directory_size, directory_offset = end_record_64[8], end_record_64[9]
+
+        package.seek(directory_offset)
+        remaining = directory_size
+        while remaining > 0:
+            chunk = package.read(min(remaining, READ_CHUNK_BYTES))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated central directory in {path}")
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Cache of package metadata and extracted icons keyed by package fingerprint.
+
+    Each entry is a directory holding the saved metadata and its icon files.
+    Entries are evicted least recently used first once the cache is over max_bytes.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def make_key(self, package_path: str, *options: object) -> str:
+        """Get the key for a package extracted with the given options."""
+        digest = hashlib.sha256(get_package_fingerprint(package_path).encode())
+        digest.update(repr((CACHE_FORMAT_VERSION, *options)).encode())
+        return digest.hexdigest()
+
+    def load(
+        self, key: str, package_path: str, output_icon_path: pathlib.Path | None
+    ) -> msix.MsixMetadata | None:
+        """
+        Get cached metadata, copying its icons to the output path.
+
+        Returns None on a cache miss.
+        """
+        entry_path = self.cache_dir / key
+        try:
+            metadata = pickler.load_metadata(entry_path / METADATA_FILE_NAME)[0]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", key, e)
+            return None
+
+        try:
+            if output_icon_path is not None:
+                for attribute in pickler.PATH_FIELDS:
+                    icon_name = getattr(metadata, attribute)
+                    if icon_name is not None:
+                        destination = pathlib.Path(output_icon_path) / icon_name
+                        shutil.copyfile(entry_path / icon_name, destination)
+                        setattr(metadata, attribute, destination)
+            # Mark as recently used
+            os.utime(entry_path)
+        except OSError as e:
+            # A partial entry, or one evicted by another process, is extracted again
+            logger.warning("Ignoring incomplete cache entry %s: %s", key, e)
+            return None
+        # The same package may be at a different path this time
+        metadata.package_path = package_path
+        for bundle_package in metadata.bundle_packages:
+            if bundle_package.metadata is not None:
+                bundle_package.metadata.package_path = package_path
+        logger.info("Cache hit for %s", package_path)
+        return metadata
+
+    def store(self, key: str, metadata: msix.MsixMetadata) -> None:
+        """Add metadata and the icons it references to the cache."""
+
+        def write(staging_path: pathlib.Path):
+            cached = replace(metadata)
+            for attribute in pickler.PATH_FIELDS:
+                icon_path = getattr(metadata, attribute)
+                if icon_path is not None:
+                    shutil.copyfile(icon_path, staging_path / pathlib.Path(icon_path).name)
+                    setattr(cached, attribute, pathlib.Path(icon_path).name)
+            pickler.save_metadata(staging_path / METADATA_FILE_NAME, [cached])
+
+        staging.write_staged(self.cache_dir / key, write, directory=True)
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        if not self.cache_dir.exists():
+            return
+        entries = []
+        total_bytes = 0
+        for entry_path in self.cache_dir.iterdir():
+            if not entry_path.is_dir() or entry_path.name.startswith(staging.STAGING_PREFIX):
+                continue
+            entry_bytes = sum(file.stat().st_size for file in entry_path.iterdir())
+            entries.append((entry_path.stat().st_mtime_ns, entry_bytes, entry_path))
+            total_bytes += entry_bytes
+        for _, entry_bytes, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            logger.info("Evicting cache entry %s", entry_path.name)
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_bytes -= entry_bytes
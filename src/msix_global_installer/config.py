@@ -1,6 +1,31 @@
 import pathlib
 from msix_global_installer import pyinstaller_helper
 
-EXTRACTED_DATA_PATH: pathlib.Path = pyinstaller_helper.resource_path("extracted/data.pkl")
+EXTRACTED_DATA_PATH: pathlib.Path = pyinstaller_helper.resource_path("extracted/metadata.bin")
+# Payloads built by older versions
+LEGACY_EXTRACTED_DATA_PATH: pathlib.Path = pyinstaller_helper.resource_path("extracted/data.pkl")
+if not pathlib.Path(EXTRACTED_DATA_PATH).exists() and pathlib.Path(LEGACY_EXTRACTED_DATA_PATH).exists():
+    EXTRACTED_DATA_PATH = LEGACY_EXTRACTED_DATA_PATH
 ALLOW_DEPENDENCIES_TO_FAIL_DUE_TO_NEWER_VERSION_INSTALLED = True
 ENABLE_LOGS = True
+# Least severe messages written to the log, DEBUG includes every event posted
+LOG_LEVEL = "INFO"
+# Size the log is rotated at and how many rotated logs are kept
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# Log everything the shell prints while installing, for debugging the output parsing
+LOG_PTY_TRANSCRIPT = False
+# Install dependencies in the same deployment operation as the main package, falls back to one at a time
+INSTALL_DEPENDENCIES_TOGETHER = True
+# Most packages installed at the same time when each package is installed on its own, in dependency order
+MAX_CONCURRENT_INSTALLS = 3
+# Seconds an install may spend in each phase before it's stopped, None for no limit:
+# starting the shell, waiting for the first output, without the progress going up and in total
+SPAWN_TIMEOUT_S: float | None = 60
+FIRST_OUTPUT_TIMEOUT_S: float | None = 120
+NO_PROGRESS_TIMEOUT_S: float | None = 600
+INSTALL_TIMEOUT_S: float | None = 3600
+# Seconds a stopped shell is given to exit before it and everything it started are killed
+SHELL_EXIT_GRACE_S = 5
+# Remember the packages installed so far so a retry after a failure skips them
+ENABLE_INSTALL_JOURNAL = True
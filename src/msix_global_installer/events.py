@@ -1,10 +1,14 @@
-import attr
-import abc
-import asyncio
+from dataclasses import dataclass, field
+import collections
 import enum
-import time
+import queue
+import threading
 import logging
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Awaitable, Callable, ClassVar, Dict, Any
+
+# asyncio is only imported by the functions using it, the GUI imports this module before its first frame
+if TYPE_CHECKING:
+    import asyncio
 
 logger = logging.getLogger(__name__)
 
@@ -14,18 +18,26 @@ class EventType(str, enum.Enum):
     REQUEST_MSIX_METADATA = "request-msix-metadata"
     INSTALL_MSIX = "install-msix"
     INSTALL_PROGRESS_TEXT = "install-msix-progress"
+    # Posted once an install has stopped, whether it succeeded, failed, timed out or was cancelled
+    INSTALL_FINISHED = "install-msix-finished"
+    CANCEL_INSTALL = "cancel-install-msix"
+    SHUTDOWN = "shutdown"
 
 
-@attr.s(frozen=True)
+@dataclass(frozen=True)
 class Event:
     """Generic event type"""
 
-    name: str = attr.ib()
-    data: Dict[str, Any] = attr.ib(kw_only=True, factory=dict)
+    # Only known event types can be posted, an unknown name raises ValueError
+    name: EventType
+    data: Dict[str, Any] = field(kw_only=True, default_factory=dict)
+
+    def __post_init__(self):
+        object.__setattr__(self, "name", EventType(self.name))
 
 
-class EventData(asyncio.Event):
-    """Generic event data to be filled by the event recipient."""
+class EventData(threading.Event):
+    """Generic event data to be filled by the event recipient, on any thread."""
 
     def __init__(self) -> None:
         self.data: Dict[str, Any] = {}
@@ -35,66 +47,363 @@ class EventData(asyncio.Event):
         self.data = result
         self.set()
 
-    async def get_result(self) -> Any:
-        await self.wait()
+    def get_result(self, timeout_s: float | None = None) -> Any:
+        """Wait for the recipient to set the result."""
+        self.wait(timeout_s)
         return self.data
 
 
-gui_event_queue = asyncio.Queue()  # type: asyncio.Queue[Event]
-backend_event_queue = asyncio.Queue()  # type: asyncio.Queue[Event]
+class DropPolicy(str, enum.Enum):
+    """What posting an event to a full bus does."""
 
+    # Wait for room, holding back whoever posts until the events are handled
+    BLOCK = "block"
+    # Drop the event being posted
+    DROP_NEWEST = "drop-newest"
+    # Drop the oldest waiting event of the same type to make room
+    DROP_OLDEST = "drop-oldest"
+    # Merge into the newest waiting event of the same type, later values win
+    MERGE = "merge"
 
-class EventHandler(abc.ABC):
-    """Event handler interface class."""
 
-    @abc.abstractmethod
-    async def handle_event(self, event: Event):  # type: ignore
-        """Consume an event.
+class EventBus:
+    """
+    A bounded, thread safe queue of events with handlers subscribed by event type.
+
+    Any thread can post and receive. Once maxsize events are waiting, posting an
+    event follows the policy for its type, or the bus's policy. If a dropping or
+    merging policy has no waiting event of the same type to act on, the posted
+    event is dropped. Every event taken off the bus is marked done once handled,
+    so join can wait for the bus to be flushed without spinning.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 0,
+        policy: DropPolicy = DropPolicy.BLOCK,
+        topic_policies: dict[EventType, DropPolicy] | None = None,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.topic_policies = dict(topic_policies or {})
+        self.dropped = 0
+        self.merged = 0
+        self._events: collections.deque[Event] = collections.deque()
+        self._handlers: dict[EventType, list[Callable[[Event], Any]]] = {}
+        self._unfinished = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+
+    def __repr__(self) -> str:
+        return f"<EventBus {self.name} waiting={len(self._events)} unfinished={self._unfinished}>"
+
+    def subscribe(self, event_type: EventType, handler: Callable[[Event], Any]) -> None:
+        """Pass events of this type to the handler when they are dispatched."""
+        with self._lock:
+            self._handlers.setdefault(EventType(event_type), []).append(handler)
 
-        The event shall be passed down to child EventHandlers for processing.
+    def unsubscribe(self, event_type: EventType, handler: Callable[[Event], Any]) -> None:
+        with self._lock:
+            self._handlers.get(EventType(event_type), []).remove(handler)
+
+    def handlers(self, event_type: EventType) -> list[Callable[[Event], Any]]:
+        """Get the handlers subscribed to an event type."""
+        with self._lock:
+            return list(self._handlers.get(event_type, []))
+
+    def dispatch(self, event: Event) -> int:
+        """Pass an event to each handler subscribed to its type, returning how many there were."""
+        handlers = self.handlers(event.name)
+        if not handlers:
+            logger.debug("No handler for %s on the %s bus", event.name, self.name)
+        for handler in handlers:
+            handler(event)
+        return len(handlers)
+
+    def put(self, event: Event, block: bool = True, timeout: float | None = None) -> bool:
+        """
+        Post an event, returning whether it was queued or merged rather than dropped.
+
+        Raises queue.Full if the bus is full, the event's policy is to block and
+        there is still no room after timeout seconds, or straight away if not block.
         """
-        pass
+        policy = self.topic_policies.get(event.name, self.policy)
+        with self._not_full:
+            if self._is_full():
+                if policy == DropPolicy.BLOCK:
+                    if not block or not self._not_full.wait_for(lambda: not self._is_full(), timeout):
+                        raise queue.Full(f"The {self.name} event bus is full")
+                elif policy == DropPolicy.MERGE and (index := self._find_waiting(event.name, newest=True)) is not None:
+                    waiting = self._events[index]
+                    self._events[index] = Event(event.name, data={**waiting.data, **event.data})
+                    self.merged += 1
+                    return True
+                elif policy == DropPolicy.DROP_OLDEST and (index := self._find_waiting(event.name)) is not None:
+                    logger.warning("Dropping %s, the %s event bus is full", self._events[index], self.name)
+                    del self._events[index]
+                    self._unfinished -= 1
+                    self.dropped += 1
+                else:
+                    logger.warning("Dropping %s, the %s event bus is full", event, self.name)
+                    self.dropped += 1
+                    return False
+            self._events.append(event)
+            self._unfinished += 1
+            self._not_empty.notify()
+            return True
+
+    def put_nowait(self, event: Event) -> bool:
+        return self.put(event, block=False)
+
+    def get(self, block: bool = True, timeout: float | None = None) -> Event:
+        """Receive the oldest event, raising queue.Empty if there is none after timeout seconds."""
+        with self._not_empty:
+            if not self._events and (not block or not self._not_empty.wait_for(lambda: self._events, timeout)):
+                raise queue.Empty
+            event = self._events.popleft()
+            self._not_full.notify()
+            return event
+
+    def get_nowait(self) -> Event:
+        return self.get(block=False)
+
+    def task_done(self) -> None:
+        """Mark an event taken off the bus as handled."""
+        with self._all_done:
+            if self._unfinished <= 0:
+                raise ValueError("task_done() called too many times")
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._all_done.notify_all()
 
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait until every posted event has been handled, returning False on timeout."""
+        with self._all_done:
+            return self._all_done.wait_for(lambda: self._unfinished == 0, timeout)
 
-async def post_event(event: Event, event_queue: asyncio.Queue) -> None:
-    """Post an event to the queue."""
-    logger.debug("Posting event: %s", str(event))
-    await event_queue.put(event)
+    def qsize(self) -> int:
+        with self._lock:
+            return len(self._events)
 
+    def empty(self) -> bool:
+        return self.qsize() == 0
 
-def post_event_sync(event: Event, event_queue: asyncio.Queue) -> None:
-    """Post an event without waiting."""
-    logger.info("Received non async event %s", str(event))
-    event_queue.put_nowait(event)
+    def _is_full(self) -> bool:
+        return 0 < self.maxsize <= len(self._events)
+
+    def _find_waiting(self, event_type: EventType, newest: bool = False) -> int | None:
+        indexes = range(len(self._events) - 1, -1, -1) if newest else range(len(self._events))
+        for index in indexes:
+            if self._events[index].name == event_type:
+                return index
+        return None
+
+
+# A GUI that has fallen this far behind is stalled, so progress merges rather than holding back installs
+GUI_EVENT_QUEUE_SIZE = 1024
+BACKEND_EVENT_QUEUE_SIZE = 64
+
+gui_event_queue = EventBus(
+    "gui", GUI_EVENT_QUEUE_SIZE, topic_policies={EventType.INSTALL_PROGRESS_TEXT: DropPolicy.MERGE}
+)
+# The worker blocks on it until the GUI posts a request
+backend_event_queue = EventBus("backend", BACKEND_EVENT_QUEUE_SIZE)
 
 
-async def wait_for_queue(timeout_s: int, event_queue: asyncio.Queue) -> None:
-    """Wait for the event queue to be empty."""
-    initial_time = time.monotonic_ns()
-    timeout_ns = timeout_s * int(1e9)
-    while True:
-        current_time = time.monotonic_ns()
-        await asyncio.sleep(0)
-        if current_time - initial_time > timeout_ns:
-            raise TimeoutError(f"Timed out waiting for event queue to clear. Events: {str(event_queue)}")
-        elif event_queue.empty():
-            break
+def handles(*event_types: EventType):
+    """Mark an EventHandler method as handling events of these types."""
 
+    def mark(method):
+        method.handled_event_types = event_types
+        return method
 
-async def receive_event(event_queue: asyncio.Queue) -> Event:
-    """Receive an event from the event queue.
+    return mark
 
-    This function will wait indefinitely on an empty queue until an event is available.
+
+class EventHandler:
+    """
+    Event handler base class.
+
+    Events are passed to the methods marked with handles for their type, found in
+    a table built for each class. Events without a method are ignored.
     """
-    logger.info("Receiving events...")
-    return await event_queue.get()
 
+    event_table: ClassVar[dict[EventType, str]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.event_table = dict(cls.event_table)
+        for attribute_name, attribute in vars(cls).items():
+            for event_type in getattr(attribute, "handled_event_types", ()):
+                cls.event_table[event_type] = attribute_name
 
-def receive_event_sync(event_queue: asyncio.Queue) -> Event | None:
+    def handle_event(self, event: Event) -> None:
+        """Consume an event.
+
+        Containers override this to pass the event down to their child EventHandlers.
+        """
+        method_name = self.event_table.get(event.name)
+        if method_name is not None:
+            getattr(self, method_name)(event)
+
+
+async def post_event(event: Event, event_queue: EventBus | queue.Queue) -> None:
+    """Post an event to the queue, waiting on the executor if it's full."""
+    import asyncio
+
+    logger.debug("Posting event: %s", event)
+    try:
+        event_queue.put_nowait(event)
+    except queue.Full:
+        await asyncio.get_running_loop().run_in_executor(None, event_queue.put, event)
+
+
+def post_event_sync(event: Event, event_queue: EventBus | queue.Queue) -> None:
+    """Post an event from any thread, waiting for room if the queue is full and its policy is to block."""
+    logger.debug("Received non async event %s", event)
+    event_queue.put(event)
+
+
+async def wait_for_queue(timeout_s: float, event_queue: EventBus) -> None:
+    """Wait for every event on the bus to be handled."""
+    import asyncio
+
+    if not await asyncio.get_running_loop().run_in_executor(None, event_queue.join, timeout_s):
+        raise TimeoutError(f"Timed out waiting for event queue to clear. Events: {str(event_queue)}")
+
+
+def receive_event_sync(event_queue: "EventBus | asyncio.Queue | queue.Queue") -> Event | None:
     try:
         # Non-blocking queue check
         event = event_queue.get_nowait()
         return event
-    except asyncio.QueueEmpty:
+    except queue.Empty:
         # No events in the queue, continue
         return None
+    except Exception as e:
+        # An asyncio.Queue has its own exception, asyncio is already imported if one was passed
+        import asyncio
+
+        if isinstance(e, asyncio.QueueEmpty):
+            return None
+        raise
+
+
+def drain_events(event_queue: "EventBus | asyncio.Queue | queue.Queue") -> list[Event]:
+    """Receive every event currently on the queue without waiting."""
+    drained = []
+    while (event := receive_event_sync(event_queue)) is not None:
+        drained.append(event)
+    return drained
+
+
+def coalesce_progress_events(pending: list[Event]) -> list[Event]:
+    """Merge each run of consecutive progress events into one event.
+
+    Later values win so the merged event has the last title, subtitle and progress.
+    Other events are kept in order.
+    """
+    coalesced: list[Event] = []
+    for event in pending:
+        previous = coalesced[-1] if coalesced else None
+        if (
+            previous is not None
+            and event.name == EventType.INSTALL_PROGRESS_TEXT
+            and previous.name == EventType.INSTALL_PROGRESS_TEXT
+        ):
+            coalesced[-1] = Event(event.name, data={**previous.data, **event.data})
+        else:
+            coalesced.append(event)
+    return coalesced
+
+
+def pump_events(event_queue: EventBus | queue.Queue, handler: Callable[[Event], None] | None = None) -> int:
+    """Handle every pending event, merging runs of progress events first.
+
+    Without a handler, events are dispatched to the bus's subscribers.
+    Returns the number of events taken off the queue.
+    """
+    if handler is None:
+        handler = event_queue.dispatch
+    pending = drain_events(event_queue)
+    try:
+        for event in coalesce_progress_events(pending):
+            handler(event)
+    finally:
+        for _ in pending:
+            event_queue.task_done()
+    return len(pending)
+
+
+def receive_event_blocking(event_queue: EventBus | queue.Queue, timeout_s: float | None = None) -> Event | None:
+    """Receive an event, waiting until one is posted.
+
+    Returns None if there is still no event after timeout_s. With no timeout this waits forever.
+    """
+    try:
+        return event_queue.get(timeout=timeout_s)
+    except queue.Empty:
+        return None
+
+
+async def run_worker_async(
+    event_queue: EventBus | queue.Queue,
+    handler: Callable[[Event], Awaitable[None]] | None = None,
+    idle_timeout_s: float | None = None,
+) -> None:
+    """Handle each event on the queue as a task on the running loop until a SHUTDOWN event is received.
+
+    Without a handler, each of the bus's subscribers to the event's type gets a task.
+    Events are waited for in the loop's executor, so the loop is free to run the
+    tasks of earlier events, such as installs, at the same time. An event is done
+    once all its tasks are. Tasks still running at shutdown are cancelled.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+
+    def start(event: Event) -> None:
+        handlers = [handler] if handler is not None else event_queue.handlers(event.name)
+        if not handlers:
+            logger.debug("No handler for %s", event.name)
+            event_queue.task_done()
+            return
+        remaining = [len(handlers)]
+
+        def task_done(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error("Handling %s failed", task.get_name(), exc_info=task.exception())
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                event_queue.task_done()
+
+        for event_handler in handlers:
+            task = asyncio.create_task(event_handler(event), name=str(event.name))
+            tasks.add(task)
+            task.add_done_callback(task_done)
+
+    try:
+        while True:
+            event = await loop.run_in_executor(None, receive_event_blocking, event_queue, idle_timeout_s)
+            if event is None:
+                continue
+            if event.name == EventType.SHUTDOWN:
+                logger.info("Worker shutting down")
+                event_queue.task_done()
+                return
+            start(event)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def post_shutdown(event_queue: EventBus | queue.Queue) -> None:
+    """Ask the worker reading from the queue to stop."""
+    post_event_sync(Event(EventType.SHUTDOWN), event_queue)
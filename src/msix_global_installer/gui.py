@@ -1,8 +1,8 @@
 from tkinter import ttk
-from PIL import ImageTk, Image
-from msix_global_installer import config, events, msix, pyinstaller_helper, pickler
+from msix_global_installer import events, store
+from msix_global_installer.metadata import MsixMetadata
+from typing import Callable
 import logging
-import pyuac
 import tkinter
 
 # Theme
@@ -11,40 +11,85 @@ import sv_ttk
 
 logger = logging.getLogger(__name__)
 
+# How often to check for events while installing or handling events, and while idle
+ACTIVE_TICK_MS = 20
+IDLE_TICK_MS = 100
+# Events the backend posts to the GUI, each is passed on to the current frame
+GUI_EVENT_TYPES = (
+    events.EventType.MSIX_METADATA_RECEIVED,
+    events.EventType.INSTALL_PROGRESS_TEXT,
+    events.EventType.INSTALL_FINISHED,
+)
+
 
 def post_backend_event(event: events.Event):
     events.post_event_sync(event, events.backend_event_queue)
 
 
+def photo_image(png_data: str) -> tkinter.PhotoImage:
+    """Load an icon rendered by the build step, Tk decodes the PNG itself."""
+    return tkinter.PhotoImage(data=png_data, format="png")
+
+
+# pyuac is imported when first used, which is after the first frame has been drawn. The app loads it
+# on a background thread in the meantime, so the first use doesn't usually wait for the import.
+def load_pyuac():
+    import pyuac
+
+    return pyuac
+
+
 class MainApplication(ttk.Frame):
     def __init__(self, parent, *args, **kwargs):
         ttk.Frame.__init__(self, parent, *args, **kwargs)
         self.parent: tkinter.Tk = parent
         self._frame: ttk.Frame = None
+        self.is_drawn = False
+        self.drawn_callbacks: list[Callable[[], None]] = []
+        self.when_drawn(self.set_icon)
 
         self.parent.title("Install MSIX Application")
 
         self.switch_frame(InfoScreenContainer)
         sv_ttk.set_theme("dark")
-        self.set_icon()
+
+        for event_type in GUI_EVENT_TYPES:
+            events.gui_event_queue.subscribe(event_type, self.handle_event)
 
         # Start the asyncio loop
-        self.parent.after(100, self.check_queue)
+        self.parent.after(IDLE_TICK_MS, self.check_queue)
 
     def set_icon(self):
         """Set the window icon."""
-        meta = pickler.load_metadata(config.EXTRACTED_DATA_PATH)[0]
-        image_to_iconify = Image.open(pyinstaller_helper.resource_path(meta.icon_path))
-        icon_in_correct_format = ImageTk.PhotoImage(image_to_iconify)
-        self.parent.wm_iconphoto(False, icon_in_correct_format)
+        meta = store.metadata_store.main()
+        if not meta.window_icons:
+            logger.warning("No window icons in the payload, keeping the default icon")
+            return
+        self.parent.wm_iconphoto(False, *(photo_image(icon) for icon in meta.window_icons))
+
+    def when_drawn(self, callback: Callable[[], None]):
+        """Call back once the first frame has been drawn, for work that would otherwise hold it up."""
+        if self.is_drawn:
+            self.after_idle(callback)
+        else:
+            self.drawn_callbacks.append(callback)
+
+    def first_frame_drawn(self):
+        """Run the callbacks held back until the first frame was drawn."""
+        self.is_drawn = True
+        for callback in self.drawn_callbacks:
+            self.after_idle(callback)
+        self.drawn_callbacks.clear()
 
     def check_queue(self):
-        """Check the event queue."""
-        event = events.receive_event_sync(events.gui_event_queue)
-        if event is not None:
-            logger.info("Handling gui event: %s", event)
-            self._frame.handle_event(event)
-        self.parent.after(100, self.check_queue)
+        """Handle every pending event, then check again sooner if there is work going on."""
+        handled = events.pump_events(events.gui_event_queue)
+        is_active = handled > 0 or (isinstance(self._frame, InstallScreen) and self._frame.is_installing)
+        self.parent.after(ACTIVE_TICK_MS if is_active else IDLE_TICK_MS, self.check_queue)
+
+    def handle_event(self, event: events.Event):
+        logger.debug("Handling gui event: %s", event)
+        self._frame.handle_event(event)
 
     def switch_frame(self, frame: ttk.Frame):
         logger.info("Switching to frame %s", frame)
@@ -84,16 +129,17 @@ class InfoScreenImage(ttk.Frame, events.EventHandler):
         ttk.Frame.__init__(self, parent, *args, **kwargs)
         self.parent: tkinter.Tk = parent
 
-    def handle_event(self, event: events.Event):
-        """Handle events on the queue."""
-        if event.name == events.EventType.MSIX_METADATA_RECEIVED:
-            # Only need the image from the first metadata entry
-            metadata: msix.MsixMetadata = event.data[0]
-            image_path = pyinstaller_helper.resource_path(metadata.scaled_icon_path)
-            scaled_image = Image.open(image_path)
-            self.img = ImageTk.PhotoImage(scaled_image)
-            panel = ttk.Label(self.parent, image=self.img)
-            panel.grid(row=0, column=0)
+    @events.handles(events.EventType.MSIX_METADATA_RECEIVED)
+    def show_icon(self, event: events.Event):
+        """Show the main package's icon."""
+        # Only need the image from the first metadata entry
+        metadata: MsixMetadata = event.data[0]
+        if metadata.panel_icon is None:
+            logger.warning("No icon in the payload for %s", metadata.package_name)
+            return
+        self.img = photo_image(metadata.panel_icon)
+        panel = ttk.Label(self.parent, image=self.img)
+        panel.grid(row=0, column=0)
 
 
 class InfoScreen(ttk.Frame, events.EventHandler):
@@ -129,8 +175,8 @@ class InfoScreen(ttk.Frame, events.EventHandler):
         install_type_label.grid(row=4, column=0, sticky="W")
 
         self.global_install_checkbox_state = tkinter.BooleanVar(self)
-        is_admin = pyuac.isUserAdmin()
-        self.global_install_checkbox_state.set(is_admin)
+        # Checking for admin needs pyuac, so don't hold up the first frame for it
+        self.parent.parent.when_drawn(self.show_install_type)
         global_install_checkbox = ttk.Checkbutton(
             self,
             variable=self.global_install_checkbox_state,
@@ -145,29 +191,33 @@ class InfoScreen(ttk.Frame, events.EventHandler):
         )
         button.grid(row=5, column=1)
 
+    def show_install_type(self):
+        """Install for all users by default when running as admin."""
+        self.global_install_checkbox_state.set(load_pyuac().isUserAdmin())
+
     def on_checkbox_change(self):
         """On change to checkbox."""
         # Run as admin if not and it's asked for.
         if self.global_install_checkbox_state.get():
-            if not pyuac.isUserAdmin():
+            if not load_pyuac().isUserAdmin():
                 # First hide the window
                 self.parent.parent.parent.withdraw()
                 # Then run as admin which blocks until complete
-                pyuac.runAsAdmin()
+                load_pyuac().runAsAdmin()
                 # Then close the first application (which is currently hidden)
                 self.parent.parent.parent.quit()
 
-    def handle_event(self, event: events.Event):
-        """Handle events on the queue."""
-        if event.name == events.EventType.MSIX_METADATA_RECEIVED:
-            all_data: list[msix.MsixMetadata] = event.data
-            data = all_data[0]
-            title_text = f"Install {data.package_name}"
-            self.title.configure(text=title_text)
-            self.version_content.configure(text=data.version)
-            self.author_content.configure(text=data.publisher)
-            dep_count = len(all_data) - 1
-            self.dependency_count.configure(text=dep_count)
+    @events.handles(events.EventType.MSIX_METADATA_RECEIVED)
+    def show_metadata(self, event: events.Event):
+        """Show the main package's details."""
+        all_data: list[MsixMetadata] = event.data
+        data = all_data[0]
+        title_text = f"Install {data.package_name}"
+        self.title.configure(text=title_text)
+        self.version_content.configure(text=data.version)
+        self.author_content.configure(text=data.publisher)
+        dep_count = len(all_data) - 1
+        self.dependency_count.configure(text=dep_count)
 
     def install(self):
         """Install the MSIX."""
@@ -176,12 +226,14 @@ class InfoScreen(ttk.Frame, events.EventHandler):
         post_backend_event(events.Event(events.EventType.INSTALL_MSIX, data=event_data))
 
 
-class InstallScreen(ttk.Frame):
+class InstallScreen(ttk.Frame, events.EventHandler):
     pad_parameters = {"padx": 48, "pady": 54}
 
     def __init__(self, parent, *args, **kwargs):
         ttk.Frame.__init__(self, parent, *args, **kwargs)
         self.parent: tkinter.Tk = parent
+        # Until INSTALL_FINISHED arrives, events are checked for more often while this is set
+        self.is_installing = True
 
         self.title = ttk.Label(self, text="Starting...")
         self.title.grid(row=0, column=0)
@@ -193,40 +245,73 @@ class InstallScreen(ttk.Frame):
         self.progress.grid(row=2, column=0)
         self.progress.start(interval=2000)
 
-        done_button = ttk.Button(
+        self.cancel_button = ttk.Button(
+            self,
+            text="Cancel",
+            command=self.cancel,
+        )
+        self.cancel_button.grid(row=3, column=0)
+
+        # Only once the install has finished, so another can't be started while it runs
+        self.done_button = ttk.Button(
             self,
             text="Done",
             command=lambda: self.parent.switch_frame(InfoScreenContainer),
         )
-        done_button.grid(row=3, column=0)
-
-    def handle_event(self, event: events.Event):
-        if event.name == events.EventType.INSTALL_PROGRESS_TEXT:
-            try:
-                text = event.data["title"]
-                self.title.configure(text=text)
-            except KeyError:
-                # Main text wasn't included in the data
-                pass
-            try:
-                text = event.data["subtitle"]
-                self.subtitle.configure(text=text)
-            except KeyError:
-                # Sub text wasn't included in the data
-                pass
-            try:
-                progress_percentage = int(event.data["progress"])
-                logger.info("Updating progress bar to: %s", progress_percentage)
-                self.progress.stop()
-                self.progress.step(progress_percentage)
-            except KeyError:
-                # Progress wasn't included in the data
-                pass
-
-
-async def main():
+        self.done_button.state(["disabled"])
+        self.done_button.grid(row=4, column=0)
+
+    def cancel(self):
+        """Ask the backend to stop the install, the install screen updates once it has."""
+        self.cancel_button.state(["disabled"])
+        self.title.configure(text="Cancelling...")
+        post_backend_event(events.Event(events.EventType.CANCEL_INSTALL))
+
+    @events.handles(events.EventType.INSTALL_FINISHED)
+    def show_finished(self, event: events.Event):
+        self.is_installing = False
+        self.cancel_button.state(["disabled"])
+        self.done_button.state(["!disabled"])
+        if "title" in event.data:
+            self.title.configure(text=event.data["title"])
+            self.subtitle.configure(text=event.data["subtitle"])
+            self.progress.stop()
+            self.progress.configure(mode="determinate", value=0)
+
+    @events.handles(events.EventType.INSTALL_PROGRESS_TEXT)
+    def show_progress(self, event: events.Event):
+        try:
+            text = event.data["title"]
+            self.title.configure(text=text)
+        except KeyError:
+            # Main text wasn't included in the data
+            pass
+        try:
+            text = event.data["subtitle"]
+            self.subtitle.configure(text=text)
+        except KeyError:
+            # Sub text wasn't included in the data
+            pass
+        try:
+            progress_percentage = int(event.data["progress"])
+            logger.debug("Updating progress bar to: %s", progress_percentage)
+            self.progress.stop()
+            # Set rather than step the value as progress events are merged before they get here
+            self.progress.configure(mode="determinate", value=progress_percentage)
+        except KeyError:
+            # Progress wasn't included in the data
+            pass
+
+
+def main(on_first_frame: Callable[[tkinter.Tk], None] | None = None):
     root = tkinter.Tk()
-    MainApplication(root).grid()
+    main_application = MainApplication(root)
+    main_application.grid()
+    # Draw the first frame, then load what isn't needed straight away
+    root.update()
+    main_application.first_frame_drawn()
+    if on_first_frame is not None:
+        on_first_frame(root)
     root.mainloop()
 
 
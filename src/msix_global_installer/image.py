@@ -1,16 +1,123 @@
+"""Render the installer's icons from the package logo, used by the build step."""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from msix_global_installer import staging
 from PIL import Image
+import base64
+import hashlib
+import io
+import logging
+import os
 import pathlib
 
+logger = logging.getLogger(__name__)
+
+# Every size rendered, from one decode of the source
+ICON_SIZES = (16, 24, 32, 48, 64, 100, 256)
+# Sizes rendered for the window icon, largest first as Tk expects, and the icon shown next to the package details
+WINDOW_ICON_SIZES = (48, 32, 24, 16)
+PANEL_ICON_SIZE = 100
+# Sizes in the executable's .ico, Windows picks the closest one for each view and display scale
+ICO_SIZES = (16, 24, 32, 48, 64, 256)
+# Large sources are reduced with a box filter to at least this many times the largest size before resampling
+REDUCING_GAP = 2
+# Bump this when the rendered output changes so cached icons are rendered again
+ICON_FORMAT_VERSION = 1
+ICO_FILE_NAME = "icon.ico"
+
+
+@dataclass
+class IconSet:
+    """An icon rendered at every size in ICON_SIZES."""
+
+    # PNG data by size in pixels
+    pngs: dict[int, bytes]
+    ico: bytes
 
-def scale_image(image_path, width, height) -> Image:
-    """Scale an image and return it."""
-    # Open the image using Pillow
-    img = Image.open(image_path)
-    # Resize the image to the specified width and height
-    img = img.resize((width, height), Image.Resampling.BICUBIC)
+    def encoded(self, size: int) -> str:
+        """Get the icon at a size as base64 PNG data, which tkinter.PhotoImage loads without Pillow."""
+        return base64.b64encode(self.pngs[size]).decode("ascii")
+
+
+def load_source(image_path, largest: int) -> Image.Image:
+    """
+    Decode the source once, no larger than the largest size needs.
+
+    JPEG sources are scaled down while decoding. Anything still much larger
+    than needed is reduced by a whole factor, which is far cheaper than
+    resampling the full image for every size.
+    """
+    target = largest * REDUCING_GAP
+    with Image.open(image_path) as source:
+        # Only JPEG decoders support this, other formats ignore it
+        source.draft(None, (target, target))
+        img = source.convert("RGBA")
+    factor = min(img.size) // target
+    if factor > 1:
+        img = img.reduce(factor)
     return img
 
 
-def save_image(img: Image, path: pathlib.Path):
-    """Save a given image"""
-    img.save(path)
+def render_size(source: Image.Image, size: int) -> bytes:
+    """Resample the source to a square icon and encode it as PNG."""
+    buffer = io.BytesIO()
+    source.resize((size, size), Image.Resampling.LANCZOS).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_icons(image_path, jobs: int | None = None) -> IconSet:
+    """Render the icon at every size, and as an .ico, from a single decode of the source."""
+    source = load_source(image_path, max(ICON_SIZES))
+    # Pillow releases the GIL while resampling and compressing
+    with ThreadPoolExecutor(max_workers=jobs or min(len(ICON_SIZES), os.cpu_count() or 1)) as executor:
+        pngs = dict(zip(ICON_SIZES, executor.map(lambda size: render_size(source, size), ICON_SIZES)))
+    frames = [Image.open(io.BytesIO(pngs[size])) for size in ICO_SIZES]
+    buffer = io.BytesIO()
+    # Every frame is given so the .ico holds the icons rendered here rather than Pillow rescaling the largest
+    frames[-1].save(buffer, format="ICO", sizes=[frame.size for frame in frames], append_images=frames[:-1])
+    return IconSet(pngs, buffer.getvalue())
+
+
+def get_source_hash(image_path) -> str:
+    """Get the key for a source image rendered by this version of the pipeline."""
+    digest = hashlib.sha256(repr((ICON_FORMAT_VERSION, ICON_SIZES, ICO_SIZES)).encode())
+    with open(image_path, "rb") as source:
+        digest.update(source.read())
+    return digest.hexdigest()
+
+
+def render_icons_cached(
+    image_path, cache_dir: pathlib.Path | None = None, jobs: int | None = None, rebuild: bool = False
+) -> IconSet:
+    """
+    Render the icons, or load them from the cache if this source has been rendered before.
+
+    Entries sit alongside the extraction cache's, so they are evicted with them. Rebuild
+    ignores an existing entry and replaces it.
+    """
+    if cache_dir is None:
+        return render_icons(image_path, jobs)
+    entry_path = pathlib.Path(cache_dir) / f"icons-{get_source_hash(image_path)}"
+    if not rebuild:
+        try:
+            icons = IconSet(
+                {size: (entry_path / f"{size}.png").read_bytes() for size in ICON_SIZES},
+                (entry_path / ICO_FILE_NAME).read_bytes(),
+            )
+            # Mark as recently used
+            os.utime(entry_path)
+            logger.info("Icon cache hit for %s", image_path)
+            return icons
+        except FileNotFoundError:
+            pass
+
+    icons = render_icons(image_path, jobs)
+
+    def write(staging_path: pathlib.Path):
+        for size, png in icons.pngs.items():
+            (staging_path / f"{size}.png").write_bytes(png)
+        (staging_path / ICO_FILE_NAME).write_bytes(icons.ico)
+
+    staging.write_staged(entry_path, write, directory=True)
+    return icons
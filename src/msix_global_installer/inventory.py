@@ -0,0 +1,173 @@
+"""Find the packages already installed so dependencies that are satisfied can be skipped."""
+
+from dataclasses import dataclass
+from msix_global_installer import config, session, watchdog
+from msix_global_installer.metadata import MsixMetadata
+from typing import Awaitable, Callable, Iterable, Iterator
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Values of the Windows ProcessorArchitecture enum, which is written to JSON as a number
+ARCHITECTURE_NAMES = {0: "x86", 5: "arm", 9: "x64", 11: "neutral", 12: "arm64"}
+
+
+@dataclass
+class InstalledPackage:
+    name: str
+    version: str
+    architecture: str
+
+
+# Gets every installed package, so the decision can be made without a shell in tests
+AsyncInventorySource = Callable[[], Awaitable[list[InstalledPackage]]]
+
+
+def parse_version(version: str) -> tuple[int, ...]:
+    """Get a package version as numbers so versions compare correctly."""
+    try:
+        return tuple(int(part) for part in version.split("."))
+    except ValueError:
+        return ()
+
+
+def build_inventory_command(output_path: pathlib.Path, global_install: bool = False) -> str:
+    """
+    Get the PowerShell to write every installed package to a file as JSON.
+
+    The JSON goes to a file as the terminal wraps long lines. Global installs
+    are checked against the packages provisioned for all users.
+    """
+    if global_install:
+        packages = "Get-AppxProvisionedPackage -Online | Select-Object DisplayName, Version, Architecture"
+    else:
+        packages = "Get-AppxPackage | Select-Object Name, Version, Architecture"
+    output = session.quote_path(output_path)
+    return f"{packages} | ConvertTo-Json -Compress | Set-Content -Encoding UTF8 -Path {output}"
+
+
+def parse_inventory(text: str) -> list[InstalledPackage]:
+    """Read the JSON written by the inventory command."""
+    if not text.strip():
+        return []
+    records = json.loads(text)
+    # A single package isn't written as a list
+    if isinstance(records, dict):
+        records = [records]
+    installed = []
+    for record in records:
+        architecture = record.get("Architecture")
+        if isinstance(architecture, int):
+            architecture = ARCHITECTURE_NAMES.get(architecture, str(architecture))
+        installed.append(
+            InstalledPackage(
+                name=record.get("Name") or record.get("DisplayName") or "",
+                version=str(record.get("Version", "")),
+                architecture=str(architecture or "neutral").lower(),
+            )
+        )
+    return installed
+
+
+@contextlib.contextmanager
+def inventory_file() -> Iterator[pathlib.Path]:
+    """Get a temporary file for the inventory command to write to, removed afterwards."""
+    file_descriptor, output_name = tempfile.mkstemp(suffix=".json", prefix="msix_inventory_")
+    os.close(file_descriptor)
+    output_path = pathlib.Path(output_name)
+    try:
+        yield output_path
+    finally:
+        output_path.unlink(missing_ok=True)
+
+
+async def query_installed_packages_async(
+    shell_session: session.AsyncPowerShellSession,
+    global_install: bool = False,
+    timeouts: watchdog.Timeouts | None = None,
+) -> list[InstalledPackage]:
+    """
+    Get every installed package with one query, run on the event loop.
+
+    Starting the shell and the query are held to the spawn and total timeouts,
+    config's by default. If one passes the shell is stopped and
+    InstallTimeoutError raised, a stuck deployment service hangs the query too.
+    """
+    if timeouts is None:
+        timeouts = watchdog.Timeouts.from_config()
+    query_watchdog = watchdog.Watchdog(watchdog.Timeouts(spawn_s=timeouts.spawn_s, total_s=timeouts.total_s))
+
+    async def query() -> list[InstalledPackage]:
+        await shell_session.start()
+        query_watchdog.spawned()
+        with inventory_file() as output_path:
+            if not await shell_session.execute(build_inventory_command(output_path, global_install)):
+                raise RuntimeError("Failed to list the installed packages")
+            return parse_inventory(output_path.read_text(encoding="utf-8-sig"))
+
+    try:
+        return await query_watchdog.guard(query())
+    except watchdog.InstallTimeoutError:
+        # The shell is still busy with the query, the install starts a new one
+        await shell_session.terminate()
+        raise
+
+
+def is_satisfied(metadata: MsixMetadata, installed_by_name: dict[str, list[InstalledPackage]]) -> bool:
+    """Return True if the same or a newer version of a package is installed for the same architecture."""
+    if not metadata.identity_name:
+        # Payloads from older versions don't have the identity name to compare
+        return False
+    version = parse_version(metadata.version)
+    for installed in installed_by_name.get(metadata.identity_name.lower(), []):
+        same_architecture = metadata.architecture is None or installed.architecture == metadata.architecture.lower()
+        if same_architecture and parse_version(installed.version) >= version:
+            return True
+    return False
+
+
+def skip_installed_dependencies(
+    metadata_list: list[MsixMetadata], installed: Iterable[InstalledPackage]
+) -> list[MsixMetadata]:
+    """Drop the dependencies, everything after the main package, that are already installed."""
+    installed_by_name: dict[str, list[InstalledPackage]] = {}
+    for package in installed:
+        installed_by_name.setdefault(package.name.lower(), []).append(package)
+    main, dependencies = metadata_list[0], metadata_list[1:]
+    needed = [main]
+    for dependency in dependencies:
+        if is_satisfied(dependency, installed_by_name):
+            logger.info("Skipping %s %s, it's already installed", dependency.identity_name, dependency.version)
+        else:
+            needed.append(dependency)
+    return needed
+
+
+async def plan_install_async(
+    metadata_list: list[MsixMetadata], inventory_source: AsyncInventorySource
+) -> list[MsixMetadata]:
+    """
+    Get the packages that need installing, main package first.
+
+    Dependencies are only skipped if config allows them to already be installed.
+    If the installed packages can't be listed every package is installed.
+    """
+    if not needs_inventory(metadata_list):
+        return metadata_list
+    try:
+        installed = await inventory_source()
+    # InstallTimeoutError is an OSError, a query that hung installs everything too
+    except (OSError, RuntimeError, ValueError) as e:
+        logger.warning("Couldn't list installed packages, installing every dependency: %s", e)
+        return metadata_list
+    return skip_installed_dependencies(metadata_list, installed)
+
+
+def needs_inventory(metadata_list: list[MsixMetadata]) -> bool:
+    """Return True if there are dependencies config allows to be skipped."""
+    return len(metadata_list) > 1 and config.ALLOW_DEPENDENCIES_TO_FAIL_DUE_TO_NEWER_VERSION_INSTALLED
@@ -0,0 +1,107 @@
+"""Record which packages of an install have succeeded so a retry carries on where it stopped."""
+
+from msix_global_installer import staging
+from msix_global_installer.metadata import MsixMetadata
+import hashlib
+import json
+import logging
+import pathlib
+import platformdirs
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bump this when the journal changes shape so old journals are ignored
+JOURNAL_FORMAT_VERSION = 1
+JOURNAL_FILE_NAME = "install_journal.json"
+
+
+def default_journal_path() -> pathlib.Path:
+    return (
+        pathlib.Path(platformdirs.user_data_dir(appname="msix_global_installer", appauthor="msix_global_installer"))
+        / JOURNAL_FILE_NAME
+    )
+
+
+def get_package_key(metadata: MsixMetadata) -> str:
+    """Get what identifies one package of the payload."""
+    name = metadata.identity_name or metadata.package_name
+    return f"{name}_{metadata.version}_{metadata.architecture or 'neutral'}_{metadata.publisher}"
+
+
+def get_payload_key(metadata_list: list[MsixMetadata], global_install: bool) -> str:
+    """Get what identifies the payload, which changes if any package or the install scope does."""
+    digest = hashlib.sha256(repr((JOURNAL_FORMAT_VERSION, global_install)).encode())
+    for metadata in metadata_list:
+        digest.update(get_package_key(metadata).encode() + b"\0")
+    return digest.hexdigest()
+
+
+class InstallJournal:
+    """
+    The packages of a payload installed so far, saved after each one.
+
+    A journal written for a different payload, such as after the app is
+    updated, is ignored and replaced. The journal is cleared once the whole
+    install succeeds, so a later run installs everything again.
+    """
+
+    def __init__(self, path: pathlib.Path, payload_key: str, completed: set[str] | None = None):
+        self.path = pathlib.Path(path)
+        self.payload_key = payload_key
+        self.completed = completed if completed is not None else set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(
+        cls, metadata_list: list[MsixMetadata], global_install: bool = False, path: pathlib.Path | None = None
+    ) -> "InstallJournal":
+        """Get the journal for a payload, empty if there isn't one or it's for another payload."""
+        path = pathlib.Path(path) if path is not None else default_journal_path()
+        payload_key = get_payload_key(metadata_list, global_install)
+        try:
+            saved = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return cls(path, payload_key)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable install journal %s: %s", path, e)
+            return cls(path, payload_key)
+        if not isinstance(saved, dict) or saved.get("payload") != payload_key:
+            logger.info("Ignoring install journal of a different payload")
+            return cls(path, payload_key)
+        return cls(path, payload_key, set(saved.get("completed", [])))
+
+    def remaining(self, metadata_list: list[MsixMetadata]) -> list[MsixMetadata]:
+        """Get the packages still to install, main package first."""
+        remaining = [metadata for metadata in metadata_list if get_package_key(metadata) not in self.completed]
+        skipped = len(metadata_list) - len(remaining)
+        if skipped:
+            logger.info("Skipping %s packages installed by an earlier attempt", skipped)
+        # The main package is only recorded once everything has succeeded, which clears the journal
+        if metadata_list and metadata_list[0] not in remaining:
+            remaining.insert(0, metadata_list[0])
+        return remaining
+
+    def record(self, metadata: MsixMetadata) -> None:
+        """Save that a package was installed."""
+        with self._lock:
+            self.completed.add(get_package_key(metadata))
+            self._save()
+
+    def clear(self) -> None:
+        """Forget every package, once the whole install has succeeded."""
+        with self._lock:
+            self.completed.clear()
+            try:
+                self.path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning("Failed to remove install journal %s: %s", self.path, e)
+
+    def _save(self) -> None:
+        data = {"payload": self.payload_key, "completed": sorted(self.completed)}
+
+        def write(staging_path: pathlib.Path):
+            staging_path.write_text(json.dumps(data), encoding="utf-8")
+
+        # The journal only saves time on a retry, the install carries on without it
+        staging.write_staged(self.path, write)
@@ -0,0 +1,91 @@
+"""Write the log from a background thread so installs never wait on the log file."""
+
+from logging import handlers
+from msix_global_installer import config
+import atexit
+import logging
+import pathlib
+import queue
+
+LOG_FORMAT = "%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s"
+LOG_DATE_FORMAT = "%H:%M:%S"
+# Everything the shell prints while installing, only logged when LOG_PTY_TRANSCRIPT is set
+TRANSCRIPT_LOGGER_NAME = "msix_global_installer.transcript"
+
+# The listener writing the log, once it's configured
+_listener: handlers.QueueListener | None = None
+
+
+class DeferredQueueHandler(handlers.QueueHandler):
+    """
+    Queue records without formatting them, leaving that to the listener's thread.
+
+    The message and its arguments are merged when the record is written, so
+    arguments must not be changed after logging them. Records with exception
+    or stack information are formatted straight away, like QueueHandler does.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info or record.stack_info:
+            return super().prepare(record)
+        return record
+
+
+def configure_logging(
+    log_path: pathlib.Path | None = None,
+    level: int | str | None = None,
+    max_bytes: int | None = None,
+    backup_count: int | None = None,
+    transcript: bool | None = None,
+) -> handlers.QueueListener:
+    """
+    Send every log record through a queue to a listener thread writing the log.
+
+    The log at log_path is rotated once it reaches max_bytes, keeping
+    backup_count old logs. Without a path the log goes to stderr. Defaults to
+    config's LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT and LOG_PTY_TRANSCRIPT.
+    The listener is stopped at exit, writing whatever is still queued.
+    """
+    global _listener
+    stop_logging()
+    level = level if level is not None else config.LOG_LEVEL
+    max_bytes = max_bytes if max_bytes is not None else config.LOG_MAX_BYTES
+    backup_count = backup_count if backup_count is not None else config.LOG_BACKUP_COUNT
+    transcript = transcript if transcript is not None else config.LOG_PTY_TRANSCRIPT
+
+    if log_path is not None:
+        pathlib.Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+        handler: logging.Handler = handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    # Its own level so the transcript can be turned on without every other debug message
+    logging.getLogger(TRANSCRIPT_LOGGER_NAME).setLevel(logging.DEBUG if transcript else logging.WARNING)
+
+    _listener = handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Write whatever is still queued and close the log."""
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for queue_handler in [handler for handler in root.handlers if isinstance(handler, DeferredQueueHandler)]:
+        root.removeHandler(queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,88 @@
+"""Functions to read AppxManifest.xml."""
+
+from dataclasses import dataclass, field
+from msix_global_installer.metadata import PackageDependency
+from typing import BinaryIO
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+FOUNDATION_NAMESPACES = (
+    "http://schemas.microsoft.com/appx/manifest/foundation/windows10",
+    # Windows 8 and 8.1 manifests
+    "http://schemas.microsoft.com/appx/2010/manifest",
+    "http://schemas.microsoft.com/appx/2013/manifest",
+)
+UAP_NAMESPACES = (
+    "http://schemas.microsoft.com/appx/manifest/uap/windows10",
+    *(f"http://schemas.microsoft.com/appx/manifest/uap/windows10/{version}" for version in range(2, 19)),
+)
+KNOWN_NAMESPACES = frozenset(FOUNDATION_NAMESPACES + UAP_NAMESPACES)
+
+# Top level elements that come after Dependencies in the schema, nothing we want is in or after them
+STOP_ELEMENTS = frozenset(("Capabilities", "Extensions", "Applications"))
+
+
+@dataclass
+class ManifestData:
+    identity: dict[str, str] = field(default_factory=dict)
+    display_name: str | None = None
+    logo: str | None = None
+    dependencies: list[PackageDependency] = field(default_factory=list)
+
+
+def split_tag(tag: str) -> tuple[str | None, str]:
+    """Split an ElementTree tag into (namespace, local name)."""
+    if tag.startswith("{"):
+        namespace, _, local_name = tag[1:].partition("}")
+        return namespace, local_name
+    return None, tag
+
+
+def parse_manifest(manifest: BinaryIO) -> ManifestData:
+    """
+    Read the Identity, DisplayName, Logo and PackageDependency elements of a manifest.
+
+    The manifest is parsed incrementally and parsing stops at the end of the
+    Dependencies section, so large Capabilities, Extensions and Applications
+    sections are never read.
+    """
+    data = ManifestData()
+    # Local names of the open elements, starting with the root
+    path: list[str] = []
+    for event, element in ET.iterparse(manifest, events=("start", "end")):
+        namespace, local_name = split_tag(element.tag)
+        known = namespace is None or namespace in KNOWN_NAMESPACES
+        if event == "start":
+            if len(path) == 1 and known and local_name in STOP_ELEMENTS:
+                logger.debug("Stopping manifest parse at %s", local_name)
+                break
+            path.append(local_name)
+            continue
+
+        path.pop()
+        depth = len(path)
+        if known:
+            if depth == 1 and local_name == "Identity":
+                data.identity = dict(element.attrib)
+            elif depth == 2 and path[1] == "Properties" and local_name == "DisplayName":
+                data.display_name = element.text
+            elif depth == 2 and path[1] == "Properties" and local_name == "Logo":
+                data.logo = element.text
+            elif depth == 2 and path[1] == "Dependencies" and local_name == "PackageDependency":
+                data.dependencies.append(
+                    PackageDependency(
+                        name=element.attrib.get("Name", ""),
+                        publisher=element.attrib.get("Publisher", ""),
+                        min_version=element.attrib.get("MinVersion", "0.0.0.0"),
+                        max_version_tested=element.attrib.get("MaxVersionTested"),
+                    )
+                )
+            elif depth == 1 and local_name == "Dependencies":
+                logger.debug("Stopping manifest parse after Dependencies")
+                break
+        if depth == 1:
+            # Drop finished top level sections so memory doesn't grow with the manifest
+            element.clear()
+    return data
@@ -0,0 +1,52 @@
+"""Package metadata records.
+
+These have no dependencies so saved metadata can be read without loading the
+package parsing modules.
+"""
+
+from dataclasses import dataclass, field
+import pathlib
+
+
+@dataclass
+class PackageDependency:
+    name: str
+    publisher: str
+    min_version: str
+    max_version_tested: str | None = None
+
+
+@dataclass
+class BundlePackage:
+    """An inner package as described by the bundle manifest."""
+
+    file_name: str
+    package_type: str
+    version: str
+    architecture: str
+    resource_id: str | None
+    offset: int
+    size: int
+    languages: list[str] = field(default_factory=list)
+    scales: list[int] = field(default_factory=list)
+    metadata: "MsixMetadata | None" = None
+
+
+@dataclass
+class MsixMetadata:
+    package_path: pathlib.Path
+    package_name: str
+    version: str
+    publisher: str
+    icon_path: pathlib.Path | None = None
+    scaled_icon_path: pathlib.Path | None = None
+    # Multi-size .ico used as the executable's icon
+    exe_icon_path: pathlib.Path | None = None
+    # Icons rendered by the build step as base64 PNG data, so the installer can show them without Pillow
+    window_icons: list[str] = field(default_factory=list)
+    panel_icon: str | None = None
+    architecture: str | None = None
+    bundle_packages: list[BundlePackage] = field(default_factory=list)
+    dependencies: list[PackageDependency] = field(default_factory=list)
+    # Name attribute of the Identity, package_name is the display name
+    identity_name: str | None = None
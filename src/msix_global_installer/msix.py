@@ -1,30 +1,41 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from math import ceil
-from msix_global_installer import events, config
-import io
+from msix_global_installer import (
+    bundle,
+    events,
+    config,
+    logs,
+    manifest,
+    pyinstaller_helper,
+    resources,
+    scheduler,
+    session,
+    watchdog,
+)
+from msix_global_installer.metadata import MsixMetadata
+from msix_global_installer.session import (
+    COMPLETION_COMMAND_END,
+    COMPLETION_MARKER,
+    make_nonce,
+    quote_path,
+    strip_ansi,
+)
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+import asyncio
+import contextlib
 import logging
-import os
 import pathlib
 import re
-import sys
-import xml.etree.ElementTree as ET
+import time
 import zipfile
 
-if sys.platform == "win32":
-    from winpty import PtyProcess
-
-
 logger = logging.getLogger(__name__)
+transcript_logger = logging.getLogger(logs.TRANSCRIPT_LOGGER_NAME)
 
-
-@dataclass
-class MsixMetadata:
-    package_path: pathlib.Path
-    package_name: str
-    version: str
-    publisher: str
-    icon_path: pathlib.Path | None = None
-    scaled_icon_path: pathlib.Path | None = None
+# Size in pixels of the logo variant to extract
+LOGO_TARGET_SIZE = 100
+# Shortest time between progress only updates to the GUI
+PROGRESS_MIN_INTERVAL_S = 0.05
 
 
 @dataclass
@@ -40,70 +51,169 @@ class ErrorResult:
 @dataclass
 class ReturnCodeResult:
     install_success: bool
+    exit_code: int | None = None
+
+
+class ProgressEmitter:
+    """
+    Post install progress to the GUI, dropping updates that don't change anything.
+
+    A progress only update is posted if it changes what the GUI shows and at least
+    min_interval_s has passed since the last post, otherwise it is held back until
+    the next update or flush. On an event loop a flush is scheduled for when the
+    interval is up, so the update is posted even if the output stalls. Title and
+    subtitle changes and immediate updates (such as errors and the final value)
+    are posted straight away.
+    """
+
+    def __init__(
+        self,
+        event_queue=None,
+        min_interval_s: float = PROGRESS_MIN_INTERVAL_S,
+        clock=time.monotonic,
+        map_progress: Callable[[int], int] | None = None,
+    ):
+        self.event_queue = event_queue if event_queue is not None else events.gui_event_queue
+        # Turns the progress of one package into the progress shown, such as the progress of all packages
+        self.map_progress = map_progress
+        self.min_interval_s = min_interval_s
+        self.clock = clock
+        self.requested = 0
+        self.emitted = 0
+        self._posted: dict = {}
+        self._pending: dict = {}
+        self._last_post_time: float | None = None
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    @property
+    def suppressed(self) -> int:
+        return self.requested - self.emitted
+
+    def emit(self, data: dict, immediate: bool = False) -> None:
+        """Request an update with any of title, subtitle and progress."""
+        self.requested += 1
+        if self.map_progress is not None and "progress" in data:
+            data = {**data, "progress": self.map_progress(data["progress"])}
+        self._send({**self._pending, **data}, immediate)
+
+    def flush(self) -> None:
+        """Post any held back update."""
+        if self._pending:
+            self._send(self._pending, immediate=True)
+
+    def _send(self, data: dict, immediate: bool) -> None:
+        changed = {key: value for key, value in data.items() if self._posted.get(key) != value}
+        if not changed:
+            self._pending = {}
+            return
+        now = self.clock()
+        is_due = self._last_post_time is None or now - self._last_post_time >= self.min_interval_s
+        if immediate or is_due or "title" in changed or "subtitle" in changed:
+            event = events.Event(name=events.EventType.INSTALL_PROGRESS_TEXT, data=data)
+            events.post_event_sync(event, event_queue=self.event_queue)
+            self._posted.update(data)
+            self._pending = {}
+            self._last_post_time = now
+            self.emitted += 1
+        else:
+            self._pending = data
+            self._schedule_flush(self.min_interval_s - (now - self._last_post_time))
+
+    def _schedule_flush(self, delay_s: float) -> None:
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on an event loop, the next update or flush posts it
+            return
+        self._flush_handle = loop.call_later(delay_s, self._scheduled_flush)
+
+    def _scheduled_flush(self) -> None:
+        self._flush_handle = None
+        self.flush()
 
 
-def get_msix_metadata(msix_path: str, output_icon_path: pathlib.Path | None = None) -> MsixMetadata:
+def get_msix_metadata(
+    msix_path: str, output_icon_path: pathlib.Path | None = None, architecture: str | None = None
+) -> MsixMetadata:
     """
     Extract Metadata from MSIX package.
 
     Output path is used for the icon.
 
-    Note this does not support APPXBUNDLE.
+    For bundles the architecture picks which inner package the metadata and icon come from.
     """
     if output_icon_path and not output_icon_path.exists():
         raise Exception("Path doesn't exist")
 
+    with open(msix_path, "rb") as msix_file, zipfile.ZipFile(msix_file, "r") as msix:
+        if bundle.is_bundle(msix_path):
+            return get_bundle_metadata(msix_file, msix, pathlib.Path(msix_path), output_icon_path, architecture)
+        else:
+            return extract_metadata_from_manifest(msix, pathlib.Path(msix_path), output_icon_path)
+
+
+def get_bundle_metadata(
+    bundle_file,
+    bundle_zip: zipfile.ZipFile,
+    msix_path: pathlib.Path,
+    output_icon_path: pathlib.Path | None,
+    architecture: str | None,
+) -> MsixMetadata:
+    """
+    Extract metadata from a bundle.
+
+    Every application package listed in the bundle manifest has its metadata read
+    and stored in bundle_packages. Inner packages are streamed from the bundle.
+    """
     try:
-        is_bundle = msix_path.endswith(".msixbundle") or msix_path.endswith(".appxbundle")
-        with zipfile.ZipFile(msix_path, "r") as msix:
-            if is_bundle:
-                for file in msix.namelist():
-                    # Get the first msix file in the bundle and use that as the reference
-                    # TODO: Support localisation
-                    if file.endswith(".msix") or file.endswith(".appx"):
-                        with msix.open(file) as inner_msix:
-                            # This opens a ZipFileObject so we need to open it as bytes like object in memory
-                            # If the MSIX file is huge this will cause trouble opening on very low memory computers I expect
-                            inner_msix_filedata = io.BytesIO(inner_msix.read())
-                            with zipfile.ZipFile(inner_msix_filedata, "r") as working_msix:
-                                return extract_metadata_from_manifest(
-                                    working_msix, pathlib.Path(msix_path), output_icon_path
-                                )
-                raise FileNotFoundError("No APPX or MSIX in bundle!")
-            else:
-                return extract_metadata_from_manifest(msix, pathlib.Path(msix_path), output_icon_path)
-    except Exception as e:
-        raise e
+        packages = bundle.read_bundle_manifest(bundle_zip)
+    except KeyError:
+        logger.warning("No bundle manifest in %s, using the first inner package", msix_path)
+        for info in bundle_zip.infolist():
+            if info.filename.lower().endswith(bundle.PACKAGE_EXTENSIONS):
+                with bundle.open_inner_package(bundle_file, bundle_zip, info) as inner_msix:
+                    with zipfile.ZipFile(inner_msix, "r") as working_msix:
+                        return extract_metadata_from_manifest(working_msix, msix_path, output_icon_path)
+        raise FileNotFoundError("No APPX or MSIX in bundle!")
+
+    selected = bundle.select_package(packages, architecture)
+    logger.info("Using %s (%s) from bundle %s", selected.file_name, selected.architecture, msix_path)
+    for package in packages:
+        if package.package_type != "application":
+            continue
+        try:
+            info = bundle_zip.getinfo(package.file_name)
+        except KeyError:
+            raise FileNotFoundError(f"{package.file_name} is in the bundle manifest but not the bundle!")
+        with bundle.open_inner_package(bundle_file, bundle_zip, info) as inner_msix:
+            with zipfile.ZipFile(inner_msix, "r") as working_msix:
+                package.metadata = extract_metadata_from_manifest(
+                    working_msix, msix_path, output_icon_path if package is selected else None
+                )
+    return replace(selected.metadata, bundle_packages=packages)
 
 
 def extract_metadata_from_manifest(
     open_msix_path_object, msix_path: pathlib.Path, output_icon_path: pathlib.Path | None
 ):
     """Extract details from a given manifest."""
-    with open_msix_path_object.open("AppxManifest.xml") as manifest:
-        tree = ET.parse(manifest)
-        root = tree.getroot()
-
-        # Define namespace for querying XML
-        namespace = {"default": "http://schemas.microsoft.com/appx/manifest/foundation/windows10"}
+    with open_msix_path_object.open("AppxManifest.xml") as manifest_file:
+        parsed = manifest.parse_manifest(manifest_file)
 
         # Extract DisplayName
-        display_name = root.find("default:Properties/default:DisplayName", namespace)
-        package_name = str(display_name.text) if display_name is not None else "DisplayName not found"
+        package_name = str(parsed.display_name) if parsed.display_name is not None else "DisplayName not found"
 
-        # Extract Version (Attribute of the Identity element)
-        identity = root.find("default:Identity", namespace)
-        version = identity.attrib.get("Version", "Version not found") if identity is not None else "Version not found"
-
-        # Extract Publisher (Attribute of the Identity element)
-        publisher_full = (
-            identity.attrib.get("Publisher", "Publisher not found") if identity is not None else "Publisher not found"
-        )
+        # Extract Version, Publisher and Architecture (Attributes of the Identity element)
+        identity = parsed.identity
+        version = identity.get("Version", "Version not found")
+        publisher_full = identity.get("Publisher", "Publisher not found")
         publisher = get_name_from_publisher(publisher_full)
+        architecture = identity.get("ProcessorArchitecture", "neutral") if identity else None
 
         # Extract Icon Path
-        icon_element = root.find("default:Properties/default:Logo", namespace)
-        icon_path_in_msix = icon_element.text if icon_element is not None else None
+        icon_path_in_msix = parsed.logo
 
         extracted_icon_path = None
         if output_icon_path is not None:
@@ -125,37 +235,34 @@ def extract_metadata_from_manifest(
                             out_file.write(icon_file.read())
                     extracted_icon_path = pathlib.Path(output_icon_path)
 
-        return MsixMetadata(str(msix_path), package_name, version, publisher, extracted_icon_path)
+        return MsixMetadata(
+            str(msix_path),
+            package_name,
+            version,
+            publisher,
+            extracted_icon_path,
+            architecture=architecture,
+            dependencies=parsed.dependencies,
+            identity_name=identity.get("Name") if identity else None,
+        )
 
 
-def find_qualified_logo_file(manifest: zipfile.ZipFile, resource_path: str) -> str:
+def find_qualified_logo_file(
+    manifest: zipfile.ZipFile,
+    resource_path: str,
+    target_size: int = LOGO_TARGET_SIZE,
+    index: resources.ResourceIndex | None = None,
+) -> str:
     """
     Searches for the best match for a resource file with qualifiers in the ZIP archive.
 
-    Eg would be assets/AppPackageLogo.png would find assets/AppPackageLogo.scale200.png
+    Eg would be assets/AppPackageLogo.png would find assets/AppPackageLogo.scale-200.png
+    The variant closest to (but not smaller than) target_size pixels is used.
+    Pass an index to reuse one already built for the archive.
     """
-    # Strip .png extension if it exists
-    base_name = resource_path.rsplit(".png", 1)[0]
-
-    # Generate potential qualified file names
-    candidates = [
-        f"{resource_path}",  # Ensure we check if it's available with the given name first
-        # Then try different sizes
-        f"{base_name}.scale-100.png",
-        f"{base_name}.scale-200.png",
-        f"{base_name}.scale-400.png",
-    ]
-
-    # List all files in the archive
-    all_files = manifest.namelist()
-
-    # Check for matches
-    for candidate in candidates:
-        if candidate in all_files:
-            return candidate
-
-    # If no matches found, raise an error
-    raise FileNotFoundError(f"No qualified file found for {resource_path} in archive.")
+    if index is None:
+        index = resources.ResourceIndex.from_zip(manifest)
+    return index.find_best(resource_path, target_size)
 
 
 def get_name_from_publisher(publisher: str) -> str:
@@ -175,111 +282,226 @@ def get_name_from_publisher(publisher: str) -> str:
     return name
 
 
-def count_progress(line: str, max_count: int) -> int | None:
-    """Returns progress out of 100, None for invalid line."""
-    # Regex pattern
-    pattern = r"\[([o ]+)\]"
-    matches = re.findall(pattern, line)
-    if not matches:
-        return None
-    first_match = str(matches[0])
-    count = first_match.count("o")
-    try:
-        percentage = count / max_count * 100
-    except ZeroDivisionError:
-        return 0
+def build_install_command(
+    path: pathlib.Path, global_install: bool = False, dependency_paths: list[pathlib.Path] | None = None
+) -> str:
+    """
+    Get the PowerShell command to install a package.
 
-    return ceil(percentage)
+    Dependencies are passed with the package so they're staged in the same deployment operation.
+    """
+    if global_install:
+        command = "Add-AppxProvisionedPackage -PackagePath %s -Online -SkipLicense" % quote_path(path)
+        dependency_parameter = "-DependencyPackagePath"
+    else:
+        command = "Add-AppxPackage -Path %s" % quote_path(path)
+        dependency_parameter = "-DependencyPath"
+    if dependency_paths:
+        quoted_paths = ",".join(quote_path(dependency) for dependency in dependency_paths)
+        command += " %s %s" % (dependency_parameter, quoted_paths)
+    return command + " -ErrorAction Continue | Out-String"
 
 
-def install_msix(
-    path: pathlib.Path,
-    title: str,
+async def install_packages_async(
+    metadata_list: list[MsixMetadata],
+    shell_session: session.AsyncPowerShellSession,
     global_install: bool = False,
-    packages_to_install: int = 1,
-    package_number: int = 1,
-):
-    """Install an MSIX package."""
-    # TODO: If global install ensure we are running as admin
-    global_install_command = (
-        "Add-AppxProvisionedPackage -PackagePath %s -Online -SkipLicense -ErrorAction Continue | Out-String" % path
-    )
-    local_install_command = "Add-AppxPackage -Path %s -ErrorAction Continue | Out-String" % path
-    command_string = local_install_command if not global_install else global_install_command
-    # Use a q after the success int to confirm that we have read the right thing
-    save_returncode_string = "; $success_tail='q' ; $success=[int][bool]::Parse($?)"
-    print_return_code = "; echo INSTALL_SUCCESS===$success$success_tail"
-    wait_string = "; Start-Sleep -Milliseconds 1500"
-    exit_string = "; echo Exiting with code $LASTEXITCODE; Exit"
-
-    # We must use a psudo terminal as otherwise
-    # the written lines are not going to stdout, just appearing on the terminal for the progress
-    # This method ensures we can write the progress to the progress bar.
-    proc = PtyProcess.spawn("powershell.exe")
-    # Here we incorperate a wait which allows us to capture the lines before the terminal closes
-    # As we need the last lines which are the return code
-    proc.write(
-        command_string + save_returncode_string + print_return_code * 10 + wait_string + exit_string + os.linesep
-    )
+    together: bool | None = None,
+    max_concurrent: int | None = None,
+    session_factory: Callable[[], session.AsyncPowerShellSession] = session.AsyncPowerShellSession,
+    on_installed: Callable[[MsixMetadata], None] | None = None,
+) -> bool:
+    """
+    Install the main package, which comes first, and its dependencies.
+
+    If together, all of them are installed in one deployment operation. If that
+    fails, or when not together, they're installed by the scheduler in dependency
+    order with up to max_concurrent at once. Each concurrent install gets its own
+    shell from session_factory, the given session is used first. Defaults to
+    config.INSTALL_DEPENDENCIES_TOGETHER and config.MAX_CONCURRENT_INSTALLS.
+    on_installed is called with each package once it has been installed.
+    Every install runs on the event loop, InstallTimeoutError is raised if any hung.
+    """
+    if together is None:
+        together = config.INSTALL_DEPENDENCIES_TOGETHER
+    if max_concurrent is None:
+        max_concurrent = config.MAX_CONCURRENT_INSTALLS
+    main, dependencies = metadata_list[0], metadata_list[1:]
+    if together and dependencies:
+        logger.info("Installing %s with %s dependencies in one operation", main.package_name, len(dependencies))
+        dependency_paths = [pyinstaller_helper.resource_path(dependency.package_path) for dependency in dependencies]
+        if await install_msix_async(
+            pyinstaller_helper.resource_path(main.package_path),
+            main.package_name,
+            shell_session,
+            global_install,
+            dependency_paths=dependency_paths,
+        ):
+            report_installed(metadata_list, on_installed)
+            return True
+        logger.warning("Installing together failed, installing each package in dependency order")
+
+    nodes = scheduler.build_graph(metadata_list)
+    sessions: asyncio.Queue[session.AsyncPowerShellSession] = asyncio.Queue()
+    extra_sessions = [session_factory() for _ in range(min(max_concurrent, len(nodes)) - 1)]
+    for shell in [shell_session, *extra_sessions]:
+        sessions.put_nowait(shell)
+
+    async def install_node(node: scheduler.InstallNode, report: Callable[[int], int]) -> bool:
+        shell = await sessions.get()
+        try:
+            installed = await install_msix_async(
+                pyinstaller_helper.resource_path(node.metadata.package_path),
+                node.metadata.package_name,
+                shell,
+                global_install,
+                emitter=ProgressEmitter(map_progress=report),
+                is_dependency=node.metadata is not main,
+            )
+        finally:
+            sessions.put_nowait(shell)
+        if installed:
+            report_installed([node.metadata], on_installed)
+        return installed
 
-    error: str | None = None
-    install_succeeded: bool | None = None
-    while proc.isalive():
-        line = proc.readline()
-        logger.debug("%r\n\r", line)
-        is_dependency = packages_to_install > 1 and package_number != packages_to_install
-        result = process_line(line, is_dependency)
+    try:
+        success = await scheduler.InstallScheduler(nodes, install_node, max_concurrent).run_async()
+    except BaseException:
+        # Cancelled, the shells may still be installing
+        await asyncio.gather(*(shell.terminate() for shell in extra_sessions))
+        raise
+    await asyncio.gather(*(shell.close() for shell in extra_sessions))
+    # A hung install stops the whole install, like it does when installing together
+    for node in nodes.values():
+        if isinstance(node.error, watchdog.InstallTimeoutError):
+            raise node.error
+    return success
+
+
+def report_installed(metadata_list: list[MsixMetadata], on_installed: Callable[[MsixMetadata], None] | None) -> None:
+    """Pass each installed package to the callback, if there is one."""
+    if on_installed is None:
+        return
+    for metadata in metadata_list:
+        on_installed(metadata)
+
+
+class InstallTracker:
+    """Follow the results of one install, passing them on to the GUI."""
+
+    def __init__(self, title: str, emitter: ProgressEmitter):
+        self.title = title
+        self.emitter = emitter
+        self.error: str | None = None
+        self.install_succeeded: bool | None = None
+
+    def handle(self, result: ProgressResult | ErrorResult | ReturnCodeResult) -> bool:
+        """Pass on a result and return whether to carry on reading output."""
         # Return code will also come with a False for should continue so it doesn't
         # matter that we are overwriting this
-        should_continue, returned_install_result = process_result(
+        should_continue, self.install_succeeded = process_result(
             result=result,
-            package_title=title,
-            current_error=error,
-            packages_to_install=packages_to_install,
-            package_number=package_number,
+            package_title=self.title,
+            current_error=self.error,
+            emitter=self.emitter,
         )
-        install_succeeded = returned_install_result
         if isinstance(result, ErrorResult):
-            error = result.error if not error else error
+            self.error = result.error if not self.error else self.error
         if not should_continue:
             logger.info("Received request to not continue!")
-            # proc.write(exit_string + os.linesep)
-            break
-        logger.info("Continuing")
-
-    # TODO Work out if this actually returns the exit status of the terminal
-    # It appears to always return 0
-    logger.info("EXIT STATUS : %s", proc.exitstatus)
-    if not install_succeeded:
-        install_succeeded = True if proc.exitstatus == 0 else None
-    logger.debug("Process is closed")
-
-    # Set progress to 100
-    progress = progress_mincer(100, packages_to_install, package_number)
-    logger.error("Progress: " + str(progress))
-    event = events.Event(
-        name=events.EventType.INSTALL_PROGRESS_TEXT,
-        data={"progress": progress},
-    )
-    events.post_event_sync(event, event_queue=events.gui_event_queue)
+        return should_continue
+
+    def finish(self, exitstatus: int | None) -> bool:
+        """Report the result of the install once its output has been read."""
+        # TODO Work out if this actually returns the exit status of the terminal
+        # It appears to always return 0
+        logger.info("EXIT STATUS : %s", exitstatus)
+        # Only fall back to the exit status if the shell ended without printing the completion line
+        if self.install_succeeded is None:
+            self.install_succeeded = True if exitstatus == 0 else None
+
+        # Set progress to 100
+        self.emitter.emit({"progress": 100}, immediate=True)
+
+        succeeded = check_has_succeeded(
+            install_succeeded=self.install_succeeded, error=self.error, package_title=self.title, emitter=self.emitter
+        )
+        logger.info(
+            "Progress events for %s: %s emitted, %s suppressed",
+            self.title,
+            self.emitter.emitted,
+            self.emitter.suppressed,
+        )
+        return succeeded
 
-    return check_has_succeeded(install_succeeded=install_succeeded, error=error, package_title=title)
 
+async def install_msix_async(
+    path: pathlib.Path,
+    title: str,
+    shell_session: session.AsyncPowerShellSession,
+    global_install: bool = False,
+    dependency_paths: list[pathlib.Path] | None = None,
+    emitter: ProgressEmitter | None = None,
+    is_dependency: bool = False,
+    timeouts: watchdog.Timeouts | None = None,
+) -> bool:
+    """
+    Install an MSIX package in a session, reading the output on the event loop.
 
-def check_has_succeeded(install_succeeded: bool | None, error: str, package_title: str):
+    Dependencies given are installed in the same operation and share its progress.
+    The install is watched with timeouts, config's by default. If one passes the
+    shell is stopped and InstallTimeoutError raised.
+    """
+    command_string = build_install_command(path, global_install, dependency_paths)
+    nonce = make_nonce()
+    tracker = InstallTracker(title, emitter or ProgressEmitter())
+    parser = PtyOutputParser(is_dependency, nonce)
+    install_watchdog = watchdog.Watchdog(timeouts)
+    echo = EchoFilter()
+
+    async def watch_output(chunks: AsyncIterable[str]) -> AsyncIterator[str]:
+        # Any output counts, such as a status line or an empty bar while the deployment is queued
+        async for chunk in chunks:
+            if echo.has_output(chunk):
+                install_watchdog.output()
+            yield chunk
+
+    async def read_results() -> None:
+        await shell_session.start()
+        install_watchdog.spawned()
+        output = parser.parse_all_async(watch_output(shell_session.run(command_string, nonce)))
+        async with contextlib.aclosing(output) as results:
+            async for result in results:
+                if isinstance(result, ProgressResult):
+                    install_watchdog.progressed(result.progress)
+                if not tracker.handle(result):
+                    break
+
+    try:
+        await install_watchdog.guard(read_results())
+    except watchdog.InstallTimeoutError as e:
+        await shell_session.terminate()
+        tracker.emitter.emit(
+            {"title": f"Install of {title} timed out", "subtitle": str(e), "progress": 100}, immediate=True
+        )
+        raise
+    logger.debug("Parsed %s lines of output", parser.lines_parsed)
+    return tracker.finish(shell_session.exitstatus)
+
+
+def check_has_succeeded(
+    install_succeeded: bool | None, error: str, package_title: str, emitter: ProgressEmitter | None = None
+):
     """
     Return success.
 
     Post update to GUI on result.
     """
+    emitter = emitter if emitter is not None else ProgressEmitter()
     if install_succeeded is not None and install_succeeded and not error:
         logger.info("Should have installed successfully!")
         install_complete_text = f"Install of {package_title} complete"
-        event = events.Event(
-            name=events.EventType.INSTALL_PROGRESS_TEXT,
-            data={"title": install_complete_text},
-        )
-        events.post_event_sync(event, event_queue=events.gui_event_queue)
+        emitter.emit({"title": install_complete_text}, immediate=True)
         return True
     else:
         logger.error("Install failed")
@@ -289,11 +511,7 @@ def check_has_succeeded(install_succeeded: bool | None, error: str, package_titl
             # Terminal must have force quit - won't have an error message
             logger.warning("Stopping install - terminal must have force quit.")
             install_complete_text = f"Install of {package_title} failed"
-            event = events.Event(
-                name=events.EventType.INSTALL_PROGRESS_TEXT,
-                data={"title": install_complete_text},
-            )
-            events.post_event_sync(event, event_queue=events.gui_event_queue)
+            emitter.emit({"title": install_complete_text}, immediate=True)
         return False
 
 
@@ -301,49 +519,44 @@ def process_result(
     result: ProgressResult | ErrorResult | ReturnCodeResult | None,
     current_error: str | None,
     package_title,
-    packages_to_install,
-    package_number,
+    emitter: ProgressEmitter | None = None,
 ) -> tuple[bool, bool | None]:
     """Process a Result and return data to the GUI.
 
+    Progress updates go through the emitter so repeated values aren't posted.
+
     ::returns:: (should_continue, install_success)
     Should Continue: Break on False return.
     Install Success: Reported success of the script
     """
+    emitter = emitter if emitter is not None else ProgressEmitter()
     if isinstance(result, ProgressResult):
-        event = events.Event(
-            name=events.EventType.INSTALL_PROGRESS_TEXT,
-            data={
+        emitter.emit(
+            {
                 "title": f"Installing {package_title}",
-                "progress": progress_mincer(result.progress, packages_to_install, package_number),
-            },
+                "progress": result.progress,
+            }
         )
-        events.post_event_sync(event, event_queue=events.gui_event_queue)
         return (True, None)
     elif isinstance(result, ErrorResult):
         # Only need to push the first error, otherwise it will keep finding errors
         # in the output and switch quickly
         if not current_error:
-            event = events.Event(
-                name=events.EventType.INSTALL_PROGRESS_TEXT,
-                data={
+            emitter.emit(
+                {
                     "title": f"Failed to install {package_title}",
                     "subtitle": result.error.args[0],
                     "progress": 100,
                 },
+                immediate=True,
             )
-            events.post_event_sync(event, event_queue=events.gui_event_queue)
             logger.warning("Stoppping install due to new error: %s", result.error)
             return (False, None)
         return (True, None)
     elif isinstance(result, ReturnCodeResult):
         install_succeeded = result.install_success
         if install_succeeded is not None and not install_succeeded and current_error is None:
-            event = events.Event(
-                name=events.EventType.INSTALL_PROGRESS_TEXT,
-                data={"title": f"Failed to install {package_title}", "progress": 100},
-            )
-            events.post_event_sync(event, event_queue=events.gui_event_queue)
+            emitter.emit({"title": f"Failed to install {package_title}", "progress": 100}, immediate=True)
             logger.warning(
                 "Stopping install - script reported success-(%s) and current error (%s)",
                 install_succeeded,
@@ -356,13 +569,68 @@ def process_result(
     return (True, None)
 
 
-def process_line(line, is_dependency: bool) -> ProgressResult | ErrorResult | ReturnCodeResult | None:
-    progress = count_progress(line=line, max_count=68)
-    if progress:
-        return ProgressResult(progress=progress)
-    elif "error" in line or "CategoryInfo" in line or "HRESULT" in line:
+class RecovorableRuntimeError(RuntimeError):
+    """Used when an error is raised but it needs to be parsed differently."""
+
+    pass
+
+
+def build_output_pattern(nonce_pattern: str) -> re.Pattern:
+    """Get a pattern matching everything of interest in a line of output, in one pass."""
+    return re.compile(
+        r"\[(?P<bar>[o ]+)\]"
+        rf"|{session.build_completion_pattern(nonce_pattern)}"
+        r"|(?P<hresult>0x[0-9A-Fa-f]{8})"
+        r"|(?P<error>error|CategoryInfo|HRESULT)"
+    )
+
+
+# Matches the completion line of any install
+OUTPUT_PATTERN = build_output_pattern("[0-9a-f]+")
+# Most output is progress, so blocks without any of these words only need searching for bars
+OUTPUT_KEYWORDS = ("error", "CategoryInfo", "HRESULT", COMPLETION_MARKER)
+BAR_PATTERN = re.compile(r"\[([o ]+)\]")
+LINE_END_PATTERN = re.compile(r"[\r\n]")
+# HRESULT: (is recoverable, message)
+KNOWN_HRESULTS = {
+    "0x80074CF0": (False, "Certificate error"),
+    "0x800B0109": (False, "The root certificate of the signature in the app package or bundle must be trusted."),
+    "0x80073D06": (True, "A newer version of this package is already installed!"),
+    "0x80073D02": (True, "A conflicting application is open!"),
+}
+
+
+def parse_output_line(
+    line: str, is_dependency: bool, matches: list[re.Match] | None = None
+) -> ProgressResult | ErrorResult | ReturnCodeResult | None:
+    """
+    Classify one line of PowerShell output with control sequences already removed.
+
+    The progress bar width is taken from the bar itself. Pass the OUTPUT_PATTERN
+    matches if the line has already been searched.
+    """
+    bar = hresult = success = exit_code = None
+    has_error = False
+    for match in matches if matches is not None else OUTPUT_PATTERN.finditer(line):
+        kind = match.lastgroup
+        if kind == "bar":
+            # The bar can be redrawn on the same line, the last one is the latest
+            bar = match.group("bar")
+        elif kind == "hresult":
+            hresult = hresult or match.group("hresult")
+        elif kind == "error":
+            has_error = True
+        elif success is None:
+            success = match.group("success") == "1"
+            exit_code = int(match.group("exit_code"))
+
+    if bar:
+        progress = ceil(bar.count("o") / len(bar) * 100)
+        if progress:
+            return ProgressResult(progress=progress)
+    if has_error:
         try:
-            parse_error(line)
+            raise_output_error(line, hresult)
         # Must parse this first as it's derived from RuntimeError
         except RecovorableRuntimeError as e:
             logger.info("Got a recoverable error: %s", e)
@@ -377,63 +645,124 @@ def process_line(line, is_dependency: bool) -> ProgressResult | ErrorResult | Re
                 return ErrorResult(e)
         except RuntimeError as e:
             return ErrorResult(e)
-    elif "INSTALL_SUCCESS===" in line:
-        install_succeeded = parse_retcode(line)
-        if install_succeeded is not None:
-            logger.info("Success state %s found from line", install_succeeded)
-            return ReturnCodeResult(install_succeeded)
+    if success is not None:
+        logger.info("Success state %s and exit code %s found from line", success, exit_code)
+        return ReturnCodeResult(success, exit_code)
+    return None
 
 
-class RecovorableRuntimeError(RuntimeError):
-    """Used when an error is raised but it needs to be parsed differently."""
+class EchoFilter:
+    """
+    Tell a command's output apart from the terminal echoing the command, which comes first.
 
-    pass
+    The echo ends with the completion command. Line breaks are ignored while looking
+    for its end, as the terminal wraps a long command.
+    """
+
+    def __init__(self):
+        self.is_echoed = False
+        self._tail = ""
+
+    def has_output(self, chunk: str) -> bool:
+        """Check whether a chunk has anything other than the echoed command and blank lines."""
+        text = strip_ansi(chunk)
+        if not self.is_echoed:
+            text = self._tail + LINE_END_PATTERN.sub("", text)
+            end = text.find(COMPLETION_COMMAND_END)
+            if end == -1:
+                self._tail = text[-len(COMPLETION_COMMAND_END) :]
+                return False
+            self.is_echoed = True
+            text = text[end + len(COMPLETION_COMMAND_END) :]
+        return bool(text.strip())
+
+
+class PtyOutputParser:
+    """
+    Incremental parser for raw PowerShell pty output.
 
+    Feed it chunks as they are read, lines split across reads are kept until
+    they are complete. Both carriage returns and new lines end a line.
+
+    Each block of complete lines is searched once, lines without a match are
+    never looked at on their own. Given a nonce, only the completion line with
+    that nonce is reported.
+    """
 
-def parse_error(error_string: str):
+    def __init__(self, is_dependency: bool, nonce: str | None = None):
+        self.is_dependency = is_dependency
+        self.lines_parsed = 0
+        self._partial = ""
+        self._pattern = build_output_pattern(re.escape(nonce)) if nonce is not None else OUTPUT_PATTERN
+
+    def feed(self, chunk: str) -> list[ProgressResult | ErrorResult | ReturnCodeResult]:
+        """Parse a chunk of output and return the results of every line it completed."""
+        text = self._partial + chunk
+        end = max(text.rfind("\r"), text.rfind("\n")) + 1
+        self._partial = text[end:]
+        return self._parse_block(text[:end])
+
+    def close(self) -> list[ProgressResult | ErrorResult | ReturnCodeResult]:
+        """Parse whatever is left after the output has ended."""
+        block = self._partial + "\n" if self._partial else ""
+        self._partial = ""
+        return self._parse_block(block)
+
+    def parse_all(self, chunks: Iterable[str]) -> Iterator[ProgressResult | ErrorResult | ReturnCodeResult]:
+        """Parse each chunk as it's read, then whatever is left once they run out."""
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.close()
+
+    async def parse_all_async(
+        self, chunks: AsyncIterable[str]
+    ) -> AsyncIterator[ProgressResult | ErrorResult | ReturnCodeResult]:
+        """Parse each chunk as it's read on the event loop, then whatever is left once they run out."""
+        async for chunk in chunks:
+            for result in self.feed(chunk):
+                yield result
+        for result in self.close():
+            yield result
+
+    def _parse_block(self, block: str) -> list[ProgressResult | ErrorResult | ReturnCodeResult]:
+        if not block:
+            return []
+        if "\x1b" in block:
+            block = strip_ansi(block)
+        self.lines_parsed += block.count("\r") + block.count("\n") - block.count("\r\n")
+        transcript_logger.debug("%r", block)
+
+        if not any(keyword in block for keyword in OUTPUT_KEYWORDS):
+            # Only progress, report each bar as it was drawn
+            progress_values = (ceil(bar.count("o") / len(bar) * 100) for bar in BAR_PATTERN.findall(block))
+            return [ProgressResult(progress=progress) for progress in progress_values if progress]
+
+        results = []
+        line_start = line_end = 0
+        line_matches: list[re.Match] = []
+        for match in self._pattern.finditer(block):
+            if match.start() >= line_end:
+                if line_matches:
+                    results.append(parse_output_line(block[line_start:line_end], self.is_dependency, line_matches))
+                line_start = max(block.rfind("\r", 0, match.start()), block.rfind("\n", 0, match.start())) + 1
+                line_end = LINE_END_PATTERN.search(block, match.end()).start()
+                line_matches = []
+            line_matches.append(match)
+        if line_matches:
+            results.append(parse_output_line(block[line_start:line_end], self.is_dependency, line_matches))
+        return [result for result in results if result is not None]
+
+
+def raise_output_error(error_string: str, hresult: str | None = None):
+    """Raise the error for a line of error output, looking up its HRESULT if it has one."""
     logger.warning("Error string: %s" % error_string)
-    if "0x80074CF0" in error_string:
-        raise RuntimeError("Certificate error")
-    elif "0x800B0109" in error_string:
-        raise RuntimeError("The root certificate of the signature in the app package or bundle must be trusted.")
-    elif "0x80073D06" in error_string:
-        raise RecovorableRuntimeError("A newer version of this package is already installed!")
-    elif "0x80073D02" in error_string:
-        raise RecovorableRuntimeError("A conflicting application is open!")
-    elif "Add-AppxProvisionedPackage : The requested operation requires elevation" in error_string:
+    if hresult is not None:
+        known = KNOWN_HRESULTS.get("0x" + hresult[2:].upper())
+        if known is not None:
+            is_recoverable, message = known
+            raise RecovorableRuntimeError(message) if is_recoverable else RuntimeError(message)
+    if "Add-AppxProvisionedPackage : The requested operation requires elevation" in error_string:
         raise RuntimeError("The requested operation requires elevation")
     elif "ObjectNotFound" in error_string:
         raise RuntimeError("Installer file not found!")
     raise RuntimeError("Unknown error!")
-
-
-def parse_retcode(line: str) -> bool | None:
-    """Get the retcode out of a string.
-
-    Expects RETCODE=x where x is the retcode and any
-    amount of values either side.
-    """
-    split = line.split("INSTALL_SUCCESS===")
-    install_result = split[1][0]
-    install_result_confirmation_tail = split[1][1]
-    try:
-        logger.info("Parsing return value %s from %s", install_result, split)
-        # Line can sometimes be the command which gives an incorrect value
-        # Such as ...ho\x1b[m RETCODE=\x1b[9...
-        bool_success = bool(int(install_result))
-        if install_result_confirmation_tail == "q":
-            logger.debug("Line rejected, don't have expected tail.")
-            return None
-    except ValueError:
-        logger.debug("Value is not a bool")
-        return None
-    return bool(bool_success)
-
-
-def progress_mincer(package_progress: int, packages_to_install: int, package_number: int) -> int:
-    """Get progress as part of the total packages to install."""
-    total_for_stage = 1 / packages_to_install * 100
-    zero_point = 100 * ((package_number - 1) / packages_to_install)
-    stage_progress = total_for_stage * (package_progress / 100)
-    overall_progress = zero_point + stage_progress
-    return ceil(overall_progress)
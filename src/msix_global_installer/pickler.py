@@ -1,15 +1,165 @@
+"""Save and load the metadata payload shipped with the installer.
+
+The payload is a small versioned container:
+
+    header   MAGIC, format version and record count
+    table    (offset, length) of each record
+    records  one UTF-8 JSON object per package, the main package first
+
+Records are decoded on demand from a memory map, so the main package can be read
+without decoding every dependency. Payloads written as pickles by older versions
+are still read.
+"""
+
+from dataclasses import MISSING, asdict, fields
+from msix_global_installer.metadata import BundlePackage, MsixMetadata, PackageDependency
+import json
+import mmap
 import pathlib
 import pickle
-from msix_global_installer import msix
+import struct
+
+MAGIC = b"MSIXMETA"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHI")
+TABLE_ENTRY = struct.Struct("<QI")
+PATH_FIELDS = ("icon_path", "scaled_icon_path", "exe_icon_path")
+
+
+class UnsupportedPayloadError(Exception):
+    """Raised for a payload written by a newer, incompatible version."""
+
+
+def drop_empty_defaults(record: dict) -> dict:
+    """Leave out optional fields that are empty to keep records small."""
+    for field in fields(MsixMetadata):
+        has_default = field.default is not MISSING or field.default_factory is not MISSING
+        if has_default and record.get(field.name) in (None, []):
+            del record[field.name]
+    for bundle_package in record.get("bundle_packages", []):
+        if bundle_package["metadata"] is not None:
+            drop_empty_defaults(bundle_package["metadata"])
+    return record
+
+
+def encode_metadata(metadata: MsixMetadata) -> bytes:
+    """Encode one package's metadata as a JSON record."""
+    return json.dumps(drop_empty_defaults(asdict(metadata)), default=str, separators=(",", ":")).encode()
+
+
+def decode_metadata(record: dict) -> MsixMetadata:
+    """Build metadata from a decoded JSON record."""
+    known = {field.name for field in fields(MsixMetadata)}
+    # Ignore fields added by newer versions of the same format
+    values = {key: value for key, value in record.items() if key in known}
+    for path_field in PATH_FIELDS:
+        if values.get(path_field) is not None:
+            values[path_field] = pathlib.Path(values[path_field])
+    values["dependencies"] = [PackageDependency(**dependency) for dependency in values.get("dependencies", [])]
+    bundle_packages = []
+    for bundle_package in values.get("bundle_packages", []):
+        inner_metadata = bundle_package.pop("metadata", None)
+        bundle_packages.append(
+            BundlePackage(
+                **bundle_package, metadata=decode_metadata(inner_metadata) if inner_metadata is not None else None
+            )
+        )
+    values["bundle_packages"] = bundle_packages
+    return MsixMetadata(**values)
+
+
+class MetadataPayload:
+    """
+    Lazily decoded view of a saved payload.
+
+    Records are only decoded when accessed and are then kept.
+    """
 
+    def __init__(self, data_file_path: pathlib.Path):
+        with open(data_file_path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{data_file_path} is not a metadata payload")
+        if version > FORMAT_VERSION:
+            self._map.close()
+            raise UnsupportedPayloadError(f"Payload format {version} is newer than supported ({FORMAT_VERSION})")
+        self._table = [TABLE_ENTRY.unpack_from(self._map, HEADER.size + i * TABLE_ENTRY.size) for i in range(count)]
+        self._records: dict[int, MsixMetadata] = {}
 
-def save_metadata(data_file_path: pathlib.Path, metadata_list: list[msix.MsixMetadata]):
-    """Save MSIX metadata to a pickle file."""
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, index: int) -> MsixMetadata:
+        index = range(len(self._table))[index]
+        if index not in self._records:
+            offset, length = self._table[index]
+            self._records[index] = decode_metadata(json.loads(self._map[offset : offset + length]))
+        return self._records[index]
+
+    def to_list(self) -> list[MsixMetadata]:
+        return [self[i] for i in range(len(self))]
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "MetadataPayload":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def is_payload(data_file_path: pathlib.Path) -> bool:
+    """Return True if the file is in the current format rather than a legacy pickle."""
+    with open(data_file_path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def save_metadata(data_file_path: pathlib.Path, metadata_list: list[MsixMetadata]):
+    """Save MSIX metadata, main package first."""
+    records = [encode_metadata(metadata) for metadata in metadata_list]
+    offset = HEADER.size + TABLE_ENTRY.size * len(records)
+    table = b""
+    for record in records:
+        table += TABLE_ENTRY.pack(offset, len(record))
+        offset += len(record)
     with open(data_file_path, "wb") as file:
-        pickle.dump(metadata_list, file)
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(records)))
+        file.write(table)
+        file.writelines(records)
+
+
+def load_metadata(data_file_path: pathlib.Path) -> list[MsixMetadata]:
+    """Load MSIX metadata for every package."""
+    if not is_payload(data_file_path):
+        return load_legacy_metadata(data_file_path)
+    with MetadataPayload(data_file_path) as payload:
+        return payload.to_list()
+
+
+def load_main_metadata(data_file_path: pathlib.Path) -> MsixMetadata:
+    """Load the MSIX metadata of the main package only."""
+    if not is_payload(data_file_path):
+        return load_legacy_metadata(data_file_path)[0]
+    with MetadataPayload(data_file_path) as payload:
+        return payload[0]
+
 
+def load_legacy_metadata(data_file_path: pathlib.Path) -> list[MsixMetadata]:
+    """
+    Load metadata from a pickle written by an older version.
 
-def load_metadata(data_file_path: pathlib.Path) -> list[msix.MsixMetadata]:
-    """Load MSIX metadata from a pickle file."""
+    Fields added since the pickle was written get their defaults.
+    """
     with open(data_file_path, "rb") as file:
-        return pickle.load(file)
+        # Pickles reference msix.MsixMetadata so this imports the msix module
+        legacy_list = pickle.load(file)
+    upgraded = []
+    for legacy in legacy_list:
+        legacy_values = vars(legacy)
+        names = [field.name for field in fields(MsixMetadata) if field.name in legacy_values]
+        values = {name: legacy_values[name] for name in names}
+        upgraded.append(MsixMetadata(**values))
+    return upgraded
@@ -0,0 +1,142 @@
+"""Functions to find qualified resource files, such as scaled logos, in a package."""
+
+from dataclasses import dataclass, field
+from typing import Iterable
+import logging
+import posixpath
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Qualifier names recognised by the Windows resource management system
+QUALIFIER_NAMES = frozenset(
+    (
+        "altform",
+        "configuration",
+        "contrast",
+        "custom",
+        "devicefamily",
+        "dxfeaturelevel",
+        "homeregion",
+        "lang",
+        "language",
+        "layoutdir",
+        "layoutdirection",
+        "scale",
+        "targetsize",
+        "theme",
+    )
+)
+# The Logo in the manifest Properties is the store logo which is 50x50 at scale-100
+DEFAULT_BASE_SIZE = 50
+
+
+@dataclass
+class ResourceVariant:
+    path: str
+    qualifiers: dict[str, str] = field(default_factory=dict)
+
+    def pixel_size(self, base_size: int) -> int:
+        """Get the size of this variant in pixels given the size at scale-100."""
+        if "targetsize" in self.qualifiers:
+            return int(self.qualifiers["targetsize"])
+        return base_size * int(self.qualifiers.get("scale", 100)) // 100
+
+
+def parse_qualifiers(token: str) -> dict[str, str] | None:
+    """
+    Parse a qualifier string such as 'targetsize-16_altform-unplated'.
+
+    Returns None if the string isn't made up of qualifiers.
+    """
+    qualifiers = {}
+    for part in token.split("_"):
+        name, separator, value = part.partition("-")
+        name = name.lower()
+        if not separator or not value or name not in QUALIFIER_NAMES:
+            return None
+        if name in ("scale", "targetsize") and not value.isdigit():
+            return None
+        qualifiers[name] = value.lower()
+    return qualifiers
+
+
+def split_resource_name(name: str) -> tuple[str, dict[str, str]]:
+    """
+    Split a file name in a package into its unqualified key and its qualifiers.
+
+    Qualifiers may be in the file name (Assets/Logo.scale-200.png) or be folder
+    names (Assets/scale-200/Logo.png). The key is lower case as package paths
+    are case insensitive.
+    """
+    *folders, file_name = name.split("/")
+    qualifiers: dict[str, str] = {}
+    kept_folders = []
+    for folder in folders:
+        folder_qualifiers = parse_qualifiers(folder)
+        if folder_qualifiers is None:
+            kept_folders.append(folder)
+        else:
+            qualifiers.update(folder_qualifiers)
+
+    stem, extension = posixpath.splitext(file_name)
+    base_stem, dot, token = stem.rpartition(".")
+    if dot:
+        name_qualifiers = parse_qualifiers(token)
+        if name_qualifiers is not None:
+            qualifiers.update(name_qualifiers)
+            stem = base_stem
+    key = "/".join([*kept_folders, stem + extension]).lower()
+    return key, qualifiers
+
+
+class ResourceIndex:
+    """
+    Index of every qualified variant of each resource in a package.
+
+    Build this once per archive, lookups are then a dictionary access.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._variants: dict[str, list[ResourceVariant]] = {}
+        for name in names:
+            if name.endswith("/"):
+                continue
+            key, qualifiers = split_resource_name(name)
+            self._variants.setdefault(key, []).append(ResourceVariant(name, qualifiers))
+
+    @classmethod
+    def from_zip(cls, archive: zipfile.ZipFile) -> "ResourceIndex":
+        return cls(info.filename for info in archive.infolist())
+
+    def variants(self, resource_path: str) -> list[ResourceVariant]:
+        """Get every variant of a resource path as written in the manifest."""
+        key, _ = split_resource_name(resource_path.replace("\\", "/"))
+        return self._variants.get(key, [])
+
+    def find_best(self, resource_path: str, target_size: int, base_size: int = DEFAULT_BASE_SIZE) -> str:
+        """
+        Get the variant of a resource that best suits an image of target_size pixels.
+
+        The smallest variant at least as big as the target is used, otherwise the
+        biggest. Standard contrast and plated variants are preferred.
+        """
+        variants = self.variants(resource_path)
+        if not variants:
+            raise FileNotFoundError(f"No qualified file found for {resource_path} in archive.")
+
+        def rank(variant: ResourceVariant) -> tuple:
+            size = variant.pixel_size(base_size)
+            is_special_contrast = variant.qualifiers.get("contrast", "standard") != "standard"
+            return (
+                is_special_contrast,
+                # Too small variants rank after every big enough variant, the biggest of them first
+                size < target_size,
+                size if size >= target_size else -size,
+                "altform" in variant.qualifiers,
+                len(variant.qualifiers),
+            )
+
+        best = min(variants, key=rank)
+        logger.debug("Using %s for %s at %spx", best.path, resource_path, target_size)
+        return best.path
@@ -0,0 +1,211 @@
+"""Install packages in dependency order, installing independent packages at the same time."""
+
+from dataclasses import dataclass, field
+from msix_global_installer.metadata import MsixMetadata
+from typing import Awaitable, Callable
+import asyncio
+import enum
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NodeState(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATES = (NodeState.SUCCEEDED, NodeState.FAILED, NodeState.CANCELLED)
+
+
+@dataclass
+class InstallNode:
+    """A package to install and the packages that must be installed before it."""
+
+    key: str
+    metadata: MsixMetadata
+    requires: set[str] = field(default_factory=set)
+    dependents: set[str] = field(default_factory=set)
+    state: NodeState = NodeState.PENDING
+    progress: int = 0
+    # What the install raised, if it did
+    error: Exception | None = None
+
+
+class DependencyCycleError(ValueError):
+    """Raised when packages depend on each other so none can be installed first."""
+
+
+def get_node_key(metadata: MsixMetadata) -> str:
+    """Get the key of a package in the graph, the same package can be shipped for several architectures."""
+    if not metadata.identity_name:
+        return str(metadata.package_path)
+    if metadata.architecture:
+        return f"{metadata.identity_name}_{metadata.architecture}"
+    return metadata.identity_name
+
+
+def build_graph(metadata_list: list[MsixMetadata]) -> dict[str, InstallNode]:
+    """
+    Build the install graph from each package's PackageDependency elements.
+
+    The main package, which comes first, is installed after every other package
+    as those are shipped because it needs them. A dependency requires every
+    package with its name, whatever the architecture. Dependencies on packages
+    that aren't in the list, such as ones already installed, are ignored.
+    """
+    nodes: dict[str, InstallNode] = {}
+    keys_by_name: dict[str, list[str]] = {}
+    for metadata in metadata_list:
+        key = get_node_key(metadata)
+        if key in nodes:
+            # The same package and architecture twice, such as two versions of it
+            key = f"{key} ({metadata.package_path})"
+        nodes[key] = InstallNode(key, metadata)
+        name = metadata.identity_name or str(metadata.package_path)
+        keys_by_name.setdefault(name.lower(), []).append(key)
+
+    for node in nodes.values():
+        for dependency in node.metadata.dependencies:
+            for required_key in keys_by_name.get(dependency.name.lower(), []):
+                if required_key != node.key:
+                    node.requires.add(required_key)
+    main_key = next(iter(nodes))
+    nodes[main_key].requires.update(key for key in nodes if key != main_key)
+
+    for node in nodes.values():
+        for required_key in node.requires:
+            nodes[required_key].dependents.add(node.key)
+    check_acyclic(nodes)
+    return nodes
+
+
+def check_acyclic(nodes: dict[str, InstallNode]) -> None:
+    """Raise DependencyCycleError if the graph can't be installed in any order."""
+    remaining = {key: len(node.requires) for key, node in nodes.items()}
+    ready = [key for key, count in remaining.items() if count == 0]
+    ordered = 0
+    while ready:
+        key = ready.pop()
+        ordered += 1
+        for dependent in nodes[key].dependents:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    if ordered != len(nodes):
+        cycle = sorted(key for key, count in remaining.items() if count)
+        raise DependencyCycleError(f"Packages depend on each other: {', '.join(cycle)}")
+
+
+# Installs a package on the event loop, reporting its progress from 0 to 100, and returns whether it succeeded
+AsyncInstallFunction = Callable[[InstallNode, Callable[[int], int]], Awaitable[bool]]
+
+
+class InstallScheduler:
+    """
+    Install every node once its prerequisites have succeeded.
+
+    Up to max_concurrent installs run at once as tasks on the event loop. When
+    an install fails, everything that depends on it is cancelled and unrelated
+    installs carry on.
+    """
+
+    def __init__(
+        self,
+        nodes: dict[str, InstallNode],
+        install: AsyncInstallFunction,
+        max_concurrent: int = 1,
+        on_progress: Callable[[InstallNode, int], None] | None = None,
+    ):
+        self.nodes = nodes
+        self.install = install
+        self.max_concurrent = max(1, max_concurrent)
+        self.on_progress = on_progress
+
+    @property
+    def overall_progress(self) -> int:
+        """Progress of every package together, finished packages count as complete."""
+        return self._overall_progress()
+
+    async def run_async(self) -> bool:
+        """Install everything and return True if every package was installed."""
+        ready = self._initially_ready()
+        running: dict[asyncio.Task, InstallNode] = {}
+        try:
+            while ready or running:
+                while ready and len(running) < self.max_concurrent:
+                    node = self._start(ready.pop(0))
+                    running[asyncio.create_task(self._install_async(node))] = node
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    ready.extend(self._complete(running.pop(task), task.result()))
+        finally:
+            # Only left running if this was cancelled
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        return self._all_succeeded()
+
+    def _initially_ready(self) -> list[str]:
+        return [key for key, node in self.nodes.items() if not node.requires]
+
+    def _start(self, key: str) -> InstallNode:
+        node = self.nodes[key]
+        node.state = NodeState.RUNNING
+        logger.info("Starting install of %s", node.key)
+        return node
+
+    def _complete(self, node: InstallNode, succeeded: bool) -> list[str]:
+        """Record the result of an install and get the keys it made ready."""
+        if succeeded:
+            self._finish(node, NodeState.SUCCEEDED)
+            return self._newly_ready(node)
+        self._finish(node, NodeState.FAILED)
+        self._cancel_dependents(node)
+        return []
+
+    def _all_succeeded(self) -> bool:
+        return all(node.state == NodeState.SUCCEEDED for node in self.nodes.values())
+
+    async def _install_async(self, node: InstallNode) -> bool:
+        try:
+            return await self.install(node, lambda progress: self._report(node, progress))
+        except Exception as e:
+            logger.exception("Install of %s raised", node.key)
+            node.error = e
+            return False
+
+    def _report(self, node: InstallNode, progress: int) -> int:
+        node.progress = max(0, min(100, progress))
+        overall = self._overall_progress()
+        if self.on_progress is not None:
+            self.on_progress(node, overall)
+        return overall
+
+    def _overall_progress(self) -> int:
+        total = sum(100 if node.state in FINISHED_STATES else node.progress for node in self.nodes.values())
+        return total // len(self.nodes)
+
+    def _finish(self, node: InstallNode, state: NodeState) -> None:
+        logger.info("Install of %s %s", node.key, state.value)
+        node.state = state
+
+    def _newly_ready(self, node: InstallNode) -> list[str]:
+        return [
+            key
+            for key in sorted(node.dependents)
+            if self.nodes[key].state == NodeState.PENDING
+            and all(self.nodes[required].state == NodeState.SUCCEEDED for required in self.nodes[key].requires)
+        ]
+
+    def _cancel_dependents(self, node: InstallNode) -> None:
+        to_cancel = list(node.dependents)
+        while to_cancel:
+            dependent = self.nodes[to_cancel.pop()]
+            if dependent.state == NodeState.PENDING:
+                logger.warning("Cancelling install of %s as %s failed", dependent.key, node.key)
+                self._finish(dependent, NodeState.CANCELLED)
+                to_cancel.extend(dependent.dependents)
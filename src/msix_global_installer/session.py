@@ -0,0 +1,468 @@
+"""A PowerShell session kept open to run one command after another."""
+
+from msix_global_installer import config
+from typing import AsyncIterator, Callable, Protocol
+import asyncio
+import codecs
+import logging
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import time
+
+if sys.platform == "win32":
+    from winpty import PtyProcess
+else:
+    import pty
+    import termios
+
+logger = logging.getLogger(__name__)
+
+# Printed with a per command nonce once the command has finished
+COMPLETION_MARKER = "INSTALL_COMPLETE"
+# How the command that prints the completion line ends, so the end of the echoed command
+COMPLETION_COMMAND_END = "$code)"
+# Terminal control sequences: CSI (colours, cursor movement), OSC (window title) and two character escapes
+ANSI_ESCAPE_PATTERN = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])")
+# Most output to read from the terminal at once
+PTY_READ_SIZE = 4096
+# Interrupts the running command
+CTRL_C = "\x03"
+
+
+class ShellProcess(Protocol):
+    """The parts of winpty's PtyProcess the session uses."""
+
+    exitstatus: int | None
+    pid: int
+
+    def read(self, size: int) -> str:
+        """Read up to size characters, raising EOFError once the shell has gone."""
+        ...
+
+    def write(self, data: str) -> int: ...
+
+    def isalive(self) -> bool: ...
+
+    def close(self) -> None:
+        """Release the terminal, killing the shell if it's still running."""
+        ...
+
+
+class ShellReader(Protocol):
+    """Reads a shell's output without blocking the event loop."""
+
+    async def read(self, size: int) -> str:
+        """Read up to size characters, raising EOFError once the shell has gone."""
+        ...
+
+    def close(self) -> None:
+        """Stop reading, before the shell's terminal is closed."""
+        ...
+
+
+def strip_ansi(text: str) -> str:
+    """Remove terminal control sequences."""
+    return ANSI_ESCAPE_PATTERN.sub("", text)
+
+
+def quote_path(path: os.PathLike | str) -> str:
+    """Quote a path as a PowerShell string literal."""
+    return "'%s'" % str(path).replace("'", "''")
+
+
+def make_nonce() -> str:
+    """Get a random value to tell a command's completion line apart from any other output."""
+    return secrets.token_hex(8)
+
+
+def build_completion_command(nonce: str) -> str:
+    """
+    Get the PowerShell to append to a command to print its completion line.
+
+    The line is built when the command runs so it never appears in the echoed command.
+    """
+    return (
+        "; $success=[int]$?; $code=[int]$LASTEXITCODE"
+        f"; echo ('{COMPLETION_MARKER}' + '_{nonce}=' + $success + ',' + {COMPLETION_COMMAND_END}"
+    )
+
+
+def build_completion_pattern(nonce_pattern: str) -> str:
+    """Get a regular expression matching a completion line, with success and exit_code groups."""
+    return rf"{COMPLETION_MARKER}_{nonce_pattern}=(?P<success>[01]),(?P<exit_code>-?\d+)"
+
+
+def kill_process_tree(pid: int) -> None:
+    """Kill a shell and every process it started."""
+    logger.warning("Killing process %s and its children", pid)
+    if sys.platform == "win32":
+        subprocess.run(["taskkill", "/PID", str(pid), "/T", "/F"], capture_output=True)
+        return
+    try:
+        # The shell leads its own process group, see PosixPtyProcess
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def spawn_powershell() -> ShellProcess:
+    # We must use a psudo terminal as otherwise
+    # the written lines are not going to stdout, just appearing on the terminal for the progress
+    # This method ensures we can write the progress to the progress bar.
+    return PtyProcess.spawn("powershell.exe")
+
+
+class PosixPtyProcess:
+    """
+    Run a command in a POSIX pseudo terminal, with the same interface as winpty's PtyProcess.
+
+    Lets a stand in shell be used on Linux.
+    """
+
+    def __init__(self, argv: list[str]):
+        self._fd, terminal = pty.openpty()
+        # The shell echoes what it reads, as on Windows, rather than the terminal echoing it as soon as it's written
+        attributes = termios.tcgetattr(terminal)
+        attributes[3] &= ~termios.ECHO
+        termios.tcsetattr(terminal, termios.TCSANOW, attributes)
+        # In its own session, so the shell and everything it starts can be killed together
+        self._process = subprocess.Popen(
+            argv, stdin=terminal, stdout=terminal, stderr=terminal, close_fds=True, start_new_session=True
+        )
+        os.close(terminal)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._closed = False
+
+    @property
+    def exitstatus(self) -> int | None:
+        return self._process.poll()
+
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read(self, size: int = 1024) -> str:
+        """Read up to size characters, or nothing if the terminal is non-blocking and there's nothing to read."""
+        try:
+            data = os.read(self._fd, size)
+        except BlockingIOError:
+            return ""
+        except OSError:
+            # Reading fails rather than returning nothing once the shell has closed the terminal
+            data = b""
+        if not data:
+            try:
+                # The shell is exiting, wait so the exit status is known
+                self._process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+            raise EOFError("The shell has closed the terminal")
+        return self._decoder.decode(data)
+
+    def write(self, data: str) -> int:
+        return os.write(self._fd, data.encode())
+
+    def isalive(self) -> bool:
+        return self._process.poll() is None
+
+    def close(self) -> None:
+        """Kill the shell if it's still running and close the terminal."""
+        if self._closed:
+            return
+        if self.isalive():
+            self._process.kill()
+        self._process.wait()
+        os.close(self._fd)
+        self._closed = True
+
+
+class FdPtyReader:
+    """
+    Read a POSIX pseudo terminal on the event loop.
+
+    The loop waits for the terminal to be readable, so no thread is needed per shell.
+    The terminal is made non-blocking, as it can be reported readable before the
+    output can be read.
+    """
+
+    def __init__(self, process: PosixPtyProcess):
+        self._process = process
+        os.set_blocking(process.fileno(), False)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._readable: asyncio.Future | None = None
+
+    async def read(self, size: int) -> str:
+        while True:
+            await self._wait_readable()
+            try:
+                chunk = self._process.read(size)
+            except EOFError:
+                self._stop_waiting()
+                raise
+            if chunk:
+                return chunk
+
+    async def _wait_readable(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._readable = loop.create_future()
+        if self._loop is not loop:
+            self._loop = loop
+            loop.add_reader(self._process.fileno(), self._on_readable)
+        try:
+            await self._readable
+        finally:
+            self._readable = None
+
+    def _on_readable(self) -> None:
+        if self._readable is not None and not self._readable.done():
+            self._readable.set_result(None)
+        elif self._readable is None:
+            # Stay registered while output is read one chunk after another, stop once nothing is waiting
+            self._stop_waiting()
+
+    def _stop_waiting(self) -> None:
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._process.fileno())
+        self._loop = None
+
+    def close(self) -> None:
+        self._stop_waiting()
+
+
+class ExecutorPtyReader:
+    """
+    Read any shell with its blocking read in the loop's executor.
+
+    Used for winpty, whose terminal can't be waited on by the event loop. A read
+    that's cancelled carries on, and its output is returned by the next read.
+    """
+
+    def __init__(self, process: ShellProcess):
+        self._process = process
+        self._pending: asyncio.Future[str] | None = None
+
+    async def read(self, size: int) -> str:
+        if self._pending is None:
+            self._pending = asyncio.get_running_loop().run_in_executor(None, self._process.read, size)
+        try:
+            chunk = await asyncio.shield(self._pending)
+        except EOFError:
+            self._pending = None
+            raise
+        self._pending = None
+        return chunk
+
+    def close(self) -> None:
+        if self._pending is not None:
+            # The read fails once the terminal is closed, nothing is waiting for it any more
+            self._pending.add_done_callback(lambda future: future.cancelled() or future.exception())
+            self._pending = None
+
+
+def make_reader(process: ShellProcess) -> ShellReader:
+    """Get the reader for a shell, reading on the event loop where the terminal allows it."""
+    if sys.platform != "win32" and isinstance(process, PosixPtyProcess):
+        return FdPtyReader(process)
+    return ExecutorPtyReader(process)
+
+
+class AsyncPowerShellSession:
+    """
+    One shell reused for every command, rather than starting one per command.
+
+    Each command ends with a completion line tagged with its own nonce, so the
+    output of one command is never taken for another's. The shell is started on
+    first use and started again if it has died.
+
+    Commands are read on the event loop, several sessions can run commands at
+    once on one loop. The reader is made for each shell by reader_factory, see
+    make_reader.
+    """
+
+    def __init__(
+        self,
+        spawn: Callable[[], ShellProcess] = spawn_powershell,
+        reader_factory: Callable[[ShellProcess], ShellReader] = make_reader,
+    ):
+        self._spawn = spawn
+        self._reader_factory = reader_factory
+        self._reader: ShellReader | None = None
+        self._reader_process: ShellProcess | None = None
+        self._process: ShellProcess | None = None
+        # Set while the output of a command hasn't been read up to its completion line
+        self._pending_nonce: str | None = None
+        # Output after the last line end read, the start of a line still being written
+        self._partial = ""
+        self.starts = 0
+
+    @property
+    def exitstatus(self) -> int | None:
+        """Exit status of the shell if it has exited."""
+        if self._process is None or self._process.isalive():
+            return None
+        return self._process.exitstatus
+
+    def _needs_process(self) -> bool:
+        if self._process is not None and not self._process.isalive():
+            logger.warning("Shell exited with %s, starting a new one", self._process.exitstatus)
+        return self._process is None or not self._process.isalive()
+
+    def _started(self, process: ShellProcess) -> None:
+        if self._process is not None:
+            # The previous shell has exited
+            self._release(self._process)
+        self._process = process
+        self._pending_nonce = None
+        self._partial = ""
+        self.starts += 1
+
+    def _ensure_process(self) -> ShellProcess:
+        if self._needs_process():
+            self._started(self._spawn())
+        return self._process
+
+    def _start_command(self, command: str, nonce: str) -> ShellProcess:
+        process = self._ensure_process()
+        process.write(command + build_completion_command(nonce) + os.linesep)
+        self._pending_nonce = nonce
+        return process
+
+    def _end_of_output(self) -> None:
+        logger.warning("Shell exited before the command completed")
+        self._pending_nonce = None
+
+    def _is_complete(self, chunk: str, completion: re.Pattern) -> bool:
+        """Check the lines a chunk completes for the completion line."""
+        # Only search complete lines, the exit code could be split across reads
+        text = self._partial + chunk
+        end = max(text.rfind("\r"), text.rfind("\n")) + 1
+        self._partial = text[end:]
+        is_complete = completion.search(strip_ansi(text[:end])) is not None
+        if is_complete:
+            # Before yielding, the caller may stop reading once it has the result
+            self._pending_nonce = None
+        return is_complete
+
+    @staticmethod
+    def _get_success(output: str, nonce: str) -> bool | None:
+        completion = re.search(build_completion_pattern(re.escape(nonce)), strip_ansi(output))
+        if completion is None:
+            return None
+        return completion["success"] == "1"
+
+    async def start(self) -> None:
+        """Start the shell if it isn't running, without blocking the loop while it starts."""
+        if not self._needs_process():
+            return
+        spawning = asyncio.get_running_loop().run_in_executor(None, self._spawn)
+        try:
+            process = await asyncio.shield(spawning)
+        except asyncio.CancelledError:
+            # Don't leave behind a shell that finishes starting after being given up on
+            spawning.add_done_callback(lambda future: future.exception() or kill_process_tree(future.result().pid))
+            raise
+        self._started(process)
+
+    async def run(self, command: str, nonce: str) -> AsyncIterator[str]:
+        """
+        Run a command and yield its output as it's read.
+
+        Ends after the completion line, or early if the shell exits. Output the
+        caller stops reading is skipped before the next command is run.
+        """
+        await self._skip_pending()
+        await self.start()
+        self._start_command(command, nonce)
+        async for chunk in self._read_until_complete(nonce):
+            yield chunk
+
+    async def execute(self, command: str) -> bool | None:
+        """Run a command to completion, ignoring its output, and get whether it succeeded."""
+        nonce = make_nonce()
+        return self._get_success("".join([chunk async for chunk in self.run(command, nonce)]), nonce)
+
+    async def close(self, grace_s: float | None = None) -> None:
+        """
+        Ask the shell to exit, then release its terminal once it has.
+
+        If it hasn't exited after grace_s, config.SHELL_EXIT_GRACE_S by default,
+        it and everything it started are killed.
+        """
+        await self._stop("Exit" + os.linesep, grace_s)
+
+    async def terminate(self, grace_s: float | None = None) -> None:
+        """Stop the shell even if a command is still running, interrupting the command then closing as close does."""
+        await self._stop(CTRL_C + os.linesep + "Exit" + os.linesep, grace_s)
+
+    async def _stop(self, exit_input: str, grace_s: float | None) -> None:
+        if grace_s is None:
+            grace_s = config.SHELL_EXIT_GRACE_S
+        process = self._process
+        self._process = None
+        self._pending_nonce = None
+        self._partial = ""
+        if process is None:
+            return
+        if process.isalive():
+            try:
+                process.write(exit_input)
+            except OSError:
+                pass
+            deadline = time.monotonic() + grace_s
+            while process.isalive() and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            if process.isalive():
+                logger.warning("Shell didn't exit within %s s", grace_s)
+                kill_process_tree(process.pid)
+        self._release(process)
+
+    def _release(self, process: ShellProcess) -> None:
+        """Stop reading a shell that has exited or been killed, and close its terminal."""
+        if self._reader_process is process:
+            self._reader.close()
+            self._reader = self._reader_process = None
+        process.close()
+
+    async def __aenter__(self) -> "AsyncPowerShellSession":
+        return self
+
+    async def __aexit__(self, exc_type, *exc_info) -> None:
+        # Leaving because of an error or cancellation, the shell may still be busy
+        if exc_type is not None:
+            await self.terminate()
+        else:
+            await self.close()
+
+    def _get_reader(self) -> ShellReader:
+        if self._reader is None or self._reader_process is not self._process:
+            self._reader = self._reader_factory(self._process)
+            self._reader_process = self._process
+        return self._reader
+
+    async def _skip_pending(self) -> None:
+        if self._pending_nonce is None or self._process is None:
+            return
+        logger.info("Skipping the rest of the output of the previous command")
+        async for _ in self._read_until_complete(self._pending_nonce):
+            pass
+
+    async def _read_until_complete(self, nonce: str) -> AsyncIterator[str]:
+        completion = re.compile(build_completion_pattern(re.escape(nonce)))
+        reader = self._get_reader()
+        while True:
+            try:
+                chunk = await reader.read(PTY_READ_SIZE)
+            except EOFError:
+                self._end_of_output()
+                return
+            is_complete = self._is_complete(chunk, completion)
+            yield chunk
+            if is_complete:
+                return
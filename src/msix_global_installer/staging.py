@@ -0,0 +1,47 @@
+"""Write files that only save time, such as caches, so a half-written one is never read."""
+
+from typing import Callable
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Staged files and directories sit alongside where they're moved to, with this prefix
+STAGING_PREFIX = ".staging-"
+
+
+def write_staged(path: pathlib.Path, write: Callable[[pathlib.Path], None], directory: bool = False) -> bool:
+    """
+    Write a file or directory to a staging path, then move it into place at path.
+
+    Anything already at path is replaced. What is written is optional, so an OSError
+    is logged rather than raised. Returns whether it was moved into place.
+    """
+    staging_path = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if directory:
+            staging_path = pathlib.Path(tempfile.mkdtemp(dir=path.parent, prefix=STAGING_PREFIX))
+        else:
+            file_descriptor, staging_name = tempfile.mkstemp(dir=path.parent, prefix=STAGING_PREFIX)
+            os.close(file_descriptor)
+            staging_path = pathlib.Path(staging_name)
+        write(staging_path)
+        if directory and path.exists():
+            # A directory can only be moved over an empty one
+            shutil.rmtree(path)
+        os.replace(staging_path, path)
+        return True
+    except OSError as e:
+        # Another process may have written the same path, either way it is optional
+        logger.warning("Failed to write %s: %s", path, e)
+        return False
+    finally:
+        if staging_path is not None:
+            if directory:
+                shutil.rmtree(staging_path, ignore_errors=True)
+            else:
+                staging_path.unlink(missing_ok=True)
@@ -0,0 +1,119 @@
+"""
+Report how long the installer takes to draw its first frame and what it imports before then.
+
+Usage: python -m msix_global_installer.startup
+"""
+
+from dataclasses import dataclass
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import time
+
+# The install backend, imported on the worker thread once the first frame is drawn
+BACKEND_MODULES = ("msix_global_installer.backend", "msix_global_installer.msix", "zipfile", "xml.etree.ElementTree")
+APP_START_MARKER = "APP_START"
+FIRST_FRAME_MARKER = "FIRST_FRAME"
+IMPORT_TIME_PATTERN = re.compile(
+    r"import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<indent> *)(?P<name>\S+)"
+)
+
+# Run the app, then close the window once the first frame is drawn. Modules the interpreter loaded at
+# startup are left out so only what the app imports is reported.
+FIRST_FRAME_CODE = f"""
+import sys
+started_with = set(sys.modules)
+print({APP_START_MARKER!r}, file=sys.stderr, flush=True)
+from msix_global_installer import app
+
+def first_frame(root):
+    loaded = [name for name in {BACKEND_MODULES!r} if name in sys.modules and name not in started_with]
+    print({FIRST_FRAME_MARKER!r}, *loaded, file=sys.stderr, flush=True)
+    root.destroy()
+
+app.main(on_first_frame=first_frame)
+"""
+
+
+@dataclass
+class ImportTime:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class StartupReport:
+    first_frame_s: float
+    # Imported by the app before the first frame on any thread, in the order -X importtime reports them
+    imports: list[ImportTime]
+    # Backend modules already imported when the first frame was drawn
+    backend_loaded: list[str]
+
+
+def parse_import_times(lines: list[str]) -> list[ImportTime]:
+    """Get the import times from -X importtime output."""
+    times = []
+    for line in lines:
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is not None:
+            depth = len(match["indent"]) // 2
+            times.append(ImportTime(match["name"], int(match["self"]), int(match["cumulative"]), depth))
+    return times
+
+
+def measure_first_frame(import_time: bool = True, timeout_s: float = 60) -> StartupReport:
+    """
+    Start the installer in a new interpreter and time it from launch until the first frame is drawn.
+
+    Raises RuntimeError if the app exits without drawing a frame.
+    """
+    package_root = str(pathlib.Path(__file__).resolve().parent.parent)
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, environment.get("PYTHONPATH")]))
+    command = [sys.executable, *(["-X", "importtime"] if import_time else []), "-c", FIRST_FRAME_CODE]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=environment)
+    lines = []
+    first_frame_s = None
+    backend_loaded: list[str] = []
+    try:
+        for line in process.stderr:
+            if line.startswith(APP_START_MARKER):
+                # What the interpreter imported before running the app
+                lines.clear()
+            elif line.startswith(FIRST_FRAME_MARKER):
+                first_frame_s = time.perf_counter() - started
+                backend_loaded = line.split()[1:]
+                break
+            else:
+                lines.append(line)
+        _, remaining = process.communicate(timeout=timeout_s)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    if first_frame_s is None:
+        raise RuntimeError(f"The app exited without drawing a frame:\n{''.join(lines)}{remaining}")
+    return StartupReport(first_frame_s, parse_import_times(lines), backend_loaded)
+
+
+def print_report(report: StartupReport, top: int = 15) -> None:
+    print(f"First frame drawn {report.first_frame_s * 1000:.0f} ms after launch")
+    total_ms = sum(entry.self_us for entry in report.imports) / 1000
+    print(f"{len(report.imports)} modules imported before it on any thread, taking {total_ms:.0f} ms")
+    if report.backend_loaded:
+        print(f"Backend modules imported before the first frame: {', '.join(report.backend_loaded)}")
+    print(f"\nSlowest imports, including what they import:\n{'cumulative ms':>14}  module")
+    for entry in sorted(report.imports, key=lambda entry: entry.cumulative_us, reverse=True)[:top]:
+        print(f"{entry.cumulative_us / 1000:>14.1f}  {'  ' * entry.depth}{entry.name}")
+    print(f"\nSlowest imports on their own:\n{'self ms':>14}  module")
+    for entry in sorted(report.imports, key=lambda entry: entry.self_us, reverse=True)[:top]:
+        print(f"{entry.self_us / 1000:>14.1f}  {entry.name}")
+
+
+if __name__ == "__main__":
+    print_report(measure_first_frame())
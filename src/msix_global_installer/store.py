@@ -0,0 +1,48 @@
+"""Shared, lazily loaded store of the installer metadata."""
+
+from msix_global_installer import config, pickler
+from msix_global_installer.metadata import MsixMetadata
+import logging
+import pathlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataStore:
+    """
+    Load the metadata payload once and share it between threads.
+
+    Nothing is read until first use. The same objects are returned to every
+    caller so they must be treated as read only.
+    """
+
+    def __init__(self, data_file_path: pathlib.Path):
+        self.data_file_path = data_file_path
+        self._lock = threading.Lock()
+        self._main: MsixMetadata | None = None
+        self._all: tuple[MsixMetadata, ...] | None = None
+
+    def main(self) -> MsixMetadata:
+        """Get the main package metadata, without decoding the dependencies if not already loaded."""
+        with self._lock:
+            if self._main is None:
+                logger.info("Loading main metadata from %s", self.data_file_path)
+                self._main = pickler.load_main_metadata(self.data_file_path)
+            return self._main
+
+    def all(self) -> tuple[MsixMetadata, ...]:
+        """Get the metadata of every package, main package first."""
+        with self._lock:
+            if self._all is None:
+                logger.info("Loading all metadata from %s", self.data_file_path)
+                loaded = pickler.load_metadata(self.data_file_path)
+                if self._main is not None:
+                    # Keep handing out the object callers already have
+                    loaded[0] = self._main
+                self._all = tuple(loaded)
+                self._main = self._all[0]
+            return self._all
+
+
+metadata_store = MetadataStore(config.EXTRACTED_DATA_PATH)
@@ -0,0 +1,139 @@
+"""Stop installs that have hung, such as when the deployment service is stuck."""
+
+from dataclasses import dataclass
+from msix_global_installer import config
+from typing import Awaitable, TypeVar
+import asyncio
+import enum
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Phase(str, enum.Enum):
+    SPAWN = "starting the shell"
+    FIRST_OUTPUT = "waiting for output"
+    NO_PROGRESS = "waiting for progress"
+    TOTAL = "installing"
+
+
+@dataclass
+class Timeouts:
+    """Seconds allowed for each phase, None for no limit."""
+
+    spawn_s: float | None = None
+    first_output_s: float | None = None
+    no_progress_s: float | None = None
+    total_s: float | None = None
+
+    @classmethod
+    def from_config(cls) -> "Timeouts":
+        return cls(
+            spawn_s=config.SPAWN_TIMEOUT_S,
+            first_output_s=config.FIRST_OUTPUT_TIMEOUT_S,
+            no_progress_s=config.NO_PROGRESS_TIMEOUT_S,
+            total_s=config.INSTALL_TIMEOUT_S,
+        )
+
+
+class InstallTimeoutError(TimeoutError):
+    """Raised when an install has spent too long in one phase."""
+
+    def __init__(self, phase: Phase, limit_s: float):
+        super().__init__(f"Timed out after {limit_s:g} s {phase.value}")
+        self.phase = phase
+        self.limit_s = limit_s
+
+
+class Watchdog:
+    """
+    Follow an install through its phases and stop it once one takes too long.
+
+    The install reports when the shell has started, when there's output and when
+    the progress goes up. Only the progress going up resets the no progress
+    timeout, a progress bar redrawn at the same value doesn't.
+    """
+
+    def __init__(self, timeouts: Timeouts | None = None, clock=time.monotonic):
+        self.timeouts = timeouts if timeouts is not None else Timeouts.from_config()
+        self.clock = clock
+        self.phase = Phase.SPAWN
+        self.started_at = self.phase_started_at = clock()
+        self.progress = 0
+        # Set when the phase changes, the next timeout may be sooner
+        self._changed: asyncio.Event | None = None
+
+    def spawned(self) -> None:
+        """The shell is running and the command has been sent."""
+        if self.phase == Phase.SPAWN:
+            self._enter(Phase.FIRST_OUTPUT)
+
+    def output(self) -> None:
+        """The install has written something other than the echoed command."""
+        if self.phase == Phase.FIRST_OUTPUT:
+            self._enter(Phase.NO_PROGRESS)
+
+    def progressed(self, progress: int) -> None:
+        """The install has reported its progress."""
+        if progress > self.progress:
+            self.progress = progress
+            self._enter(Phase.NO_PROGRESS)
+
+    def expired(self) -> InstallTimeoutError | None:
+        """Get the timeout that has passed, if any."""
+        now = self.clock()
+        for phase, started_at, limit_s in self._limits():
+            if now - started_at >= limit_s:
+                return InstallTimeoutError(phase, limit_s)
+        return None
+
+    def remaining_s(self) -> float | None:
+        """Seconds until the next timeout, None if there's no limit."""
+        now = self.clock()
+        remaining = [started_at + limit_s - now for _, started_at, limit_s in self._limits()]
+        return max(0.0, min(remaining)) if remaining else None
+
+    async def guard(self, awaitable: Awaitable[T]) -> T:
+        """Wait for an install, cancelling it and raising InstallTimeoutError once a timeout passes."""
+        task = asyncio.ensure_future(awaitable)
+        self._changed = asyncio.Event()
+        changed = asyncio.ensure_future(self._changed.wait())
+        try:
+            while True:
+                await asyncio.wait({task, changed}, timeout=self.remaining_s(), return_when=asyncio.FIRST_COMPLETED)
+                if task.done():
+                    return task.result()
+                timeout = self.expired()
+                if timeout is not None:
+                    logger.error("Stopping install: %s", timeout)
+                    raise timeout
+                if changed.done():
+                    self._changed.clear()
+                    changed = asyncio.ensure_future(self._changed.wait())
+        finally:
+            self._changed = None
+            changed.cancel()
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    def _enter(self, phase: Phase) -> None:
+        if phase != self.phase:
+            logger.debug("Install is %s", phase.value)
+        self.phase = phase
+        self.phase_started_at = self.clock()
+        if self._changed is not None:
+            self._changed.set()
+
+    def _limits(self) -> list[tuple[Phase, float, float]]:
+        phase_limits = {
+            Phase.SPAWN: self.timeouts.spawn_s,
+            Phase.FIRST_OUTPUT: self.timeouts.first_output_s,
+            Phase.NO_PROGRESS: self.timeouts.no_progress_s,
+        }
+        limits = [(Phase.TOTAL, self.started_at, self.timeouts.total_s)]
+        limits.append((self.phase, self.phase_started_at, phase_limits[self.phase]))
+        return [(phase, started_at, limit_s) for phase, started_at, limit_s in limits if limit_s is not None]
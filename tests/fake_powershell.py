@@ -0,0 +1,81 @@
+"""
+A stand in for powershell.exe that understands just the commands the installer sends.
+
+Packages named with Newer fail as already installed, Missing fail as not found
+and Crash make the shell exit part way through. Queued only writes its status and
+an empty bar for QUEUED_S before installing. Stale packages fail only when
+installed as a dependency in the same operation. Hang never writes anything
+and Stall stops after the first progress bar, both ignoring the shell being
+asked to exit. INSTALLED is what the inventory query reports, unless
+FAKE_POWERSHELL_HANG_INVENTORY is set in the environment and it never finishes.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+PROMPT = "PS C:\\> "
+QUEUED_S = 0.6
+INSTALLED = [
+    {"Name": "Microsoft.VCLibs.140.00", "Version": "14.0.33519.0", "Architecture": 9},
+    {"Name": "Microsoft.UI.Xaml.2.8", "Version": "8.2310.30001.0", "Architecture": 11},
+]
+
+
+def install(command: str) -> bool:
+    if "Hang" in command:
+        time.sleep(3600)
+    elif "Stall" in command:
+        print("    [oooo                ]    ", end="\r", flush=True)
+        time.sleep(3600)
+    elif "Crash" in command:
+        print("    [oooooooooo          ]    ", end="\r", flush=True)
+        sys.exit(1)
+    elif "Newer" in command or ("Stale" in command and "-DependencyPath" in command):
+        print("Add-AppxPackage : Deployment failed with HRESULT: 0x80073D06, The package could not be installed")
+        return False
+    elif "Queued" in command:
+        print("Deployment operation progress: Queued.msix")
+        print("    Initialized")
+        print(f"    [{' ' * 20}]    ", end="\r", flush=True)
+        time.sleep(QUEUED_S)
+    elif "Missing" in command:
+        print("    + CategoryInfo : ObjectNotFound: (App.msix:String) [Add-AppxPackage], ItemNotFoundException")
+        return False
+    for filled in range(0, 21, 5):
+        print(f"    [{'o' * filled}{' ' * (20 - filled)}]    ", end="\r", flush=True)
+        time.sleep(0.01)
+    print()
+    return True
+
+
+def main() -> None:
+    print("Windows PowerShell")
+    print(PROMPT, end="", flush=True)
+    success = True
+    for line in sys.stdin:
+        print(line, end="", flush=True)
+        for statement in line.split(";"):
+            statement = statement.strip()
+            if statement.startswith(("Add-AppxPackage", "Add-AppxProvisionedPackage")):
+                success = install(statement)
+            elif statement.startswith(("Get-AppxPackage", "Get-AppxProvisionedPackage")):
+                if os.environ.get("FAKE_POWERSHELL_HANG_INVENTORY"):
+                    time.sleep(3600)
+                output_path = re.search(r"-Path '([^']*)'", statement).group(1)
+                with open(output_path, "w", encoding="utf-8-sig") as output:
+                    json.dump(INSTALLED, output)
+                success = True
+            elif statement.startswith("echo ("):
+                # ('INSTALL_COMPLETE' + '_nonce=' + $success + ',' + $code)
+                marker, nonce, _ = re.findall(r"'([^']*)'", statement)
+                print(f"{marker}{nonce}{int(success)},0")
+            elif statement == "Exit":
+                return
+        print(PROMPT, end="", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import asyncio
+from msix_global_installer import backend, events
+
+
+class TestBackend:
+    """Class to test handling the GUI's requests."""
+
+    def test_one_install_at_a_time(self, monkeypatch):
+        """Test a second install request is ignored while one runs, so cancelling still reaches it."""
+        started = []
+        cancelled = []
+
+        async def install(install_globally: bool):
+            started.append(install_globally)
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(install_globally)
+                raise
+
+        monkeypatch.setattr(backend, "install", install)
+
+        async def main():
+            first = asyncio.create_task(
+                backend.run_install(events.Event(events.EventType.INSTALL_MSIX, data={"global": False}))
+            )
+            await asyncio.sleep(0)
+            await backend.run_install(events.Event(events.EventType.INSTALL_MSIX, data={"global": True}))
+            await backend.cancel_install(events.Event(events.EventType.CANCEL_INSTALL))
+            await asyncio.gather(first, return_exceptions=True)
+
+        asyncio.run(main())
+        assert started == [False]
+        assert cancelled == [False]
+        assert backend.install_task is None
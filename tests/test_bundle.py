@@ -0,0 +1,188 @@
+import io
+import pathlib
+import struct
+import tracemalloc
+import zipfile
+import zlib
+from msix_global_installer import bundle, msix
+
+TEST_PACKAGE = pathlib.Path("tests/TestMsixPackage.msix")
+SPARSE_PAYLOAD_BYTES = 3 * 1024**3
+
+
+def write_stored_zip(fp, entries) -> None:
+    """
+    Write a zip of STORED entries by hand.
+
+    Each entry is (name, writer) where writer writes the entry data at the
+    current position and returns its CRC. Offsets are relative to where the zip
+    starts so a zip can itself be written as an entry of another zip.
+    """
+    base = fp.tell()
+    central = []
+    for name, write in entries:
+        encoded = name.encode()
+        header_offset = fp.tell() - base
+        fp.write(
+            struct.pack(
+                zipfile.structFileHeader, zipfile.stringFileHeader, 20, 0, 0, 0, 0, 0, 0, 0, 0, len(encoded), 0
+            )
+        )
+        fp.write(encoded)
+        data_start = fp.tell()
+        crc = write(fp)
+        size = fp.tell() - data_start
+        # Patch the CRC and sizes now that they are known
+        fp.seek(base + header_offset + 14)
+        fp.write(struct.pack("<3L", crc, size, size))
+        fp.seek(data_start + size)
+        central.append((encoded, header_offset, crc, size))
+    central_start = fp.tell() - base
+    for encoded, header_offset, crc, size in central:
+        fp.write(
+            struct.pack(
+                zipfile.structCentralDir,
+                zipfile.stringCentralDir,
+                20, 0, 20, 0, 0, 0, 0, 0,
+                crc, size, size,
+                len(encoded), 0, 0, 0, 0, 0,
+                header_offset,
+            )  # fmt: skip
+        )
+        fp.write(encoded)
+    central_size = fp.tell() - base - central_start
+    fp.write(
+        struct.pack(
+            zipfile.structEndArchive,
+            zipfile.stringEndArchive,
+            0, 0, len(central), len(central),
+            central_size, central_start, 0,
+        )  # fmt: skip
+    )
+
+
+def write_hole(size: int):
+    """Writer for a sparse run of zeros. The CRC is never checked as the entry is never read."""
+
+    def write(fp) -> int:
+        fp.seek(size, io.SEEK_CUR)
+        return 0
+
+    return write
+
+
+def write_bytes(data: bytes):
+    def write(fp) -> int:
+        fp.write(data)
+        return zlib.crc32(data)
+
+    return write
+
+
+def make_package(architecture: str) -> bytes:
+    """Copy the test package with a different architecture in its manifest."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(TEST_PACKAGE) as package, zipfile.ZipFile(output, "w") as new_package:
+        for info in package.infolist():
+            data = package.read(info)
+            if info.filename == "AppxManifest.xml":
+                data = data.replace(b'ProcessorArchitecture="x64"', f'ProcessorArchitecture="{architecture}"'.encode())
+            new_package.writestr(info, data)
+    return output.getvalue()
+
+
+BUNDLE_MANIFEST = """<?xml version="1.0" encoding="UTF-8"?>
+<Bundle xmlns="http://schemas.microsoft.com/appx/2013/bundle" SchemaVersion="5.0">
+  <Identity Name="MyEmployees" Publisher="CN=Contoso" Version="9.0.0.0" />
+  <Packages>
+    <Package Type="application" Version="9.0.0.0" Architecture="x64" FileName="App_x64.msix" Offset="0" Size="1">
+      <Resources><Resource Language="en-us" /></Resources>
+    </Package>
+    <Package Type="application" Version="9.0.0.0" Architecture="arm64" FileName="App_arm64.msix" Offset="0" Size="1">
+      <Resources><Resource Language="en-us" /></Resources>
+    </Package>
+    <Package Type="resource" Version="9.0.0.0" ResourceId="split.scale-200" FileName="App_scale-200.msix" Offset="0"
+      Size="1">
+      <Resources><Resource Scale="200" /></Resources>
+    </Package>
+  </Packages>
+</Bundle>
+"""
+
+
+class TestBundle:
+    """Class to test bundle functions."""
+
+    def test_zip_entry_view(self):
+        """Test the view only exposes the requested window."""
+        source = io.BytesIO(b"0123456789")
+        view = bundle.ZipEntryView(source, 2, 5)
+        assert view.read() == b"23456"
+        view.seek(-2, io.SEEK_END)
+        assert view.read(10) == b"56"
+        view.seek(1)
+        assert view.read(2) == b"34"
+        assert view.tell() == 3
+
+    def test_deflated_inner_package(self, tmpdir):
+        """Test a compressed inner package is spooled and read."""
+        bundle_path = str(pathlib.Path(tmpdir) / "Deflated.msixbundle")
+        with zipfile.ZipFile(bundle_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.write(TEST_PACKAGE, "TestMsixPackage_x64.msix")
+        data = msix.get_msix_metadata(bundle_path)
+        assert data.package_name == "MyEmployees"
+        assert data.version == "9.0.0.0"
+
+    def test_sparse_multi_gb_bundle(self, tmpdir):
+        """Test a multi-GB stored bundle is read in place with flat memory use."""
+        bundle_path = pathlib.Path(tmpdir) / "Huge.msixbundle"
+        with zipfile.ZipFile(TEST_PACKAGE) as package:
+            inner_entries = [("Data/level.pak", write_hole(SPARSE_PAYLOAD_BYTES))]
+            inner_entries += [(info.filename, write_bytes(package.read(info))) for info in package.infolist()]
+
+        def write_inner_package(fp) -> int:
+            write_stored_zip(fp, inner_entries)
+            return 0
+
+        with open(bundle_path, "wb") as fp:
+            write_stored_zip(fp, [("Huge_x64.msix", write_inner_package)])
+        assert bundle_path.stat().st_size > SPARSE_PAYLOAD_BYTES
+
+        tracemalloc.start()
+        try:
+            data = msix.get_msix_metadata(str(bundle_path), output_icon_path=pathlib.Path(tmpdir))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert data.package_name == "MyEmployees"
+        assert data.icon_path is not None and data.icon_path.exists()
+        assert peak < 32 * 1024 * 1024
+
+    def test_bundle_manifest_selects_architecture(self, tmpdir):
+        """Test the bundle manifest is used to pick the package and fill the package table."""
+        bundle_path = str(pathlib.Path(tmpdir) / "App.msixbundle")
+        with zipfile.ZipFile(bundle_path, "w") as zf:
+            zf.writestr("App_scale-200.msix", b"")
+            zf.writestr("App_x64.msix", make_package("x64"))
+            zf.writestr("App_arm64.msix", make_package("arm64"))
+            zf.writestr(bundle.BUNDLE_MANIFEST_PATH, BUNDLE_MANIFEST)
+
+        data = msix.get_msix_metadata(bundle_path, architecture="arm64")
+        assert data.architecture == "arm64"
+        assert data.package_path == bundle_path
+        assert [package.architecture for package in data.bundle_packages] == ["x64", "arm64", "neutral"]
+        assert data.bundle_packages[0].metadata.architecture == "x64"
+        assert data.bundle_packages[2].metadata is None
+        assert data.bundle_packages[2].scales == [200]
+
+        assert msix.get_msix_metadata(bundle_path).architecture == "x64"
+
+    def test_select_package_falls_back_to_neutral(self):
+        """Test a neutral package is used if the requested architecture is missing."""
+        packages = [
+            bundle.BundlePackage("App_neutral.msix", "application", "1.0.0.0", "neutral", None, 0, 1),
+            bundle.BundlePackage("App_x86.msix", "application", "1.0.0.0", "x86", None, 0, 1),
+        ]
+        assert bundle.select_package(packages, "arm64").file_name == "App_neutral.msix"
+        assert bundle.select_package(packages, "x86").file_name == "App_x86.msix"
+        assert bundle.select_package(packages).file_name == "App_neutral.msix"
@@ -0,0 +1,64 @@
+import os
+import pathlib
+import shutil
+import extract_msix_data
+from msix_global_installer import cache
+
+TEST_PACKAGE = str(pathlib.Path("tests/TestMsixPackage.msix"))
+
+
+class TestCache:
+    """Class to test the extraction cache."""
+
+    def test_fingerprint_ignores_mtime(self, tmpdir):
+        """Test the fingerprint follows the content rather than the modification time."""
+        copy = pathlib.Path(tmpdir) / "copy.msix"
+        shutil.copyfile(TEST_PACKAGE, copy)
+        os.utime(copy, (0, 0))
+        assert cache.get_package_fingerprint(copy) == cache.get_package_fingerprint(TEST_PACKAGE)
+
+        with open(copy, "ab") as file:
+            file.write(b"\0")
+        assert cache.get_package_fingerprint(copy) != cache.get_package_fingerprint(TEST_PACKAGE)
+
+    def test_warm_run_uses_cache(self, tmpdir, monkeypatch):
+        """Test a second extraction is served from the cache, icons included."""
+        cache_dir = pathlib.Path(tmpdir) / "cache"
+        first_output = pathlib.Path(tmpdir) / "first"
+        second_output = pathlib.Path(tmpdir) / "second"
+        first_output.mkdir()
+        second_output.mkdir()
+        cold = extract_msix_data.get_metadata([TEST_PACKAGE], output_icon_path=first_output, cache_dir=cache_dir)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("Package was extracted again")
+
+        monkeypatch.setattr(extract_msix_data, "extract_package_uncached", fail)
+        warm = extract_msix_data.get_metadata([TEST_PACKAGE], output_icon_path=second_output, cache_dir=cache_dir)
+        assert warm[0].package_name == cold[0].package_name
+        assert warm[0].icon_path == second_output / cold[0].icon_path.name
+        assert warm[0].scaled_icon_path.read_bytes() == cold[0].scaled_icon_path.read_bytes()
+
+    def test_missing_icon_is_a_miss(self, tmpdir):
+        """Test an entry whose icon has gone is extracted again rather than raising."""
+        cache_dir = pathlib.Path(tmpdir) / "cache"
+        output = pathlib.Path(tmpdir) / "output"
+        output.mkdir()
+        cold = extract_msix_data.get_metadata([TEST_PACKAGE], output_icon_path=output, cache_dir=cache_dir)
+        extraction_cache = cache.ExtractionCache(cache_dir)
+        key = extraction_cache.make_key(TEST_PACKAGE, None, True)
+        (cache_dir / key / cold[0].icon_path.name).unlink()
+        assert extraction_cache.load(key, TEST_PACKAGE, output) is None
+        again = extract_msix_data.get_metadata([TEST_PACKAGE], output_icon_path=output, cache_dir=cache_dir)
+        assert again[0].icon_path.read_bytes() == cold[0].icon_path.read_bytes()
+
+    def test_evict_least_recently_used(self, tmpdir):
+        """Test the oldest entries are removed once the cache is too big."""
+        cache_dir = pathlib.Path(tmpdir)
+        for age, name in enumerate(["newest", "middle", "oldest"]):
+            entry = cache_dir / name
+            entry.mkdir()
+            (entry / "data").write_bytes(b"x" * 100)
+            os.utime(entry, (1000 - age, 1000 - age))
+        cache.ExtractionCache(cache_dir, max_bytes=250).evict()
+        assert sorted(path.name for path in cache_dir.iterdir()) == ["middle", "newest"]
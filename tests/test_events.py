@@ -0,0 +1,261 @@
+import asyncio
+import queue
+import threading
+import time
+import pytest
+from msix_global_installer import events
+
+
+class TestEvents:
+    """Class to test event handling."""
+
+    def test_worker_handles_events_and_shuts_down(self):
+        """Test the worker passes events to the handler in order and stops on shutdown."""
+        event_queue = queue.Queue()
+        handled = []
+
+        async def handler(event: events.Event) -> None:
+            handled.append(event)
+
+        first = events.Event(events.EventType.REQUEST_MSIX_METADATA)
+        second = events.Event(events.EventType.INSTALL_MSIX, data={"global": False})
+        events.post_event_sync(first, event_queue)
+        events.post_event_sync(second, event_queue)
+        events.post_shutdown(event_queue)
+        asyncio.run(asyncio.wait_for(events.run_worker_async(event_queue, handler), timeout=5))
+        assert handled == [first, second]
+
+    def test_idle_worker_uses_no_cpu(self):
+        """Test an idle worker sleeps rather than spinning."""
+        event_queue = queue.Queue()
+
+        async def main() -> float:
+            worker = asyncio.create_task(events.run_worker_async(event_queue, idle_timeout_s=0.05))
+            try:
+                cpu_start = time.process_time()
+                await asyncio.sleep(0.5)
+                return time.process_time() - cpu_start
+            finally:
+                events.post_shutdown(event_queue)
+                await asyncio.wait_for(worker, timeout=5)
+
+        assert asyncio.run(main()) < 0.05
+
+    def test_receive_event_blocking_timeout(self):
+        """Test a blocking receive gives up after the timeout."""
+        event_queue = queue.Queue()
+        start = time.monotonic()
+        assert events.receive_event_blocking(event_queue, timeout_s=0.05) is None
+        assert time.monotonic() - start >= 0.05
+
+    def test_coalesce_progress_events(self):
+        """Test runs of progress events merge into one, keeping the last values and event order."""
+        progress = events.EventType.INSTALL_PROGRESS_TEXT
+        pending = [
+            events.Event(progress, data={"title": "Installing A", "progress": 10}),
+            events.Event(progress, data={"subtitle": "Step 2", "progress": 20}),
+            events.Event(events.EventType.MSIX_METADATA_RECEIVED, data={}),
+            events.Event(progress, data={"progress": 30}),
+            events.Event(progress, data={"title": "Installing B", "progress": 40}),
+        ]
+        assert events.coalesce_progress_events(pending) == [
+            events.Event(progress, data={"title": "Installing A", "subtitle": "Step 2", "progress": 20}),
+            events.Event(events.EventType.MSIX_METADATA_RECEIVED, data={}),
+            events.Event(progress, data={"title": "Installing B", "progress": 40}),
+        ]
+
+    def test_pump_keeps_up_with_1khz_progress(self):
+        """Test the GUI pump keeps queue lag low under a 1 kHz stream of progress events."""
+        event_queue = queue.Queue()
+        tick_s = 0.02
+        total_events = 500
+
+        class StubInstallScreen:
+            """Stands in for InstallScreen, with a fixed cost per widget update."""
+
+            def __init__(self):
+                self.calls = 0
+                self.progress = None
+                self.lags = []
+
+            def handle_event(self, event):
+                time.sleep(0.0005)
+                self.calls += 1
+                self.progress = event.data["progress"]
+                self.lags.append(time.perf_counter() - event.data["posted"])
+
+        def produce():
+            for i in range(1, total_events + 1):
+                data = {"progress": i, "posted": time.perf_counter()}
+                events.post_event_sync(events.Event(events.EventType.INSTALL_PROGRESS_TEXT, data=data), event_queue)
+                time.sleep(0.001)
+
+        frame = StubInstallScreen()
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while producer.is_alive() or not event_queue.empty():
+            events.pump_events(event_queue, frame.handle_event)
+            time.sleep(tick_s)
+        producer.join()
+
+        assert frame.progress == total_events
+        assert frame.calls < total_events / 5
+        assert max(frame.lags) < 0.25
+
+    def test_async_worker_handles_events_at_the_same_time(self):
+        """Test a request is handled while an earlier one is still running and running ones stop on shutdown."""
+        event_queue = queue.Queue()
+        handled = []
+        cancelled = []
+
+        async def handler(event: events.Event) -> None:
+            handled.append(event.name)
+            if event.name == events.EventType.INSTALL_MSIX:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(event.name)
+                    raise
+            else:
+                events.post_shutdown(event_queue)
+
+        events.post_event_sync(events.Event(events.EventType.INSTALL_MSIX, data={"global": False}), event_queue)
+        events.post_event_sync(events.Event(events.EventType.REQUEST_MSIX_METADATA), event_queue)
+        start = time.monotonic()
+        asyncio.run(events.run_worker_async(event_queue, handler))
+        assert time.monotonic() - start < 5
+        assert handled == [events.EventType.INSTALL_MSIX, events.EventType.REQUEST_MSIX_METADATA]
+        assert cancelled == [events.EventType.INSTALL_MSIX]
+
+
+class TestEventBus:
+    """Class to test the event bus."""
+
+    def test_dispatch_by_topic(self):
+        """Test events only go to the handlers subscribed to their type."""
+        bus = events.EventBus("test")
+        metadata, progress = [], []
+        bus.subscribe(events.EventType.MSIX_METADATA_RECEIVED, metadata.append)
+        bus.subscribe(events.EventType.INSTALL_PROGRESS_TEXT, progress.append)
+        bus.put(events.Event(events.EventType.INSTALL_PROGRESS_TEXT, data={"progress": 10}))
+        bus.put(events.Event(events.EventType.MSIX_METADATA_RECEIVED))
+        bus.put(events.Event(events.EventType.INSTALL_FINISHED))
+        assert events.pump_events(bus) == 3
+        assert [event.name for event in metadata] == [events.EventType.MSIX_METADATA_RECEIVED]
+        assert [event.data for event in progress] == [{"progress": 10}]
+        assert bus.join(timeout=0)
+
+    def test_unknown_event_type(self):
+        """Test an event can only be made for a known type."""
+        with pytest.raises(ValueError):
+            events.Event("install-everything")
+        assert events.Event("install-msix").name is events.EventType.INSTALL_MSIX
+
+    def test_block_applies_backpressure(self):
+        """Test posting to a full bus waits for the receiver to make room."""
+        bus = events.EventBus("test", maxsize=1)
+        first = events.Event(events.EventType.INSTALL_MSIX)
+        second = events.Event(events.EventType.CANCEL_INSTALL)
+        bus.put(first)
+        with pytest.raises(queue.Full):
+            bus.put(second, timeout=0.05)
+        poster = threading.Thread(target=bus.put, args=(second,))
+        poster.start()
+        time.sleep(0.05)
+        assert poster.is_alive()
+        assert bus.get() == first
+        poster.join(timeout=5)
+        assert events.drain_events(bus) == [second]
+
+    @pytest.mark.parametrize(
+        "policy, expected",
+        [
+            (events.DropPolicy.DROP_NEWEST, [{"progress": 10}, None, {"title": "Installing B", "progress": 20}]),
+            (events.DropPolicy.DROP_OLDEST, [None, {"title": "Installing B", "progress": 20}, {"progress": 30}]),
+            (events.DropPolicy.MERGE, [{"progress": 10}, None, {"title": "Installing B", "progress": 30}]),
+        ],
+    )
+    def test_overflow_policies(self, policy, expected):
+        """Test a full bus drops or merges events of the same type and keeps other events."""
+        progress = events.EventType.INSTALL_PROGRESS_TEXT
+        bus = events.EventBus("test", maxsize=3, topic_policies={progress: policy})
+        bus.put(events.Event(progress, data={"progress": 10}))
+        bus.put(events.Event(events.EventType.INSTALL_FINISHED))
+        bus.put(events.Event(progress, data={"title": "Installing B", "progress": 20}))
+        bus.put(events.Event(progress, data={"progress": 30}))
+        drained = events.drain_events(bus)
+        assert [event.data if event.name == progress else None for event in drained] == expected
+        assert (bus.dropped, bus.merged) == ((0, 1) if policy == events.DropPolicy.MERGE else (1, 0))
+        for _ in drained:
+            bus.task_done()
+        assert bus.join(timeout=0)
+
+    def test_join_waits_for_handling(self):
+        """Test flushing the bus blocks until every event has been handled, without spinning."""
+        bus = events.EventBus("test")
+
+        async def install(event: events.Event) -> None:
+            await asyncio.sleep(0.2)
+
+        bus.subscribe(events.EventType.INSTALL_MSIX, install)
+        bus.put(events.Event(events.EventType.INSTALL_MSIX))
+        assert not bus.join(timeout=0.05)
+
+        async def main() -> float:
+            worker = asyncio.create_task(events.run_worker_async(bus))
+            cpu_start = time.process_time()
+            await events.wait_for_queue(5, bus)
+            cpu_used = time.process_time() - cpu_start
+            events.post_shutdown(bus)
+            await asyncio.wait_for(worker, timeout=5)
+            return cpu_used
+
+        assert asyncio.run(main()) < 0.1
+        assert bus.join(timeout=0)
+
+    def test_async_worker_runs_each_subscriber(self):
+        """Test the async worker starts a task for each subscriber and the event is done once they all are."""
+        bus = events.EventBus("test")
+        handled = []
+
+        async def install(event: events.Event) -> None:
+            await asyncio.sleep(0.05)
+            handled.append("install")
+
+        async def log(event: events.Event) -> None:
+            handled.append("log")
+
+        async def main() -> None:
+            worker = asyncio.create_task(events.run_worker_async(bus))
+            await events.post_event(events.Event(events.EventType.INSTALL_MSIX), bus)
+            await events.wait_for_queue(5, bus)
+            events.post_shutdown(bus)
+            await worker
+
+        bus.subscribe(events.EventType.INSTALL_MSIX, install)
+        bus.subscribe(events.EventType.INSTALL_MSIX, log)
+        asyncio.run(main())
+        assert handled == ["log", "install"]
+
+    def test_event_handler_table(self):
+        """Test an EventHandler passes each event to the method marked for its type."""
+
+        class Screen(events.EventHandler):
+            def __init__(self):
+                self.shown = []
+
+            @events.handles(events.EventType.INSTALL_PROGRESS_TEXT, events.EventType.INSTALL_FINISHED)
+            def show(self, event):
+                self.shown.append(event.name)
+
+        class CancellableScreen(Screen):
+            @events.handles(events.EventType.CANCEL_INSTALL)
+            def cancel(self, event):
+                self.shown.append("cancelled")
+
+        screen = CancellableScreen()
+        for event_type in (events.EventType.INSTALL_FINISHED, events.EventType.MSIX_METADATA_RECEIVED):
+            screen.handle_event(events.Event(event_type))
+        screen.handle_event(events.Event(events.EventType.CANCEL_INSTALL))
+        assert screen.shown == [events.EventType.INSTALL_FINISHED, "cancelled"]
+        assert events.EventType.CANCEL_INSTALL not in Screen.event_table
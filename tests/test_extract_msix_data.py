@@ -0,0 +1,40 @@
+from PIL import Image
+from msix_global_installer import image
+import base64
+import io
+import pathlib
+import pytest
+import extract_msix_data
+
+TEST_PACKAGE = str(pathlib.Path("tests/TestMsixPackage.msix"))
+
+
+class TestExtractMsixData:
+    """Class to test the data extraction script."""
+
+    @pytest.mark.parametrize("jobs", [1, 3])
+    def test_get_metadata_keeps_order(self, tmpdir, jobs):
+        """Test results come back in argument order and only the first package gets an icon."""
+        paths = [TEST_PACKAGE] * 4
+        data = extract_msix_data.get_metadata(paths, output_icon_path=pathlib.Path(tmpdir), jobs=jobs)
+        assert [metadata.package_path for metadata in data] == paths
+        assert data[0].icon_path is not None
+        assert data[0].scaled_icon_path.exists()
+        assert all(metadata.icon_path is None for metadata in data[1:])
+
+    @pytest.mark.parametrize("jobs", [1, 3])
+    def test_get_metadata_collects_errors(self, tmpdir, jobs):
+        """Test every failing package is reported rather than just the first."""
+        missing = [str(pathlib.Path(tmpdir) / "missing_1.msix"), str(pathlib.Path(tmpdir) / "missing_2.msix")]
+        with pytest.raises(extract_msix_data.ExtractionError) as error:
+            extract_msix_data.get_metadata([TEST_PACKAGE, missing[0], TEST_PACKAGE, missing[1]], jobs=jobs)
+        assert [path for path, _ in error.value.errors] == missing
+
+    def test_icons_rendered_for_tk(self, tmpdir):
+        """Test the main package's icons are rendered as PNG data at the sizes the window shows them."""
+        [data] = extract_msix_data.get_metadata([TEST_PACKAGE], output_icon_path=pathlib.Path(tmpdir))
+        icons = [Image.open(io.BytesIO(base64.b64decode(icon))) for icon in data.window_icons + [data.panel_icon]]
+        assert all(icon.format == "PNG" for icon in icons)
+        sizes = [(size, size) for size in image.WINDOW_ICON_SIZES + (image.PANEL_ICON_SIZE,)]
+        assert [icon.size for icon in icons] == sizes
+        assert Image.open(data.exe_icon_path).format == "ICO"
@@ -0,0 +1,59 @@
+from PIL import Image
+from msix_global_installer import image
+import io
+import pathlib
+import pytest
+
+
+def make_logo(path: pathlib.Path, size: int, colour=(0, 120, 215)) -> pathlib.Path:
+    logo = Image.new("RGB", (size, size), colour)
+    logo.paste((255, 255, 255), (size // 4, size // 4, size * 3 // 4, size * 3 // 4))
+    logo.save(path)
+    return path
+
+
+class TestImage:
+    """Class to test rendering the installer's icons."""
+
+    def test_render_icons(self, tmp_path):
+        """Test every size is rendered and the .ico holds the icon sizes Windows uses."""
+        icons = image.render_icons(make_logo(tmp_path / "logo.png", 1024))
+        assert [Image.open(io.BytesIO(icons.pngs[size])).size for size in image.ICON_SIZES] == [
+            (size, size) for size in image.ICON_SIZES
+        ]
+        ico = Image.open(io.BytesIO(icons.ico))
+        assert ico.format == "ICO"
+        assert sorted(ico.info["sizes"]) == [(size, size) for size in image.ICO_SIZES]
+
+    @pytest.mark.parametrize("name", ["logo.png", "logo.jpg"])
+    def test_large_source_reduced(self, tmp_path, name):
+        """Test a large source is decoded at no more than about twice the size the largest icon needs."""
+        source = image.load_source(make_logo(tmp_path / name, 3840), 256)
+        target = 256 * image.REDUCING_GAP
+        assert source.mode == "RGBA"
+        assert target <= source.size[0] < target * 2
+
+    def test_cached_by_source(self, tmp_path, monkeypatch):
+        """Test a source is only rendered again once its content changes."""
+        renders = []
+        render_icons = image.render_icons
+        monkeypatch.setattr(image, "render_icons", lambda *args: renders.append(args) or render_icons(*args))
+        cache_dir = tmp_path / "cache"
+        logo = make_logo(tmp_path / "logo.png", 300)
+        first = image.render_icons_cached(logo, cache_dir)
+        assert image.render_icons_cached(logo, cache_dir) == first
+        assert len(renders) == 1
+
+        make_logo(logo, 300, colour=(200, 0, 0))
+        assert image.render_icons_cached(logo, cache_dir) != first
+        assert len(renders) == 2
+
+    def test_rebuild_ignores_cache(self, tmp_path):
+        """Test rebuild renders the icons again and replaces the cached ones."""
+        cache_dir = tmp_path / "cache"
+        logo = make_logo(tmp_path / "logo.png", 300)
+        first = image.render_icons_cached(logo, cache_dir)
+        entry_path = cache_dir / f"icons-{image.get_source_hash(logo)}"
+        (entry_path / image.ICO_FILE_NAME).write_bytes(b"stale")
+        assert image.render_icons_cached(logo, cache_dir, rebuild=True) == first
+        assert (entry_path / image.ICO_FILE_NAME).read_bytes() == first.ico
@@ -0,0 +1,90 @@
+import asyncio
+import pathlib
+import sys
+import pytest
+from msix_global_installer import inventory, session
+from msix_global_installer.metadata import MsixMetadata
+
+FAKE_SHELL = pathlib.Path(__file__).parent / "fake_powershell.py"
+
+INVENTORY_JSON = (
+    '[{"Name":"Microsoft.VCLibs.140.00","Version":"14.0.33519.0","Architecture":9},'
+    '{"Name":"Microsoft.UI.Xaml.2.8","Version":"8.2310.30001.0","Architecture":11}]'
+)
+
+
+def make_dependency(name: str, version: str, architecture: str | None = "x64") -> MsixMetadata:
+    return MsixMetadata(f"{name}.appx", name, version, "Microsoft", architecture=architecture, identity_name=name)
+
+
+class TestInventory:
+    """Class to test skipping dependencies that are already installed."""
+
+    def test_parse_inventory(self):
+        """Test a list, a single package and provisioned packages are read with architecture names."""
+        assert inventory.parse_inventory(INVENTORY_JSON) == [
+            inventory.InstalledPackage("Microsoft.VCLibs.140.00", "14.0.33519.0", "x64"),
+            inventory.InstalledPackage("Microsoft.UI.Xaml.2.8", "8.2310.30001.0", "neutral"),
+        ]
+        provisioned = '{"DisplayName":"Contoso.App","Version":"1.0.0.0","Architecture":12}'
+        assert inventory.parse_inventory(provisioned) == [inventory.InstalledPackage("Contoso.App", "1.0.0.0", "arm64")]
+        assert inventory.parse_inventory("") == []
+
+    def test_skip_installed_dependencies(self):
+        """Test only dependencies installed at the same or a newer version for the same architecture are dropped."""
+        main = make_dependency("Contoso.App", "1.0.0.0")
+        older_installed = make_dependency("Microsoft.VCLibs.140.00", "14.0.30035.0")
+        newer_than_installed = make_dependency("Microsoft.UI.Xaml.2.8", "8.2400.0.0", "neutral")
+        other_architecture = make_dependency("Microsoft.VCLibs.140.00", "14.0.30035.0", "arm64")
+        legacy = make_dependency("Microsoft.VCLibs.140.00", "14.0.30035.0")
+        legacy.identity_name = None
+        metadata_list = [main, older_installed, newer_than_installed, other_architecture, legacy]
+        installed = inventory.parse_inventory(INVENTORY_JSON)
+        needed = inventory.skip_installed_dependencies(metadata_list, installed)
+        assert needed == [main, newer_than_installed, other_architecture, legacy]
+
+    def test_plan_install_installs_everything_if_listing_fails(self):
+        """Test every package is kept if the installed packages can't be listed."""
+        metadata_list = [make_dependency("Contoso.App", "1.0.0.0"), make_dependency("Microsoft.VCLibs.140.00", "1.0")]
+
+        async def failing_source() -> list[inventory.InstalledPackage]:
+            raise RuntimeError("Failed to list the installed packages")
+
+        async def installed_source() -> list[inventory.InstalledPackage]:
+            return inventory.parse_inventory(INVENTORY_JSON)
+
+        assert asyncio.run(inventory.plan_install_async(metadata_list, failing_source)) == metadata_list
+        assert asyncio.run(inventory.plan_install_async(metadata_list, installed_source)) == [metadata_list[0]]
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="The fake shell needs a POSIX pseudo terminal")
+    def test_query_installed_packages(self):
+        """Test the installed packages are listed with one command in the session."""
+        process = session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)])
+
+        async def main():
+            async with session.AsyncPowerShellSession(spawn=lambda: process) as shell_session:
+                return await inventory.query_installed_packages_async(shell_session), shell_session.starts
+
+        try:
+            installed, starts = asyncio.run(main())
+        finally:
+            process.close()
+        assert installed == inventory.parse_inventory(INVENTORY_JSON)
+        assert starts == 1
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="The fake shell needs a POSIX pseudo terminal")
+    def test_plan_install_async(self):
+        """Test installed dependencies are skipped with the packages listed on the event loop."""
+        metadata_list = [make_dependency("Contoso.App", "1.0.0.0"), make_dependency("Microsoft.VCLibs.140.00", "1.0")]
+        process = session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)])
+
+        async def main():
+            async with session.AsyncPowerShellSession(spawn=lambda: process) as shell_session:
+                return await inventory.plan_install_async(
+                    metadata_list, lambda: inventory.query_installed_packages_async(shell_session)
+                )
+
+        try:
+            assert asyncio.run(main()) == [metadata_list[0]]
+        finally:
+            process.close()
@@ -0,0 +1,99 @@
+import asyncio
+import pathlib
+import sys
+import pytest
+from msix_global_installer import journal, msix, session
+from msix_global_installer.metadata import MsixMetadata
+
+FAKE_SHELL = pathlib.Path(__file__).parent / "fake_powershell.py"
+
+
+def make_package(name: str, version: str = "1.0.0.0") -> MsixMetadata:
+    return MsixMetadata(f"{name}.msix", name, version, "Contoso", identity_name=name)
+
+
+PAYLOAD = [make_package("App"), make_package("VCLibs"), make_package("Runtime"), make_package("Fonts")]
+
+
+class TestJournal:
+    """Class to test resuming an install from the packages already installed."""
+
+    def test_resume_skips_installed_packages(self, tmp_path):
+        """Test a reloaded journal skips what was installed, keeping the main package and the order."""
+        path = tmp_path / "journal.json"
+        first = journal.InstallJournal.load(PAYLOAD, path=path)
+        assert first.remaining(PAYLOAD) == PAYLOAD
+        first.record(PAYLOAD[1])
+        first.record(PAYLOAD[3])
+        resumed = journal.InstallJournal.load(PAYLOAD, path=path)
+        assert resumed.remaining(PAYLOAD) == [PAYLOAD[0], PAYLOAD[2]]
+
+    def test_main_package_is_always_installed(self, tmp_path):
+        """Test the main package is kept even if it was recorded."""
+        install_journal = journal.InstallJournal.load(PAYLOAD, path=tmp_path / "journal.json")
+        install_journal.record(PAYLOAD[0])
+        assert install_journal.remaining(PAYLOAD) == PAYLOAD
+
+    @pytest.mark.parametrize(
+        "payload, global_install",
+        [
+            ([PAYLOAD[0], make_package("VCLibs", "2.0.0.0"), *PAYLOAD[2:]], False),
+            (PAYLOAD[:3], False),
+            (PAYLOAD, True),
+        ],
+    )
+    def test_changed_payload_is_ignored(self, tmp_path, payload, global_install):
+        """Test a journal from another version of a package, another payload or install scope isn't used."""
+        path = tmp_path / "journal.json"
+        journal.InstallJournal.load(PAYLOAD, path=path).record(PAYLOAD[2])
+        assert journal.InstallJournal.load(payload, global_install, path=path).completed == set()
+
+    def test_clear(self, tmp_path):
+        """Test the journal is removed once the install has succeeded."""
+        path = tmp_path / "journal.json"
+        install_journal = journal.InstallJournal.load(PAYLOAD, path=path)
+        install_journal.record(PAYLOAD[1])
+        install_journal.clear()
+        assert not path.exists()
+        assert journal.InstallJournal.load(PAYLOAD, path=path).remaining(PAYLOAD) == PAYLOAD
+
+    @pytest.mark.parametrize("text", ["{not json", "[]", '{"payload": 1}'])
+    def test_unreadable_journal_is_ignored(self, tmp_path, text):
+        """Test a damaged journal is treated as empty."""
+        path = tmp_path / "journal.json"
+        path.write_text(text, encoding="utf-8")
+        assert journal.InstallJournal.load(PAYLOAD, path=path).completed == set()
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="The fake shell needs a POSIX pseudo terminal")
+    def test_retry_resumes(self, tmp_path):
+        """Test a retry after a failed dependency only installs what didn't succeed."""
+        payload = [make_package("App"), make_package("VCLibs"), make_package("Missing")]
+        path = tmp_path / "journal.json"
+        commands = []
+
+        async def attempt() -> bool:
+            install_journal = journal.InstallJournal.load(payload, path=path)
+            async with session.AsyncPowerShellSession(
+                spawn=lambda: session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)])
+            ) as shell_session:
+                run = shell_session.run
+
+                def recording_run(command: str, nonce: str):
+                    commands.append(command)
+                    return run(command, nonce)
+
+                shell_session.run = recording_run
+                return await msix.install_packages_async(
+                    install_journal.remaining(payload),
+                    shell_session,
+                    together=False,
+                    max_concurrent=1,
+                    on_installed=install_journal.record,
+                )
+
+        assert not asyncio.run(attempt())
+        assert [command for command in commands if "VCLibs" in command]
+        commands.clear()
+        assert not asyncio.run(attempt())
+        assert [command for command in commands if "VCLibs" in command] == []
+        assert [command for command in commands if "Missing" in command]
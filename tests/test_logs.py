@@ -0,0 +1,76 @@
+import logging
+import threading
+import pytest
+from msix_global_installer import logs, msix
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    transcript_logger = logging.getLogger(logs.TRANSCRIPT_LOGGER_NAME)
+    levels = root.level, transcript_logger.level
+    yield
+    logs.stop_logging()
+    root.setLevel(levels[0])
+    transcript_logger.setLevel(levels[1])
+
+
+class TestLogs:
+    """Class to test writing the log in the background."""
+
+    def test_written_by_listener(self, tmp_path, restore_logging):
+        """Test records are written to the log by the listener's thread, below the level dropped."""
+        log_path = tmp_path / "logs" / "installer.log"
+        listener = logs.configure_logging(log_path, level="INFO")
+        writers = []
+
+        def record_writer(record: logging.LogRecord) -> bool:
+            writers.append(threading.current_thread())
+            return True
+
+        listener.handlers[0].addFilter(record_writer)
+        logger = logging.getLogger("msix_global_installer.test")
+        logger.info("Installing %s", "App")
+        logger.debug("Not written")
+        logs.stop_logging()
+        text = log_path.read_text(encoding="utf-8")
+        assert "msix_global_installer.test INFO Installing App" in text
+        assert "Not written" not in text
+        assert writers and threading.current_thread() not in writers
+
+    def test_exception_is_formatted(self, tmp_path, restore_logging):
+        """Test a logged exception keeps its traceback."""
+        log_path = tmp_path / "installer.log"
+        logs.configure_logging(log_path)
+        try:
+            raise RuntimeError("Certificate error")
+        except RuntimeError:
+            logging.getLogger("msix_global_installer.test").exception("Install failed")
+        logs.stop_logging()
+        text = log_path.read_text(encoding="utf-8")
+        assert "Install failed" in text
+        assert "RuntimeError: Certificate error" in text
+
+    def test_rotation(self, tmp_path, restore_logging):
+        """Test the log is rotated at its size limit, keeping only the given number of old logs."""
+        log_path = tmp_path / "installer.log"
+        logs.configure_logging(log_path, max_bytes=2000, backup_count=2)
+        for number in range(200):
+            logging.getLogger("msix_global_installer.test").warning("Line %s", number)
+        logs.stop_logging()
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "installer.log",
+            "installer.log.1",
+            "installer.log.2",
+        ]
+        assert all(path.stat().st_size <= 2000 for path in tmp_path.iterdir())
+
+    @pytest.mark.parametrize("transcript", [False, True])
+    def test_pty_transcript_opt_in(self, tmp_path, restore_logging, transcript):
+        """Test the shell's output is only logged when the transcript is turned on, even at DEBUG."""
+        log_path = tmp_path / "installer.log"
+        logs.configure_logging(log_path, level="DEBUG", transcript=transcript)
+        parser = msix.PtyOutputParser(is_dependency=False, nonce="abc")
+        list(parser.parse_all(["    Deployment operation progress: App.msix\r\n"]))
+        logs.stop_logging()
+        assert ("Deployment operation progress" in log_path.read_text(encoding="utf-8")) == transcript
@@ -0,0 +1,52 @@
+import io
+import pathlib
+import zipfile
+from msix_global_installer import manifest
+
+TEST_PACKAGE = pathlib.Path("tests/TestMsixPackage.msix")
+
+MANIFEST_WITH_DEPENDENCIES = b"""<?xml version="1.0" encoding="utf-8"?>
+<Package xmlns="http://schemas.microsoft.com/appx/manifest/foundation/windows10"
+  xmlns:uap="http://schemas.microsoft.com/appx/manifest/uap/windows10"
+  xmlns:uap10="http://schemas.microsoft.com/appx/manifest/uap/windows10/10">
+  <Identity Name="Contoso.App" Publisher="CN=Contoso, O=Contoso Corporation" Version="1.2.3.0" />
+  <Properties>
+    <DisplayName>Contoso App</DisplayName>
+    <Logo>Assets\\StoreLogo.png</Logo>
+    <uap10:PackageIntegrity><uap10:Content Enforcement="on" /></uap10:PackageIntegrity>
+  </Properties>
+  <Dependencies>
+    <TargetDeviceFamily Name="Windows.Desktop" MinVersion="10.0.17763.0" MaxVersionTested="10.0.22621.0" />
+    <PackageDependency Name="Microsoft.VCLibs.140.00" MinVersion="14.0.30704.0"
+      Publisher="CN=Microsoft Corporation, O=Microsoft Corporation, L=Redmond, S=Washington, C=US" />
+    <PackageDependency Name="Microsoft.WindowsAppRuntime.1.4" MinVersion="4000.1010.1349.0"
+      Publisher="CN=Microsoft Corporation, O=Microsoft Corporation, L=Redmond, S=Washington, C=US" />
+  </Dependencies>
+  <Capabilities>
+    <this is not valid xml
+"""
+
+
+class TestManifest:
+    """Class to test manifest functions."""
+
+    def test_parse_test_package_manifest(self):
+        """Test the manifest of the test package is read."""
+        with zipfile.ZipFile(TEST_PACKAGE) as package, package.open("AppxManifest.xml") as manifest_file:
+            data = manifest.parse_manifest(manifest_file)
+        assert data.display_name == "MyEmployees"
+        assert data.logo == "Assets\\StoreLogo.png"
+        assert data.identity["Version"] == "9.0.0.0"
+        assert data.identity["ProcessorArchitecture"] == "x64"
+        assert data.dependencies == []
+
+    def test_parse_stops_after_dependencies(self):
+        """Test dependencies are read and nothing after them is parsed."""
+        data = manifest.parse_manifest(io.BytesIO(MANIFEST_WITH_DEPENDENCIES))
+        assert data.display_name == "Contoso App"
+        assert data.identity["Name"] == "Contoso.App"
+        assert [dependency.name for dependency in data.dependencies] == [
+            "Microsoft.VCLibs.140.00",
+            "Microsoft.WindowsAppRuntime.1.4",
+        ]
+        assert data.dependencies[0].min_version == "14.0.30704.0"
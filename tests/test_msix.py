@@ -1,6 +1,8 @@
+import asyncio
 import math
 import pathlib
-from msix_global_installer import msix
+import queue
+from msix_global_installer import events, msix, session
 
 
 class TestMsix:
@@ -15,14 +17,116 @@ class TestMsix:
         assert data.version == "9.0.0.0"
         assert data.publisher == "Contoso Corporation"
         assert data.package_path == path
+        assert data.identity_name == "MyEmployees"
 
     def test_count_percentage(self):
         """Test we can count the progress."""
-        test_start = r"    [                                                                    ]      \r\n"
-        test_progress1 = r"    [oooo                                                                ]      \r\n"
-        test_progress2 = r"    [ooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooo   ]      \r\n"
-        test_complete = r"    [oooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooo]      \r\n"
-        assert msix.count_progress(test_start, 68) == 0.0
-        assert msix.count_progress(test_progress1, 68) == math.ceil(4 / 68 * 100)
-        assert msix.count_progress(test_progress2, 68) == 96
-        assert msix.count_progress(test_complete, 68) == 100.0
+        test_start = "    [                                                                    ]      \r\n"
+        test_progress1 = "    [oooo                                                                ]      \r\n"
+        test_progress2 = "    [ooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooo   ]      \r\n"
+        test_complete = "    [oooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooooo]      \r\n"
+        parser = msix.PtyOutputParser(is_dependency=False)
+        # An empty bar isn't progress
+        assert parser.feed(test_start) == []
+        assert parser.feed(test_progress1) == [msix.ProgressResult(math.ceil(4 / 68 * 100))]
+        assert parser.feed(test_progress2) == [msix.ProgressResult(96)]
+        assert parser.feed(test_complete) == [msix.ProgressResult(100)]
+
+    def test_progress_emitter_drops_repeats(self):
+        """Test repeated progress is suppressed and the final value is always posted."""
+        event_queue = queue.Queue()
+        now = [0.0]
+        emitter = msix.ProgressEmitter(event_queue=event_queue, min_interval_s=1, clock=lambda: now[0])
+        for _ in range(1000):
+            msix.process_result(msix.ProgressResult(4), None, "App", emitter=emitter)
+        # Changed but too soon after the last post, so held back
+        msix.process_result(msix.ProgressResult(50), None, "App", emitter=emitter)
+        posted = events.drain_events(event_queue)
+        assert [event.data for event in posted] == [{"title": "Installing App", "progress": 4}]
+
+        now[0] = 2.0
+        msix.process_result(msix.ProgressResult(60), None, "App", emitter=emitter)
+        msix.process_result(msix.ProgressResult(70), None, "App", emitter=emitter)
+        emitter.emit({"progress": 100}, immediate=True)
+        assert [event.data["progress"] for event in events.drain_events(event_queue)] == [60, 100]
+        assert (emitter.emitted, emitter.suppressed) == (3, 1001)
+
+    def test_progress_emitter_posts_held_back_update(self):
+        """Test an update held back on the event loop is posted once the interval is up, without more output."""
+        event_queue = queue.Queue()
+        emitter = msix.ProgressEmitter(event_queue=event_queue, min_interval_s=0.01, clock=lambda: 0.0)
+
+        async def main():
+            emitter.emit({"progress": 40})
+            emitter.emit({"progress": 45})
+            assert [event.data for event in events.drain_events(event_queue)] == [{"progress": 40}]
+            await asyncio.sleep(0.1)
+
+        asyncio.run(main())
+        assert [event.data for event in events.drain_events(event_queue)] == [{"progress": 45}]
+
+    def test_progress_emitter_posts_errors_immediately(self):
+        """Test an error is posted straight away, even right after progress."""
+        event_queue = queue.Queue()
+        emitter = msix.ProgressEmitter(event_queue=event_queue, min_interval_s=60)
+        msix.process_result(msix.ProgressResult(10), None, "App", emitter=emitter)
+        error = msix.ErrorResult(RuntimeError("Certificate error"))
+        assert msix.process_result(error, None, "App", emitter=emitter) == (False, None)
+        posted = events.drain_events(event_queue)
+        assert posted[-1].data == {"title": "Failed to install App", "subtitle": "Certificate error", "progress": 100}
+
+    def test_output_parser_joins_split_lines(self):
+        """Test lines split across reads are parsed once complete."""
+        parser = msix.PtyOutputParser(is_dependency=False)
+        assert parser.feed("    [oooo      ") == []
+        assert parser.feed("      ]   \r") == [msix.ProgressResult(progress=math.ceil(4 / 16 * 100))]
+        assert parser.feed("INSTALL_COMP") == []
+        assert parser.feed("LETE_0f=1") == []
+        assert parser.close() == []
+        parser.feed("INSTALL_COMPLETE_0f=1,")
+        assert parser.feed("0\r\n") == [msix.ReturnCodeResult(True, 0)]
+        assert parser.lines_parsed == 3
+
+    def test_output_parser_strips_control_sequences(self):
+        """Test colours and cursor movement don't hide progress or the return code."""
+        parser = msix.PtyOutputParser(is_dependency=False)
+        output = "\x1b[?25l\x1b[33m[oo  ]\x1b[0m\x1b[1;1H\r\x1b]0;PowerShell\x07INSTALL_COMPLETE_0f=\x1b[92m0,1\x1b[m\n"
+        assert parser.feed(output) == [msix.ProgressResult(progress=50), msix.ReturnCodeResult(False, 1)]
+
+    def test_output_parser_rejects_command_echo(self):
+        """Test the echoed command and other installs' completion lines aren't taken as the return code."""
+        nonce = msix.make_nonce()
+        echo = "PS C:\\> Add-AppxPackage App.msix" + session.build_completion_command(nonce)
+        parser = msix.PtyOutputParser(is_dependency=False, nonce=nonce)
+        assert parser.feed(echo + "\n") == []
+        assert parser.feed(f"INSTALL_COMPLETE_{msix.make_nonce()}=1,0\n") == []
+        assert parser.feed(f"INSTALL_COMPLETE_{nonce}=0,-1\n") == [msix.ReturnCodeResult(False, -1)]
+
+    def test_echo_filter(self):
+        """Test the echoed command isn't output, even wrapped across reads, and anything after it is."""
+        echo = "PS C:\\> Add-AppxPackage App.msix" + session.build_completion_command(msix.make_nonce())
+        echo_filter = msix.EchoFilter()
+        assert not echo_filter.has_output(echo[:-4])
+        assert not echo_filter.has_output("\r\n" + echo[-4:-2] + "\r\n")
+        assert not echo_filter.has_output(echo[-2:] + "\r\n\x1b[0m")
+        assert echo_filter.has_output("    [                    ]    \r")
+
+    def test_output_parser_looks_up_hresult(self):
+        """Test errors are matched by HRESULT whatever its case."""
+        line = "Add-AppxPackage : Deployment failed with HRESULT: 0x80073d06, The package could not be installed\n"
+        error = msix.PtyOutputParser(is_dependency=False).feed(line)[0]
+        assert error.error.args[0] == "A newer version of this package is already installed!"
+        unknown = "Add-AppxPackage : Deployment failed with HRESULT: 0x80070005\n"
+        assert msix.PtyOutputParser(is_dependency=False).feed(unknown)[0].error.args[0] == "Unknown error!"
+
+    def test_build_install_command(self):
+        """Test dependencies are passed with the right parameter for user and global installs."""
+        path, dependencies = pathlib.Path("App.msix"), [pathlib.Path("VCLibs.appx"), pathlib.Path("It's.msix")]
+        assert msix.build_install_command(path, False, dependencies) == (
+            "Add-AppxPackage -Path 'App.msix' -DependencyPath 'VCLibs.appx','It''s.msix'"
+            " -ErrorAction Continue | Out-String"
+        )
+        assert msix.build_install_command(path, True, dependencies[:1]) == (
+            "Add-AppxProvisionedPackage -PackagePath 'App.msix' -Online -SkipLicense"
+            " -DependencyPackagePath 'VCLibs.appx' -ErrorAction Continue | Out-String"
+        )
@@ -0,0 +1,59 @@
+import pathlib
+import pickle
+from msix_global_installer import pickler
+from msix_global_installer.metadata import BundlePackage, MsixMetadata, PackageDependency
+
+
+def make_metadata(count: int) -> list[MsixMetadata]:
+    main = MsixMetadata(
+        "App.msixbundle",
+        "App",
+        "1.0.0.0",
+        "Contoso",
+        icon_path=pathlib.Path("extracted/StoreLogo.png"),
+        window_icons=["iVBORw0KGgo48", "iVBORw0KGgo32"],
+        panel_icon="iVBORw0KGgo100",
+        architecture="x64",
+        dependencies=[PackageDependency("Microsoft.VCLibs.140.00", "CN=Microsoft", "14.0.0.0")],
+    )
+    main.bundle_packages = [
+        BundlePackage("App_x64.msix", "application", "1.0.0.0", "x64", None, 10, 20, languages=["en-us"]),
+        BundlePackage("App_scale-200.msix", "resource", "1.0.0.0", "neutral", "split.scale-200", 30, 40, scales=[200]),
+    ]
+    main.bundle_packages[0].metadata = MsixMetadata("App.msixbundle", "App", "1.0.0.0", "Contoso", architecture="x64")
+    dependencies = [MsixMetadata(f"Dependency{i}.msix", f"Dependency {i}", "1.0.0.0", "Contoso") for i in range(count)]
+    return [main] + dependencies
+
+
+class TestPickler:
+    """Class to test saving and loading metadata."""
+
+    def test_round_trip(self, tmpdir):
+        """Test metadata is saved and loaded unchanged."""
+        path = pathlib.Path(tmpdir) / "metadata.bin"
+        metadata = make_metadata(3)
+        pickler.save_metadata(path, metadata)
+        assert pickler.load_metadata(path) == metadata
+
+    def test_main_metadata_only_decodes_first_record(self, tmpdir):
+        """Test the main package can be read without decoding the dependencies."""
+        path = pathlib.Path(tmpdir) / "metadata.bin"
+        metadata = make_metadata(50)
+        pickler.save_metadata(path, metadata)
+        assert pickler.load_main_metadata(path) == metadata[0]
+        with pickler.MetadataPayload(path) as payload:
+            assert len(payload) == 51
+            assert payload[-1] == metadata[-1]
+            assert list(payload._records) == [50]
+
+    def test_load_legacy_pickle(self, tmpdir):
+        """Test pickles from older versions, without newer fields, are still read."""
+        path = pathlib.Path(tmpdir) / "data.pkl"
+        legacy = MsixMetadata("App.msix", "App", "1.0.0.0", "Contoso", pathlib.Path("extracted/StoreLogo.png"))
+        for added_field in ("architecture", "bundle_packages", "dependencies"):
+            del legacy.__dict__[added_field]
+        with open(path, "wb") as file:
+            pickle.dump([legacy], file)
+        loaded = pickler.load_metadata(path)
+        assert loaded == [MsixMetadata("App.msix", "App", "1.0.0.0", "Contoso", legacy.icon_path)]
+        assert pickler.load_main_metadata(path).bundle_packages == []
@@ -0,0 +1,40 @@
+import pathlib
+import zipfile
+import pytest
+from msix_global_installer import resources
+
+TEST_PACKAGE = pathlib.Path("tests/TestMsixPackage.msix")
+
+
+class TestResources:
+    """Class to test resource lookup."""
+
+    def test_split_resource_name(self):
+        """Test qualifiers are parsed from file and folder names."""
+        assert resources.split_resource_name("Assets/Logo.targetsize-16_altform-unplated.png") == (
+            "assets/logo.png",
+            {"targetsize": "16", "altform": "unplated"},
+        )
+        assert resources.split_resource_name("Assets/contrast-high/Logo.scale-125.png") == (
+            "assets/logo.png",
+            {"contrast": "high", "scale": "125"},
+        )
+        assert resources.split_resource_name("Assets/My.Logo.png") == ("assets/my.logo.png", {})
+
+    def test_find_best_for_size(self):
+        """Test the smallest variant big enough for the requested size is picked."""
+        with zipfile.ZipFile(TEST_PACKAGE) as package:
+            index = resources.ResourceIndex.from_zip(package)
+        assert index.find_best("Assets\\StoreLogo.png", 100) == "Assets/StoreLogo.scale-200.png"
+        assert index.find_best("Assets\\StoreLogo.png", 60) == "Assets/StoreLogo.scale-125.png"
+        assert index.find_best("Assets\\StoreLogo.png", 1000) == "Assets/StoreLogo.scale-400.png"
+        assert index.find_best("Assets\\Square44x44Logo.png", 24) == "Assets/Square44x44Logo.targetsize-24.png"
+        with pytest.raises(FileNotFoundError):
+            index.find_best("Assets\\Missing.png", 100)
+
+    def test_special_contrast_is_last_resort(self):
+        """Test high contrast variants are only used if nothing else exists."""
+        index = resources.ResourceIndex(["Logo.contrast-high_scale-400.png", "Logo.scale-100.png"])
+        assert index.find_best("Logo.png", 200) == "Logo.scale-100.png"
+        index = resources.ResourceIndex(["Logo.contrast-high_scale-400.png"])
+        assert index.find_best("Logo.png", 200) == "Logo.contrast-high_scale-400.png"
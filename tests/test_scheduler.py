@@ -0,0 +1,151 @@
+import asyncio
+import time
+import pytest
+from msix_global_installer import scheduler
+from msix_global_installer.metadata import MsixMetadata, PackageDependency
+
+INSTALL_S = 0.05
+
+
+def make_package(name: str, *requires: str) -> MsixMetadata:
+    dependencies = [PackageDependency(required, "CN=Contoso", "1.0.0.0") for required in requires]
+    return MsixMetadata(f"{name}.msix", name, "1.0.0.0", "Contoso", dependencies=dependencies, identity_name=name)
+
+
+class SimulatedBackend:
+    """Installs that take INSTALL_S, recording their order and how many ran at once."""
+
+    def __init__(self, failing: tuple[str, ...] = ()):
+        self.failing = failing
+        self.started: list[str] = []
+        self.finished: list[str] = []
+        self.running = 0
+        self.most_running = 0
+
+    async def install(self, node: scheduler.InstallNode, report) -> bool:
+        self.started.append(node.key)
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        for progress in (25, 50, 75, 100):
+            await asyncio.sleep(INSTALL_S / 4)
+            report(progress)
+        self.running -= 1
+        self.finished.append(node.key)
+        return node.key not in self.failing
+
+
+def run(install_scheduler: scheduler.InstallScheduler) -> bool:
+    return asyncio.run(install_scheduler.run_async())
+
+
+class TestScheduler:
+    """Class to test installing packages in dependency order."""
+
+    def test_build_graph(self):
+        """Test edges come from PackageDependency elements and the main package needs every other package."""
+        nodes = scheduler.build_graph(
+            [make_package("App", "Runtime"), make_package("Runtime", "VCLibs"), make_package("VCLibs", "Missing")]
+        )
+        assert nodes["App"].requires == {"Runtime", "VCLibs"}
+        assert nodes["Runtime"].requires == {"VCLibs"}
+        assert nodes["VCLibs"].requires == set()
+        assert nodes["VCLibs"].dependents == {"App", "Runtime"}
+
+    def test_build_graph_architectures(self):
+        """Test the same package for two architectures gets a node each, both required by what depends on it."""
+        vclibs = [make_package("Microsoft.VCLibs.140.00") for _ in range(2)]
+        for package, architecture in zip(vclibs, ("x64", "x86")):
+            package.architecture = architecture
+        runtime = make_package("Runtime", "Microsoft.VCLibs.140.00")
+        nodes = scheduler.build_graph([make_package("App"), runtime, *vclibs])
+        assert sorted(nodes) == ["App", "Microsoft.VCLibs.140.00_x64", "Microsoft.VCLibs.140.00_x86", "Runtime"]
+        assert nodes["Runtime"].requires == {"Microsoft.VCLibs.140.00_x64", "Microsoft.VCLibs.140.00_x86"}
+        assert nodes["App"].requires == {"Runtime", "Microsoft.VCLibs.140.00_x64", "Microsoft.VCLibs.140.00_x86"}
+
+    def test_cycle_is_rejected(self):
+        """Test packages that depend on each other raise an error rather than never installing."""
+        with pytest.raises(scheduler.DependencyCycleError, match="depend on each other"):
+            scheduler.build_graph([make_package("App"), make_package("A", "B"), make_package("B", "A")])
+
+    def test_dependency_order(self):
+        """Test a package only starts once everything it depends on has finished."""
+        nodes = scheduler.build_graph([make_package("App"), make_package("Runtime", "VCLibs"), make_package("VCLibs")])
+        backend = SimulatedBackend()
+        assert run(scheduler.InstallScheduler(nodes, backend.install, max_concurrent=3))
+        assert backend.finished == ["VCLibs", "Runtime", "App"]
+        assert all(node.state == scheduler.NodeState.SUCCEEDED for node in nodes.values())
+
+    def test_concurrency_limit(self):
+        """Test independent packages install at the same time, up to the limit, faster than one at a time."""
+        packages = [make_package("App")] + [make_package(f"Dependency{number}") for number in range(4)]
+        backend = SimulatedBackend()
+        start = time.perf_counter()
+        assert run(scheduler.InstallScheduler(scheduler.build_graph(packages), backend.install, max_concurrent=2))
+        elapsed = time.perf_counter() - start
+        assert backend.most_running == 2
+        assert backend.finished[-1] == "App"
+        # Two rounds of dependencies and then the app, rather than five installs one after another
+        assert elapsed < INSTALL_S * 4.5
+
+    def test_failure_cancels_dependents(self):
+        """Test a failed install cancels what depends on it while unrelated installs carry on."""
+        nodes = scheduler.build_graph(
+            [make_package("App"), make_package("Runtime", "VCLibs"), make_package("VCLibs"), make_package("Fonts")]
+        )
+        backend = SimulatedBackend(failing=("VCLibs",))
+        assert not run(scheduler.InstallScheduler(nodes, backend.install, max_concurrent=2))
+        assert nodes["VCLibs"].state == scheduler.NodeState.FAILED
+        assert nodes["Runtime"].state == scheduler.NodeState.CANCELLED
+        assert nodes["App"].state == scheduler.NodeState.CANCELLED
+        assert nodes["Fonts"].state == scheduler.NodeState.SUCCEEDED
+        assert sorted(backend.started) == ["Fonts", "VCLibs"]
+
+    def test_exception_fails_node(self):
+        """Test an install that raises counts as failed."""
+
+        async def install(node: scheduler.InstallNode, report) -> bool:
+            raise RuntimeError("Shell went away")
+
+        nodes = scheduler.build_graph([make_package("App"), make_package("VCLibs")])
+        assert not run(scheduler.InstallScheduler(nodes, install))
+        assert nodes["VCLibs"].state == scheduler.NodeState.FAILED
+        assert nodes["App"].state == scheduler.NodeState.CANCELLED
+
+    def test_overall_progress(self):
+        """Test progress is reported per package and for all packages together, never going backwards."""
+        nodes = scheduler.build_graph([make_package("App"), make_package("VCLibs"), make_package("Fonts")])
+        reported: list[tuple[str, int]] = []
+        install_scheduler = scheduler.InstallScheduler(
+            nodes,
+            SimulatedBackend().install,
+            max_concurrent=2,
+            on_progress=lambda node, overall: reported.append((node.key, overall)),
+        )
+        assert run(install_scheduler)
+        overall = [progress for _, progress in reported]
+        assert overall == sorted(overall)
+        assert {key for key, _ in reported} == {"App", "VCLibs", "Fonts"}
+        assert overall[-1] == 100
+        assert install_scheduler.overall_progress == 100
+
+    def test_run_async(self):
+        """Test installs on the event loop keep dependency order, the limit and cancel dependents on failure."""
+        nodes = scheduler.build_graph(
+            [make_package("App"), make_package("Runtime", "VCLibs"), make_package("VCLibs"), make_package("Fonts")]
+        )
+        started: list[str] = []
+        running = [0, 0]
+
+        async def install(node: scheduler.InstallNode, report) -> bool:
+            started.append(node.key)
+            running[0] += 1
+            running[1] = max(running)
+            await asyncio.sleep(INSTALL_S)
+            report(100)
+            running[0] -= 1
+            return node.key != "Runtime"
+
+        assert not asyncio.run(scheduler.InstallScheduler(nodes, install, max_concurrent=2).run_async())
+        assert started == ["VCLibs", "Fonts", "Runtime"]
+        assert running[1] == 2
+        assert nodes["App"].state == scheduler.NodeState.CANCELLED
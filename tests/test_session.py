@@ -0,0 +1,211 @@
+import asyncio
+import pathlib
+import sys
+import threading
+import pytest
+from msix_global_installer import events, msix, session
+from msix_global_installer.metadata import MsixMetadata
+from msix_global_installer.pyinstaller_helper import resource_path
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="The fake shell needs a POSIX pseudo terminal")
+
+FAKE_SHELL = pathlib.Path(__file__).parent / "fake_powershell.py"
+
+
+def record_commands(shell_session: session.AsyncPowerShellSession) -> list[str]:
+    commands = []
+    run = shell_session.run
+
+    def recording_run(command: str, nonce: str):
+        commands.append(command)
+        return run(command, nonce)
+
+    shell_session.run = recording_run
+    return commands
+
+
+def async_session(reader_factory=session.make_reader) -> session.AsyncPowerShellSession:
+    return session.AsyncPowerShellSession(
+        spawn=lambda: session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)]), reader_factory=reader_factory
+    )
+
+
+async def run_async(shell_session: session.AsyncPowerShellSession, command: str) -> list:
+    nonce = session.make_nonce()
+    parser = msix.PtyOutputParser(is_dependency=False, nonce=nonce)
+    return [result async for result in parser.parse_all_async(shell_session.run(command, nonce))]
+
+
+@pytest.mark.parametrize("reader_factory", [session.FdPtyReader, session.ExecutorPtyReader])
+class TestAsyncSession:
+    """Class to test running commands in one shell on the event loop."""
+
+    def test_commands_share_one_shell(self, reader_factory):
+        """Test every command runs in the same shell and reports its own result."""
+
+        async def main():
+            async with async_session(reader_factory) as shell_session:
+                first = await run_async(shell_session, "Add-AppxPackage -Path First.msix")
+                second = await run_async(shell_session, "Add-AppxPackage -Path Newer.msix")
+                return first, second, shell_session.starts
+
+        first, second, starts = asyncio.run(main())
+        assert first[-1] == msix.ReturnCodeResult(True, 0)
+        assert msix.ProgressResult(progress=100) in first
+        assert second[-1] == msix.ReturnCodeResult(False, 0)
+        assert starts == 1
+
+    def test_unread_output_is_skipped(self, reader_factory):
+        """Test output left by a command the caller stopped reading isn't seen by the next command."""
+
+        async def main():
+            async with async_session(reader_factory) as shell_session:
+                output = shell_session.run("Add-AppxPackage -Path Missing.msix", session.make_nonce())
+                await anext(output)
+                return await run_async(shell_session, "Add-AppxPackage -Path Next.msix")
+
+        assert asyncio.run(main())[-1] == msix.ReturnCodeResult(True, 0)
+
+    def test_restarts_dead_shell(self, reader_factory):
+        """Test the shell is started again if it dies during a command."""
+
+        async def main():
+            async with async_session(reader_factory) as shell_session:
+                crashed = await run_async(shell_session, "Add-AppxPackage -Path Crash.msix")
+                exitstatus = shell_session.exitstatus
+                after = await run_async(shell_session, "Add-AppxPackage -Path After.msix")
+                return crashed, exitstatus, after, shell_session.starts
+
+        crashed, exitstatus, after, starts = asyncio.run(main())
+        assert not any(isinstance(result, msix.ReturnCodeResult) for result in crashed)
+        assert exitstatus == 1
+        assert after[-1] == msix.ReturnCodeResult(True, 0)
+        assert starts == 2
+
+    def test_close_releases_shell(self, reader_factory):
+        """Test closing waits for the shell to exit and closes its terminal, including a shell that died."""
+        processes = []
+
+        def spawn() -> session.PosixPtyProcess:
+            processes.append(session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)]))
+            return processes[-1]
+
+        async def main():
+            shell_session = session.AsyncPowerShellSession(spawn=spawn, reader_factory=reader_factory)
+            await run_async(shell_session, "Add-AppxPackage -Path Crash.msix")
+            await run_async(shell_session, "Add-AppxPackage -Path After.msix")
+            await shell_session.close(grace_s=5)
+
+        asyncio.run(main())
+        assert [process.exitstatus for process in processes] == [1, 0]
+        assert all(process._closed for process in processes)
+
+
+class TestAsyncInstall:
+    """Class to test installing on the event loop."""
+
+    def test_install_msix_in_session(self):
+        """Test packages are installed one after another in the same session."""
+        events.drain_events(events.gui_event_queue)
+
+        async def main():
+            async with async_session() as shell_session:
+                installed = [
+                    await msix.install_msix_async(pathlib.Path(name), name, shell_session)
+                    for name in ("Dependency.msix", "App.msix", "Missing.msix")
+                ]
+                return installed, shell_session.starts
+
+        installed, starts = asyncio.run(main())
+        assert installed == [True, True, False]
+        assert starts == 1
+        posted = events.drain_events(events.gui_event_queue)
+        failed = [event.data for event in posted if event.data.get("title") == "Failed to install Missing.msix"]
+        assert failed[0]["subtitle"] == "Installer file not found!"
+
+    def test_install_dependencies_together(self):
+        """Test dependencies are installed in the same command as the main package."""
+        events.drain_events(events.gui_event_queue)
+        packages = [
+            MsixMetadata("App.msix", "App", "1.0", "Contoso"),
+            MsixMetadata("Dependency.msix", "Dep", "1.0", ""),
+        ]
+
+        async def main():
+            async with async_session() as shell_session:
+                commands = record_commands(shell_session)
+                return await msix.install_packages_async(packages, shell_session, together=True), commands
+
+        success, commands = asyncio.run(main())
+        assert success
+        paths = [pathlib.Path(resource_path(package.package_path)) for package in packages]
+        assert commands == [msix.build_install_command(paths[0], False, paths[1:])]
+        posted = events.drain_events(events.gui_event_queue)
+        assert [event.data["progress"] for event in posted if "progress" in event.data][-1] == 100
+
+    def test_installs_share_one_loop(self):
+        """Test installs in several shells run at the same time on one loop without a thread each."""
+        threads_before = threading.active_count()
+
+        async def main():
+            shell_sessions = [async_session(session.FdPtyReader) for _ in range(4)]
+            names = ["App1", "App2", "App3", "Missing"]
+            try:
+                return await asyncio.gather(
+                    *(
+                        msix.install_msix_async(pathlib.Path(f"{name}.msix"), name, shell_session)
+                        for name, shell_session in zip(names, shell_sessions)
+                    )
+                )
+            finally:
+                await asyncio.gather(*(shell_session.close() for shell_session in shell_sessions))
+
+        assert asyncio.run(main()) == [True, True, True, False]
+        assert threading.active_count() == threads_before
+        posted = events.drain_events(events.gui_event_queue)
+        assert "Installer file not found!" in [event.data.get("subtitle") for event in posted]
+
+    def test_extra_shells_are_released(self):
+        """Test the shells opened to install at the same time exit and have their terminals closed."""
+        processes = []
+
+        def spawn() -> session.PosixPtyProcess:
+            processes.append(session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)]))
+            return processes[-1]
+
+        packages = [MsixMetadata(f"App{number}.msix", f"App{number}", "1.0", "") for number in range(3)]
+
+        async def main():
+            async with session.AsyncPowerShellSession(spawn=spawn) as shell_session:
+                return await msix.install_packages_async(
+                    packages,
+                    shell_session,
+                    together=False,
+                    max_concurrent=3,
+                    session_factory=lambda: session.AsyncPowerShellSession(spawn=spawn),
+                )
+
+        assert asyncio.run(main())
+        assert len(processes) == 3
+        assert [process.exitstatus for process in processes] == [0, 0, 0]
+        assert all(process._closed for process in processes)
+        events.drain_events(events.gui_event_queue)
+
+    def test_install_together_falls_back(self):
+        """Test packages are installed one at a time, dependencies first, if installing together fails."""
+        packages = [MsixMetadata("App.msix", "App", "1.0", "Contoso"), MsixMetadata("Stale.msix", "Stale", "1.0", "")]
+
+        async def main():
+            async with async_session() as shell_session:
+                commands = record_commands(shell_session)
+                success = await msix.install_packages_async(
+                    packages, shell_session, together=True, max_concurrent=1, session_factory=async_session
+                )
+                return success, commands
+
+        success, commands = asyncio.run(main())
+        assert success
+        assert commands[1:] == [
+            msix.build_install_command(resource_path("Stale.msix")),
+            msix.build_install_command(resource_path("App.msix")),
+        ]
@@ -0,0 +1,28 @@
+from msix_global_installer import staging
+import pathlib
+
+
+class TestStaging:
+    """Class to test writing optional files so a half-written one is never read."""
+
+    def test_replaces_directory(self, tmp_path):
+        """Test a staged directory replaces what was there before."""
+        path = tmp_path / "entry"
+        path.mkdir()
+        (path / "old.txt").write_text("old")
+        assert staging.write_staged(path, lambda staging_path: (staging_path / "new.txt").write_text("new"), True)
+        assert [file.name for file in path.iterdir()] == ["new.txt"]
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_failed_write_keeps_previous(self, tmp_path):
+        """Test a failed write is logged rather than raised, keeping the previous file and removing the staged one."""
+        path = tmp_path / "journal.json"
+        path.write_text("previous")
+
+        def write(staging_path: pathlib.Path):
+            staging_path.write_text("half")
+            raise OSError("Disk full")
+
+        assert not staging.write_staged(path, write)
+        assert path.read_text() == "previous"
+        assert list(tmp_path.iterdir()) == [path]
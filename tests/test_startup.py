@@ -0,0 +1,77 @@
+import importlib.util
+import subprocess
+import sys
+import pytest
+from msix_global_installer import startup
+
+# Seconds from launch until the window is drawn, well above a normal start so only regressions fail
+FIRST_FRAME_BUDGET_S = 2.0
+
+
+def can_draw_window() -> bool:
+    if not all(importlib.util.find_spec(name) for name in ("tkinter", "sv_ttk", "pyuac")):
+        return False
+    import tkinter
+
+    try:
+        tkinter.Tk().destroy()
+    except tkinter.TclError:
+        # No display
+        return False
+    return True
+
+
+class TestStartup:
+    """Class to test the installer starts quickly."""
+
+    def test_parse_import_times(self):
+        """Test -X importtime output is parsed, keeping how deeply each import is nested."""
+        lines = [
+            "import time: self [us] | cumulative | imported package\n",
+            "import time:       120 |        120 |     zlib\n",
+            "import time:       992 |       3285 |   zipfile\n",
+            "import time:      1997 |      58744 | msix_global_installer.msix\n",
+        ]
+        assert startup.parse_import_times(lines) == [
+            startup.ImportTime("zlib", 120, 120, 2),
+            startup.ImportTime("zipfile", 992, 3285, 1),
+            startup.ImportTime("msix_global_installer.msix", 1997, 58744, 0),
+        ]
+
+    def test_gui_imports_stay_light(self):
+        """Test what the GUI imports at startup doesn't pull in the install backend or PIL."""
+        code = (
+            "import sys; started_with = set(sys.modules)\n"
+            "from msix_global_installer import config, events, logs, store\n"
+            "heavy = ('PIL', 'pyuac', 'zipfile', 'xml.etree.ElementTree', 'msix_global_installer.msix')\n"
+            "print(sorted(name for name in heavy if name in sys.modules and name not in started_with))"
+        )
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        assert output.strip() == "[]"
+
+    def test_gui_builds_without_pyuac(self):
+        """Test the window is built without importing pyuac, which is held back until the first frame is drawn."""
+        # Stand-ins for Tk, so the window can be built without a display or the GUI's dependencies
+        code = (
+            "import sys, types\n"
+            "class Widget:\n"
+            "    def __init__(self, *args, **kwargs): pass\n"
+            "    def __getattr__(self, name): return lambda *args, **kwargs: None\n"
+            "tkinter = types.ModuleType('tkinter'); ttk = types.ModuleType('tkinter.ttk')\n"
+            "tkinter.Tk = tkinter.PhotoImage = tkinter.BooleanVar = Widget; tkinter.ttk = ttk\n"
+            "ttk.Frame = ttk.Label = ttk.Button = ttk.Checkbutton = ttk.Progressbar = Widget\n"
+            "sv_ttk = types.ModuleType('sv_ttk'); sv_ttk.set_theme = lambda theme: None\n"
+            "sys.modules.update({'tkinter': tkinter, 'tkinter.ttk': ttk, 'sv_ttk': sv_ttk})\n"
+            "from msix_global_installer import gui\n"
+            "gui.MainApplication(Widget())\n"
+            "print('pyuac' in sys.modules)"
+        )
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        assert output.strip() == "False"
+
+    @pytest.mark.skipif(not can_draw_window(), reason="Needs a display and the GUI's dependencies")
+    def test_first_frame_within_budget(self):
+        """Test the first frame is drawn within the budget and before the backend is imported."""
+        report = startup.measure_first_frame(import_time=False)
+        assert report.backend_loaded == []
+        assert report.first_frame_s < FIRST_FRAME_BUDGET_S
@@ -0,0 +1,31 @@
+import pathlib
+import threading
+from msix_global_installer import pickler, store
+from msix_global_installer.metadata import MsixMetadata
+
+
+class TestStore:
+    """Class to test the shared metadata store."""
+
+    def test_loads_once_and_shares_objects(self, tmpdir, monkeypatch):
+        """Test metadata is read once and every thread gets the same objects."""
+        path = pathlib.Path(tmpdir) / "metadata.bin"
+        metadata = [MsixMetadata(f"Package{i}.msix", f"Package {i}", "1.0", "Contoso") for i in range(3)]
+        pickler.save_metadata(path, metadata)
+        loads = []
+        load_metadata = pickler.load_metadata
+        monkeypatch.setattr(pickler, "load_metadata", lambda *args: loads.append(args) or load_metadata(*args))
+
+        metadata_store = store.MetadataStore(path)
+        main = metadata_store.main()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(metadata_store.all())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(loads) == 1
+        assert all(result is results[0] for result in results)
+        assert results[0][0] is main
+        assert metadata_store.main() is main
@@ -0,0 +1,200 @@
+import asyncio
+import pathlib
+import signal
+import sys
+import time
+import pytest
+from msix_global_installer import config, events, inventory, msix, session, watchdog
+from msix_global_installer.metadata import MsixMetadata
+
+FAKE_SHELL = pathlib.Path(__file__).parent / "fake_powershell.py"
+SHORT = watchdog.Timeouts(spawn_s=5, first_output_s=0.3, no_progress_s=0.3, total_s=5)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def fake_shell_session() -> session.AsyncPowerShellSession:
+    return session.AsyncPowerShellSession(spawn=lambda: session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)]))
+
+
+class TestWatchdog:
+    """Class to test stopping installs that have hung."""
+
+    def test_phases(self):
+        """Test each phase has its own timeout and only the progress going up resets the no progress timeout."""
+        clock = FakeClock()
+        timeouts = watchdog.Timeouts(spawn_s=10, first_output_s=20, no_progress_s=30, total_s=100)
+        install_watchdog = watchdog.Watchdog(timeouts, clock=clock)
+        clock.now = 10
+        assert install_watchdog.expired().phase == watchdog.Phase.SPAWN
+        install_watchdog.spawned()
+        assert install_watchdog.expired() is None
+        assert install_watchdog.remaining_s() == 20
+        clock.now = 30
+        assert install_watchdog.expired().phase == watchdog.Phase.FIRST_OUTPUT
+        install_watchdog.output()
+        install_watchdog.progressed(10)
+        clock.now = 59
+        install_watchdog.progressed(10)
+        assert install_watchdog.remaining_s() == 1
+        install_watchdog.progressed(20)
+        clock.now = 88
+        assert install_watchdog.expired() is None
+        clock.now = 100
+        assert install_watchdog.expired().phase == watchdog.Phase.TOTAL
+
+    def test_no_limits(self):
+        """Test phases without a timeout never expire."""
+        install_watchdog = watchdog.Watchdog(watchdog.Timeouts())
+        assert install_watchdog.remaining_s() is None
+        assert install_watchdog.expired() is None
+
+    def test_guard_cancels_install(self):
+        """Test a hung install is cancelled and the timeout raised."""
+        cancelled = []
+
+        async def hang():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        install_watchdog = watchdog.Watchdog(watchdog.Timeouts(spawn_s=0.05))
+        with pytest.raises(watchdog.InstallTimeoutError, match="starting the shell"):
+            asyncio.run(install_watchdog.guard(hang()))
+        assert cancelled == [True]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The fake shell needs a POSIX pseudo terminal")
+class TestInstallWatchdog:
+    """Class to test hung installs in a shell are stopped."""
+
+    @pytest.mark.parametrize(
+        "package, phase", [("Hang.msix", watchdog.Phase.FIRST_OUTPUT), ("Stall.msix", watchdog.Phase.NO_PROGRESS)]
+    )
+    def test_hung_install_is_killed(self, package, phase, monkeypatch):
+        """Test a shell that ignores being asked to exit is killed once the install times out."""
+        monkeypatch.setattr(config, "SHELL_EXIT_GRACE_S", 0.2)
+
+        async def main():
+            shell_session = fake_shell_session()
+            await shell_session.start()
+            process = shell_session._process
+            with pytest.raises(watchdog.InstallTimeoutError) as timeout:
+                await msix.install_msix_async(pathlib.Path(package), "App", shell_session, timeouts=SHORT)
+            return timeout.value, process
+
+        start = time.monotonic()
+        timeout, process = asyncio.run(main())
+        assert timeout.phase == phase
+        assert process._process.wait(timeout=1) == -signal.SIGKILL
+        assert time.monotonic() - start < 2
+        posted = events.drain_events(events.gui_event_queue)
+        assert posted[-1].data["title"] == "Install of App timed out"
+
+    def test_status_output_counts(self):
+        """Test a queued install that only writes its status and an empty bar isn't taken as hung."""
+        timeouts = watchdog.Timeouts(spawn_s=5, first_output_s=0.3, no_progress_s=2, total_s=5)
+
+        async def main():
+            async with fake_shell_session() as shell_session:
+                return await msix.install_msix_async(
+                    pathlib.Path("Queued.msix"), "App", shell_session, timeouts=timeouts
+                )
+
+        assert asyncio.run(main())
+        events.drain_events(events.gui_event_queue)
+
+    def test_hung_inventory_installs_everything(self, monkeypatch):
+        """Test a hung installed package query is stopped and every package installed, rather than waiting forever."""
+        monkeypatch.setattr(config, "SHELL_EXIT_GRACE_S", 0.2)
+        monkeypatch.setenv("FAKE_POWERSHELL_HANG_INVENTORY", "1")
+        packages = [
+            MsixMetadata("App.msix", "App", "1.0", "", identity_name="App"),
+            MsixMetadata("VCLibs.appx", "VCLibs", "1.0", "", identity_name="Microsoft.VCLibs.140.00"),
+        ]
+        timeouts = watchdog.Timeouts(spawn_s=5, total_s=0.5)
+
+        async def main():
+            shell_session = fake_shell_session()
+            needed = await inventory.plan_install_async(
+                packages, lambda: inventory.query_installed_packages_async(shell_session, timeouts=timeouts)
+            )
+            return needed, shell_session._process
+
+        start = time.monotonic()
+        needed, process = asyncio.run(main())
+        assert needed == packages
+        # Stopped, the install starts a new shell
+        assert process is None
+        assert time.monotonic() - start < 3
+
+    def test_hung_spawn_times_out(self):
+        """Test a shell that doesn't start in time stops the installed package query."""
+
+        def spawn() -> session.PosixPtyProcess:
+            time.sleep(0.5)
+            return session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)])
+
+        async def main():
+            shell_session = session.AsyncPowerShellSession(spawn=spawn)
+            await inventory.query_installed_packages_async(shell_session, timeouts=watchdog.Timeouts(spawn_s=0.1))
+
+        with pytest.raises(watchdog.InstallTimeoutError) as error:
+            asyncio.run(main())
+        assert error.value.phase == watchdog.Phase.SPAWN
+
+    def test_idle_shell_exits_politely(self):
+        """Test a shell that isn't busy exits when asked rather than being killed."""
+
+        async def main():
+            shell_session = fake_shell_session()
+            assert await msix.install_msix_async(pathlib.Path("App.msix"), "App", shell_session, timeouts=SHORT)
+            process = shell_session._process
+            await shell_session.terminate(grace_s=5)
+            return process
+
+        assert asyncio.run(main()).exitstatus == 0
+
+    def test_cancel_stops_every_shell(self, monkeypatch):
+        """Test cancelling an install stops the shells installing at the same time."""
+        monkeypatch.setattr(config, "SHELL_EXIT_GRACE_S", 0.2)
+        processes = []
+
+        def spawn() -> session.PosixPtyProcess:
+            processes.append(session.PosixPtyProcess([sys.executable, str(FAKE_SHELL)]))
+            return processes[-1]
+
+        packages = [MsixMetadata("App.msix", "App", "1.0", ""), MsixMetadata("Hang.msix", "Hang", "1.0", "")]
+        packages.append(MsixMetadata("Stall.msix", "Stall", "1.0", ""))
+
+        async def main():
+            async with session.AsyncPowerShellSession(spawn=spawn) as shell_session:
+                await msix.install_packages_async(
+                    packages,
+                    shell_session,
+                    together=False,
+                    max_concurrent=2,
+                    session_factory=lambda: session.AsyncPowerShellSession(spawn=spawn),
+                )
+
+        async def cancel_soon():
+            task = asyncio.create_task(main())
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_soon())
+        assert len(processes) == 2
+        for process in processes:
+            process._process.wait(timeout=1)
+            assert not process.isalive()
+        events.drain_events(events.gui_event_queue)